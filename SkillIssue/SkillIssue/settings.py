@@ -22,6 +22,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
@@ -52,6 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.instrumentation.RequestInstrumentationMiddleware',
+    'users.metrics.MetricsMiddleware',
+    'users.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +78,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'users.context_processors.user_language',
+                'users.context_processors.chat_stream',
             ],
         },
     },
@@ -81,6 +86,48 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'SkillIssue.wsgi.application'
 
+# Поток событий чата (/api/chat/stream/) работает только под ASGI (uvicorn, daphne): под WSGI (runserver)
+# бесконечный ответ держит поток сервера. Включайте вместе с ASGI-сервером; без него чат обновляется
+# при открытии. LocalBroker раздаёт события внутри одного процесса, см. users/realtime.py
+CHAT_STREAM_ENABLED = os.environ.get('CHAT_STREAM_ENABLED', '').lower() in ('1', 'true', 'yes')
+CHAT_BROKER_BACKEND = 'users.realtime.LocalBroker'
+
+# Сколько секунд кэшируются /api/popular-items/ и /api/statistics/ (0 — без кэша), см. users/homepage.py
+HOMEPAGE_CACHE_TTL = int(os.environ.get('HOMEPAGE_CACHE_TTL', 60))
+
+# История действий пишется фоновым потоком пачками ('buffered') или сразу в запросе ('sync'),
+# см. users/activity.py
+ACTIVITY_LOG_MODE = os.environ.get('ACTIVITY_LOG_MODE', 'buffered')
+ACTIVITY_LOG_BUFFER_SIZE = 1000
+ACTIVITY_LOG_FLUSH_INTERVAL = 1.0
+
+# Замеры запросов (SQL, шаблоны, сериализация) в заголовке Server-Timing и логе users.instrumentation;
+# запросы сверх порогов пишутся с уровнем WARNING, см. users/instrumentation.py
+REQUEST_INSTRUMENTATION = os.environ.get('REQUEST_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+REQUEST_INSTRUMENTATION_MAX_QUERIES = int(os.environ.get('REQUEST_INSTRUMENTATION_MAX_QUERIES', 50))
+REQUEST_INSTRUMENTATION_MAX_MS = int(os.environ.get('REQUEST_INSTRUMENTATION_MAX_MS', 500))
+
+# Метрики Prometheus на /metrics. Под несколькими воркерами (gunicorn) задайте общий METRICS_DIR:
+# каждый процесс пишет туда свой снимок, /metrics их складывает, см. users/metrics.py.
+# Эндпоинт отвечает только с заголовком Authorization: Bearer <METRICS_TOKEN>; без токена — 404
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Профилирование запросов: доля PROFILING_SAMPLE_RATE из PROFILING_VIEWS (имена маршрутов или префиксы
+# путей) или любой запрос с заголовком X-Profile: <PROFILING_HEADER_TOKEN>. Режим sampler (снимки стека,
+# файлы .folded) или cprofile (.prof); сводка — manage.py profile_report, см. users/profiling.py.
+# Профили пишутся вне дерева исходников; в каталоге хранятся только PROFILING_MAX_FILES последних
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+PROFILING_DIR = os.environ.get('PROFILING_DIR') or os.path.join(tempfile.gettempdir(), 'skillissue-profiles')
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 500))
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'sampler')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_VIEWS = [view for view in os.environ.get('PROFILING_VIEWS', '').split(',') if view]
+PROFILING_HEADER_TOKEN = os.environ.get('PROFILING_HEADER_TOKEN', '')
+PROFILING_INTERVAL = 0.005
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -122,7 +169,8 @@ REST_FRAMEWORK = {
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
-    )
+    ),
+    "DEFAULT_PAGINATION_CLASS": "users.pagination.KeysetPagination",
 }
 
 from datetime import timedelta
@@ -181,3 +229,8 @@ DEFAULT_FROM_EMAIL = 'noreply@skillissue.local'
 # EMAIL_USE_TLS = True
 # EMAIL_HOST_USER = 'your-email@gmail.com'
 # EMAIL_HOST_PASSWORD = 'your-password'
+
+# Письма отправляет воркер `manage.py send_outbox` (users/outbox.py)
+OUTBOX_MAX_ATTEMPTS = 5
+# Сколько часов хранить отправленные и недоставленные письма до удаления воркером
+OUTBOX_RETENTION_HOURS = int(os.environ.get('OUTBOX_RETENTION_HOURS', 24))
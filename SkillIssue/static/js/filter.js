@@ -126,6 +126,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('Получены данные:', data);
                 console.log('Результаты:', data.results);
                 updateResults(data.results || []);
+                setNextPage(data.next);
             })
             .catch(error => {
                 hideLoading();
@@ -139,17 +140,73 @@ document.addEventListener('DOMContentLoaded', function() {
         return document.querySelector('.feed-grid');
     }
 
+    // Следующая страница результатов (поле next ответа API) и кнопка «Показать ещё»
+    let nextPageUrl = null;
+    let loadingMore = false;
+    let loadMoreButton = null;
+
+    function getLoadMoreButton() {
+        if (loadMoreButton) return loadMoreButton;
+        const grid = getGrid();
+        if (!grid) return null;
+
+        const wrapper = document.createElement('div');
+        wrapper.style.cssText = 'display:flex;justify-content:center;margin:24px 0;';
+        loadMoreButton = document.createElement('button');
+        loadMoreButton.type = 'button';
+        loadMoreButton.className = 'feed-btn-search feed-load-more';
+        loadMoreButton.textContent = 'Показать ещё';
+        loadMoreButton.addEventListener('click', loadMore);
+        wrapper.appendChild(loadMoreButton);
+        grid.after(wrapper);
+        return loadMoreButton;
+    }
+
+    function setNextPage(next) {
+        // Ссылка next абсолютная; берём путь и параметры, чтобы не зависеть от хоста за прокси
+        nextPageUrl = null;
+        if (next) {
+            const url = new URL(next, window.location.origin);
+            nextPageUrl = url.pathname + url.search;
+        }
+        const button = nextPageUrl ? getLoadMoreButton() : loadMoreButton;
+        if (button) button.parentElement.style.display = nextPageUrl ? 'flex' : 'none';
+    }
+
+    function loadMore() {
+        if (!nextPageUrl || loadingMore) return;
+        loadingMore = true;
+        loadMoreButton.disabled = true;
+
+        fetch(nextPageUrl)
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                return response.json();
+            })
+            .then(data => {
+                updateResults(data.results || [], true);
+                setNextPage(data.next);
+            })
+            .catch(error => {
+                console.error('Ошибка при загрузке следующей страницы:', error);
+            })
+            .finally(() => {
+                loadingMore = false;
+                loadMoreButton.disabled = false;
+            });
+    }
+
     // Функция обновления результатов на странице
-    function updateResults(items) {
+    function updateResults(items, append = false) {
         const grid = getGrid();
         if (!grid) {
             console.error('Не найден элемент .feed-grid');
             return;
         }
 
-        grid.innerHTML = '';
+        if (!append) grid.innerHTML = '';
 
-        if (items.length === 0) {
+        if (items.length === 0 && !append) {
             const empty = document.createElement('div');
             empty.className = 'feed-empty';
             empty.innerHTML = '<div class="feed-empty-icon">📭</div>'
@@ -221,6 +278,7 @@ document.addEventListener('DOMContentLoaded', function() {
     function showLoading() {
         const grid = getGrid();
         if (!grid) return;
+        setNextPage(null);
 
         grid.innerHTML = Array.from({ length: 4 }, () => `
             <div class="feed-skeleton">
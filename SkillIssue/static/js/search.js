@@ -8,52 +8,45 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
     }
 
-    let allSearchData = [];
-    let dataLoaded = false;
-
-    // Загрузка всех данных при фокусе
-    searchInput.addEventListener('focus', async function() {
-        if (!dataLoaded && allSearchData.length === 0) {
-            await loadAllSearchData();
-        }
-    });
-
-    async function loadAllSearchData() {
-        try {
-            const response = await fetch('/api/search/all/');
-            if (response.ok) {
-                allSearchData = await response.json();
-                dataLoaded = true;
-            }
-        } catch (error) {
-            console.error('Ошибка загрузки данных:', error);
-        }
-    }
+    // Подсказки запрашиваются у сервера: полный список элементов в браузер не загружается
+    const MIN_QUERY_LENGTH = 2;
 
     // Поиск с debounce
     let searchTimeout;
+    let lastQuery = '';
     searchInput.addEventListener('input', function() {
         clearTimeout(searchTimeout);
         const query = this.value.trim();
 
         searchTimeout = setTimeout(() => {
-            if (query.length > 0) {
-                if (dataLoaded) {
-                    performLocalSearch(query);
-                } else {
-                    performAPISearch(query);
-                }
+            if (query.length >= MIN_QUERY_LENGTH) {
+                performAutocomplete(query);
             } else {
                 searchDropdown.classList.remove('active');
             }
         }, 300);
     });
 
-    function performLocalSearch(query) {
-        const results = allSearchData.filter(item =>
-            item.title.toLowerCase().includes(query.toLowerCase())
-        );
-        displayResults(results);
+    async function performAutocomplete(query) {
+        lastQuery = query;
+        try {
+            const response = await fetch(`/api/search/autocomplete/?q=${encodeURIComponent(query)}`);
+            if (!response.ok) {
+                return;
+            }
+            const results = await response.json();
+            // Ответ на устаревший запрос не показываем
+            if (query !== lastQuery) {
+                return;
+            }
+            if (results.length > 0) {
+                displayResults(results);
+            } else {
+                performAPISearch(query);
+            }
+        } catch (error) {
+            console.error('Ошибка поиска:', error);
+        }
     }
 
     async function performAPISearch(query) {
@@ -61,7 +54,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const response = await fetch(`/api/search/?q=${encodeURIComponent(query)}`);
             if (response.ok) {
                 const results = await response.json();
-                displayResults(results);
+                if (query === lastQuery) {
+                    displayResults(results);
+                }
             }
         } catch (error) {
             console.error('Ошибка поиска:', error);
@@ -27,6 +27,11 @@ document.addEventListener('DOMContentLoaded', function () {
     const btnMute       = document.getElementById('btn-mute-notifications');
 
     let currentReceiverId = null;
+    // Курсор для подгрузки более старых сообщений (null — история загружена полностью)
+    let olderCursor = null;
+    let loadingOlder = false;
+    // Курсор для догрузки новых сообщений открытого диалога
+    let newerCursor = null;
     let contactsCache = {};
     let isMuted = localStorage.getItem('chat_notifications_muted') === 'true';
 
@@ -87,12 +92,14 @@ document.addEventListener('DOMContentLoaded', function () {
         modal.style.right = '';
         button.style.display = 'none';
         loadContacts();
+        connectChatStream();
     }
 
     function closeChat() {
         modal.classList.remove('is-open');
         modal.style.right = '';
         button.style.display = 'flex';
+        disconnectChatStream();
     }
 
     button.addEventListener('click', function () {
@@ -266,13 +273,18 @@ document.addEventListener('DOMContentLoaded', function () {
         }
 
         currentReceiverId = userId;
+        olderCursor = null;
+        newerCursor = null;
         messagesContainer.innerHTML = '<div class="simple-text" style="padding: 20px; color: #666;">Загрузка...</div>';
 
         try {
             const res = await authManager.apiRequest(`/api/chat/${userId}/messages/`);
             if (!res.ok) throw new Error('Не удалось загрузить сообщения');
             
-            const messages = await res.json();
+            const page = await res.json();
+            const messages = page.results;
+            olderCursor = page.before_cursor;
+            newerCursor = page.after_cursor;
             messagesContainer.innerHTML = '';
 
             if (messages.length === 0) {
@@ -299,7 +311,113 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    function addMessage(type, text, time, imageUrl = null) {
+    async function loadOlderMessages() {
+        if (!olderCursor || loadingOlder || !currentReceiverId) return;
+        loadingOlder = true;
+        const receiverId = currentReceiverId;
+        try {
+            const res = await authManager.apiRequest(
+                `/api/chat/${receiverId}/messages/?before=${encodeURIComponent(olderCursor)}`
+            );
+            if (!res.ok || receiverId !== currentReceiverId) return;
+            const page = await res.json();
+            olderCursor = page.before_cursor;
+
+            const previousHeight = messagesContainer.scrollHeight;
+            page.results.slice().reverse().forEach(msg => {
+                addMessage(msg.direction === 'outgoing' ? 'sent' : 'received',
+                    msg.message,
+                    formatTime(msg.created_at),
+                    msg.image_url,
+                    true
+                );
+            });
+            // Сохраняем позицию прокрутки после добавления сообщений сверху
+            messagesContainer.scrollTop += messagesContainer.scrollHeight - previousHeight;
+        } catch (err) {
+            console.error('Ошибка загрузки истории:', err);
+        } finally {
+            loadingOlder = false;
+        }
+    }
+
+    if (messagesContainer) {
+        messagesContainer.addEventListener('scroll', function () {
+            if (messagesContainer.scrollTop < 50) {
+                loadOlderMessages();
+            }
+        });
+    }
+
+    async function loadNewerMessages() {
+        if (!currentReceiverId) return;
+        const receiverId = currentReceiverId;
+        const query = newerCursor ? `?after=${encodeURIComponent(newerCursor)}` : '';
+        try {
+            const res = await authManager.apiRequest(`/api/chat/${receiverId}/messages/${query}`);
+            if (!res.ok || receiverId !== currentReceiverId) return;
+            const page = await res.json();
+            newerCursor = page.after_cursor || newerCursor;
+            page.results.forEach(msg => {
+                // Свои сообщения уже добавлены обработчиком отправки
+                if (msg.direction === 'incoming') {
+                    addMessage('received', msg.message, formatTime(msg.created_at), msg.image_url);
+                }
+            });
+        } catch (err) {
+            console.error('Ошибка загрузки новых сообщений:', err);
+        }
+    }
+
+    /* ─────────────────────────────────────────────
+       ПОТОК СОБЫТИЙ ЧАТА (SSE)
+    ───────────────────────────────────────────── */
+    // Поток открыт, только пока открыто окно чата, и только если сервер его включил (ASGI).
+    // Авторизация — cookie сессии: токен в адресе попал бы в логи доступа.
+    const streamUrl = modal.dataset.streamUrl;
+    let chatStream = null;
+    let reconnectTimer = null;
+
+    function connectChatStream() {
+        if (!streamUrl || chatStream || !window.EventSource || !authManager || !authManager.isAuthenticated()) return;
+
+        const source = new EventSource(streamUrl);
+        chatStream = source;
+
+        source.addEventListener('message', (e) => {
+            const msg = JSON.parse(e.data).message;
+            if (msg.direction !== 'incoming') return;
+            if (currentReceiverId && String(msg.sender) === String(currentReceiverId)) {
+                loadNewerMessages();
+            } else {
+                loadContacts();
+            }
+        });
+
+        source.onerror = () => {
+            // Браузер переподключается сам; закрытый поток (например, завершилась сессия) открываем заново
+            if (source.readyState === EventSource.CLOSED && chatStream === source) {
+                chatStream = null;
+                reconnectTimer = setTimeout(() => {
+                    reconnectTimer = null;
+                    if (modal.classList.contains('is-open')) connectChatStream();
+                }, 30000);
+            }
+        };
+    }
+
+    function disconnectChatStream() {
+        clearTimeout(reconnectTimer);
+        reconnectTimer = null;
+        if (chatStream) {
+            chatStream.close();
+            chatStream = null;
+        }
+    }
+
+    window.addEventListener('pagehide', disconnectChatStream);
+
+    function addMessage(type, text, time, imageUrl = null, prepend = false) {
         if (!messagesContainer) {
             console.error('Контейнер сообщений не найден при добавлении сообщения');
             return;
@@ -347,6 +465,10 @@ document.addEventListener('DOMContentLoaded', function () {
         `;
 
         messageDiv.innerHTML = content;
+        if (prepend) {
+            messagesContainer.insertBefore(messageDiv, messagesContainer.firstChild);
+            return;
+        }
         messagesContainer.appendChild(messageDiv);
         
         // Проверяем, что сообщение действительно добавлено
@@ -561,6 +683,7 @@ document.addEventListener('DOMContentLoaded', function () {
         modal.classList.add('is-open');
         modal.style.right = '';
         button.style.display = 'none';
+        connectChatStream();
 
         // Загрузить контакты
         await loadContacts();
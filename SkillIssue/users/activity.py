@@ -0,0 +1,174 @@
+"""
+Буферизованная запись истории действий (UserActivity).
+
+Сигналы руководств и объявлений не вставляют строку прямо в запросе, а
+после коммита транзакции кладут событие в очередь процесса. Фоновый поток
+раз в ACTIVITY_LOG_FLUSH_INTERVAL секунд (или как только набралась пачка)
+пишет накопленное одним bulk_create. Очередь ограничена ACTIVITY_LOG_BUFFER_SIZE:
+при переполнении записывает сам вызывающий поток, поэтому события не теряются,
+а память не растёт. Остаток сбрасывается при завершении процесса (atexit).
+
+Пока событие ждёт в очереди, руководство или автор могут быть удалены,
+поэтому перед записью ссылки сверяются с базой: на удалённый объект ссылка
+обнуляется (как SET_NULL), события удалённых пользователей отбрасываются.
+created_at заполняется в момент записи, порядок событий сохраняется.
+
+ACTIVITY_LOG_MODE = 'sync' возвращает прежнюю синхронную вставку (тесты).
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+
+from .models import Announcement, Guide, UserActivity
+
+logger = logging.getLogger(__name__)
+
+MODE_SYNC = 'sync'
+MODE_BUFFERED = 'buffered'
+
+DEFAULT_BUFFER_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 500
+
+
+def log_mode():
+    return getattr(settings, 'ACTIVITY_LOG_MODE', MODE_BUFFERED)
+
+
+def _existing(model, ids):
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return set()
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def write_entries(entries):
+    """Записывает события пачкой; возвращает число вставленных строк"""
+    if not entries:
+        return 0
+    users = _existing(User, (entry['user_id'] for entry in entries))
+    guides = _existing(Guide, (entry['guide_id'] for entry in entries))
+    announcements = _existing(Announcement, (entry['announcement_id'] for entry in entries))
+
+    rows = [
+        UserActivity(
+            user_id=entry['user_id'],
+            action=entry['action'],
+            target_type=entry['target_type'],
+            target_title=entry['target_title'],
+            guide_id=entry['guide_id'] if entry['guide_id'] in guides else None,
+            announcement_id=entry['announcement_id'] if entry['announcement_id'] in announcements else None,
+        )
+        for entry in entries
+        if entry['user_id'] in users
+    ]
+    UserActivity.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+class ActivityBuffer:
+    """Ограниченная очередь событий и фоновый поток, который её сбрасывает"""
+
+    def __init__(self, max_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._entries = deque()
+        self._lock = threading.Lock()
+        # Сериализует записи: фоновый поток, переполнение и atexit не пишут одновременно
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+            size = len(self._entries)
+        if size >= self.max_size:
+            # Поток не успевает — пишем сами, чтобы очередь не росла
+            self.flush()
+        elif size >= BATCH_SIZE:
+            self._wakeup.set()
+        self._ensure_thread()
+
+    def _drain(self):
+        with self._lock:
+            entries = list(self._entries)
+            self._entries.clear()
+        return entries
+
+    def flush(self):
+        """Записывает всё накопленное; возвращает число вставленных строк"""
+        with self._flush_lock:
+            entries = self._drain()
+            if not entries:
+                return 0
+            try:
+                return write_entries(entries)
+            except Exception:
+                logger.exception("Не удалось записать %d событий активности", len(entries))
+                return 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityBuffer(
+                    max_size=getattr(settings, 'ACTIVITY_LOG_BUFFER_SIZE', DEFAULT_BUFFER_SIZE),
+                    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+def flush():
+    """Принудительно записывает очередь (перед завершением, в командах и тестах)"""
+    return get_buffer().flush() if _buffer is not None else 0
+
+
+def log_activity(user_id, action, target_type, target_title, guide_id=None, announcement_id=None):
+    """Регистрирует действие пользователя согласно ACTIVITY_LOG_MODE"""
+    entry = {
+        'user_id': user_id,
+        'action': action,
+        'target_type': target_type,
+        'target_title': target_title,
+        'guide_id': guide_id,
+        'announcement_id': announcement_id,
+    }
+    if log_mode() == MODE_SYNC:
+        UserActivity.objects.create(**entry)
+        return
+    # В очередь — только после коммита: откаченное действие не попадёт в историю
+    transaction.on_commit(lambda: get_buffer().add(entry))
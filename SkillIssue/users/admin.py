@@ -59,8 +59,8 @@ class BlacklistWordAdmin(admin.ModelAdmin):
             'fields': ('word', 'replacement', 'is_active', 'case_sensitive')
         }),
         ('Информация', {
-            'fields': ('created_at',),
+            'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'updated_at')
@@ -0,0 +1,313 @@
+"""
+Бенчмарк страниц и API (``manage.py benchmark_endpoints``).
+
+Все GET-маршруты проекта (обход корневого URLconf) вызываются тестовым
+клиентом от имени самого активного автора на заполненной базе (см.
+seeding.py); страницы, доступные только автору объекта (OWNER_ROUTES), —
+от имени этого автора. Для каждого маршрута записываются число SQL-запросов и их
+суммарное время (через connection.execute_wrapper), время Python (всё
+остальное) и размер ответа. Первый вызов — прогрев кэшей, затем берётся
+медиана ``repeat`` замеров и максимум числа запросов.
+
+Результаты сравниваются с базовой линией (JSON, по объёму данных и маршруту):
+число запросов не может превышать сохранённое, время — сохранённое с
+допуском. Если число запросов растёт с объёмом данных, это почти
+наверняка N+1 — такие маршруты выводятся отдельно. Перенаправления не
+замеряются: бюджет записывался бы для redirect, а не для страницы.
+"""
+import json
+import re
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.urls.resolvers import RoutePattern
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Announcement, AnnouncementComment, ChatMessage, Guide, ProfileReview, Review, ReviewReply
+
+DEFAULT_REPEAT = 3
+DEFAULT_LATENCY_FACTOR = 1.5
+# Абсолютный допуск, чтобы шум на быстрых маршрутах не ронял прогон
+DEFAULT_LATENCY_SLACK_MS = 10.0
+
+# Маршруты, которые нельзя вызывать GET-ом в бенчмарке
+EXCLUDED = {
+    'logout_page': "завершает сессию",
+    'chat_stream': "бесконечный поток событий",
+    'update_announcement': "только POST, GET перенаправляет на редактирование",
+    'delete_account': "удаляет аккаунт, только POST",
+    'blocked_page': "только для заблокированных пользователей",
+}
+EXCLUDED_NAMESPACES = {'admin'}
+
+# Модель для параметра pk по имени маршрута
+PK_MODELS = {
+    'guide_detail': Guide,
+    'guides-detail': Guide,
+    'announcements-detail': Announcement,
+    'profile-comment-update': ProfileReview,
+    'profile-comment-delete': ProfileReview,
+    'review-update': Review,
+    'review-delete': Review,
+    'update_announcement_comment': AnnouncementComment,
+    'delete_announcement_comment': AnnouncementComment,
+}
+
+# Маршруты, доступные только автору объекта: замеряются от имени автора
+# объекта из параметра пути (ключ в benchmark_values()['owners'])
+OWNER_ROUTES = {
+    'edit_announcement': 'announcement_id',
+}
+
+# Параметры пути, значения которых берёт benchmark_values()
+PATH_PARAMS = {'username', 'user_id', 'guide_id', 'announcement_id', 'review_id', 'comment_id', 'reply_id'}
+
+# Параметры, без которых маршрут не делает основной работы
+QUERY_PARAMS = {
+    'search': lambda values: {'q': values['word']},
+    'search_all': lambda values: {'q': values['word']},
+    'search_autocomplete': lambda values: {'q': values['word'][:3]},
+    'filter_guides': lambda values: {'tags': values['tag']},
+    'filter_announcements': lambda values: {'tags': values['tag']},
+    'tag_facets': lambda values: {'type': 'guide'},
+}
+
+_ROUTE_PARAM_RE = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+class Endpoint:
+    """GET-маршрут: ключ (шаблон пути), имя и имена параметров"""
+
+    def __init__(self, key, name, pattern, params):
+        self.key = key
+        self.name = name
+        self.pattern = pattern
+        self.params = params
+
+    def path(self, kwargs):
+        if isinstance(self.pattern, RoutePattern):
+            return _ROUTE_PARAM_RE.sub(lambda match: str(kwargs[match.group(1)]), self.key)
+        return reverse(self.name, kwargs=kwargs)
+
+
+def collect_endpoints(patterns=None, prefix='', namespace=None):
+    """Все маршруты URLconf, кроме EXCLUDED и суффиксов формата DRF"""
+    endpoints = []
+    for entry in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(entry, URLResolver):
+            if entry.namespace in EXCLUDED_NAMESPACES:
+                continue
+            endpoints.extend(collect_endpoints(entry.url_patterns, prefix + str(entry.pattern), entry.namespace))
+            continue
+        if not isinstance(entry, URLPattern):
+            continue
+        params = list(entry.pattern.regex.groupindex)
+        if 'format' in params or entry.name in EXCLUDED:
+            continue
+        name = f'{namespace}:{entry.name}' if namespace and entry.name else entry.name
+        endpoints.append(Endpoint('/' + prefix + str(entry.pattern), name, entry.pattern, params))
+    return endpoints
+
+
+def _first(queryset):
+    return queryset.values_list('pk', flat=True).first()
+
+
+def benchmark_values():
+    """Значения параметров: самые «тяжёлые» объекты базы и их автор"""
+    guide = (
+        Guide.objects.filter(author__is_active=True).annotate(reviews_total=Count('reviews'))
+        .order_by('-reviews_total', 'pk').first()
+    )
+    actor = guide.author if guide else User.objects.filter(is_active=True).order_by('pk').first()
+    if actor is None:
+        return None
+    partner = (
+        ChatMessage.objects.filter(sender=actor).values('receiver')
+        .annotate(total=Count('id')).order_by('-total').values_list('receiver', flat=True).first()
+    )
+    announcement = (
+        Announcement.objects.select_related('author').annotate(total=Count('comments')).order_by('-total', 'pk').first()
+    )
+    tags = guide.tags_normalized if guide else []
+    pk = {name: _first(model.objects.order_by('pk')) for name, model in PK_MODELS.items()}
+    pk.update({
+        'guide_detail': guide.pk if guide else None,
+        'guides-detail': guide.pk if guide else None,
+        'announcements-detail': announcement.pk if announcement else None,
+    })
+    return {
+        'actor': actor,
+        'username': actor.username,
+        'user_id': partner,
+        'guide_id': guide.pk if guide else None,
+        'announcement_id': announcement.pk if announcement else None,
+        'review_id': _first(Review.objects.annotate(total=Count('replies')).order_by('-total', 'pk')),
+        'comment_id': _first(AnnouncementComment.objects.annotate(total=Count('replies')).order_by('-total', 'pk')),
+        'reply_id': _first(ReviewReply.objects.order_by('pk')),
+        'word': guide.title.split()[0] if guide else 'гайд',
+        'tag': tags[0] if tags else 'python',
+        'pk': pk,
+        'owners': {'announcement_id': announcement.author if announcement else None},
+    }
+
+
+def endpoint_kwargs(endpoint, values):
+    """Параметры пути маршрута или None, если подходящего объекта нет"""
+    kwargs = {}
+    for param in endpoint.params:
+        value = values['pk'].get(endpoint.name) if param == 'pk' else values.get(param)
+        if value is None:
+            return None
+        kwargs[param] = value
+    return kwargs
+
+
+def unresolved(endpoints):
+    """Маршруты с параметрами, для которых не известен источник значения"""
+    return [
+        endpoint.key for endpoint in endpoints
+        if any(
+            param not in PATH_PARAMS and not (param == 'pk' and endpoint.name in PK_MODELS)
+            for param in endpoint.params
+        )
+    ]
+
+
+class QueryRecorder:
+    """Обёртка курсора: число запросов и их суммарное время"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def measure(client, path, params=None, headers=None, repeat=DEFAULT_REPEAT):
+    """Замеры одного маршрута; None, если маршрут не отвечает на GET обычным ответом"""
+    response = client.get(path, params, headers=headers)
+    if response.streaming:
+        response.close()
+        return None
+    if response.status_code == 405:
+        return None
+
+    runs = []
+    for _ in range(max(1, repeat)):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = client.get(path, params, headers=headers)
+        total = time.perf_counter() - started
+        runs.append((recorder.count, recorder.seconds, total))
+
+    sql = statistics.median(seconds for _, seconds, _ in runs)
+    total = statistics.median(total for _, _, total in runs)
+    return {
+        'status': response.status_code,
+        'queries': max(count for count, _, _ in runs),
+        'sql_ms': round(sql * 1000, 2),
+        'python_ms': round(max(total - sql, 0) * 1000, 2),
+        'total_ms': round(total * 1000, 2),
+        'bytes': len(response.content),
+    }
+
+
+def run_endpoints(endpoints=None, repeat=DEFAULT_REPEAT, only=None):
+    """
+    Замеряет маршруты на текущей базе. Возвращает (результаты по ключу маршрута,
+    пропущенные маршруты с причиной).
+    """
+    endpoints = collect_endpoints() if endpoints is None else endpoints
+    values = benchmark_values()
+    results, skipped = {}, {}
+    if values is None:
+        return results, {endpoint.key: "нет активных пользователей" for endpoint in endpoints}
+
+    # Страницы — с сессией браузера, API — с JWT, как у настоящих клиентов
+    browser = Client()
+    browser.force_login(values['actor'])
+    api = Client()
+    token = str(RefreshToken.for_user(values['actor']).access_token)
+
+    for endpoint in endpoints:
+        if only and only not in endpoint.key:
+            continue
+        kwargs = endpoint_kwargs(endpoint, values)
+        if kwargs is None:
+            skipped[endpoint.key] = "нет объекта для параметров"
+            continue
+        path = endpoint.path(kwargs)
+        params = QUERY_PARAMS[endpoint.name](values) if endpoint.name in QUERY_PARAMS else None
+        if endpoint.name in OWNER_ROUTES:
+            owner = Client()
+            owner.force_login(values['owners'][OWNER_ROUTES[endpoint.name]])
+            metrics = measure(owner, path, params, None, repeat)
+        elif path.startswith('/api/'):
+            metrics = measure(api, path, params, {'Authorization': f'Bearer {token}'}, repeat)
+        else:
+            metrics = measure(browser, path, params, None, repeat)
+        if metrics is None:
+            skipped[endpoint.key] = "нет GET"
+        elif 300 <= metrics['status'] < 400:
+            skipped[endpoint.key] = f"перенаправление ({metrics['status']})"
+        else:
+            results[endpoint.key] = metrics
+    return results, skipped
+
+
+def compare(baseline, results, latency_factor=DEFAULT_LATENCY_FACTOR, latency_slack_ms=DEFAULT_LATENCY_SLACK_MS):
+    """Нарушения бюджета: список строк вида «объём маршрут: описание»"""
+    failures = []
+    for scale, endpoints in results.items():
+        stored = baseline.get(scale, {})
+        for key, metrics in endpoints.items():
+            if metrics['status'] >= 500:
+                failures.append(f"{scale} {key}: ответ {metrics['status']}")
+            budget = stored.get(key)
+            if budget is None:
+                continue
+            if metrics['queries'] > budget['queries']:
+                failures.append(f"{scale} {key}: запросов {metrics['queries']} > {budget['queries']}")
+            limit = budget['total_ms'] * latency_factor + latency_slack_ms
+            if metrics['total_ms'] > limit:
+                failures.append(f"{scale} {key}: {metrics['total_ms']:.1f} мс > {limit:.1f} мс")
+    return failures
+
+
+def growing_query_counts(results):
+    """Маршруты, у которых число запросов растёт вместе с объёмом данных"""
+    scales = sorted(results, key=lambda scale: int(scale) if scale.isdigit() else 0)
+    growing = {}
+    for key in set().union(*(results[scale] for scale in scales)) if scales else ():
+        counts = [results[scale][key]['queries'] for scale in scales if key in results[scale]]
+        if any(later > earlier for earlier, later in zip(counts, counts[1:])):
+            growing[key] = counts
+    return growing
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(path, baseline):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(baseline, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
@@ -0,0 +1,206 @@
+"""
+Сводки переписок для списка контактов чата.
+
+Для каждой пары собеседников в Conversation хранится превью и время
+последнего сообщения и число непрочитанных у каждой стороны. Отправка
+сообщения обновляет сводку одним INSERT ... ON CONFLICT (сигнал post_save
+ChatMessage), прочтение уменьшает счётчик, поэтому список контактов —
+один запрос по индексу, а не обход всей истории сообщений.
+
+История переписки отдаётся страницами по ключу (created_at, id):
+курсор ``before`` листает назад, ``after`` догружает только новые сообщения.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+from . import realtime
+from .models import ChatMessage, Conversation
+
+PREVIEW_LENGTH = 200
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+REBUILD_SQL = """
+INSERT INTO users_conversation (user_low_id, user_high_id, last_message, last_message_at, unread_low, unread_high)
+SELECT DISTINCT ON (lo, hi)
+    lo,
+    hi,
+    CASE
+        WHEN btrim(message, E' \\t\\r\\n') <> '' THEN left(message, 200)
+        WHEN coalesce(image, '') <> '' THEN 'Картинка'
+        ELSE 'Без сообщений'
+    END,
+    created_at,
+    count(*) FILTER (WHERE NOT is_read AND receiver_id = lo) OVER pair,
+    count(*) FILTER (WHERE NOT is_read AND receiver_id = hi) OVER pair
+FROM (
+    SELECT *, least(sender_id, receiver_id) AS lo, greatest(sender_id, receiver_id) AS hi
+    FROM users_chatmessage
+) m
+WINDOW pair AS (PARTITION BY lo, hi)
+ORDER BY lo, hi, created_at DESC, id DESC
+"""
+
+
+def ordered_pair(first_id, second_id):
+    return (first_id, second_id) if first_id <= second_id else (second_id, first_id)
+
+
+def message_preview(message):
+    """Текст для списка контактов: начало сообщения или пометка о картинке"""
+    if message.message.strip():
+        return message.message[:PREVIEW_LENGTH]
+    if message.image:
+        return "Картинка"
+    return "Без сообщений"
+
+
+def conversations_for(user):
+    """Переписки пользователя, начиная с самой свежей"""
+    return (
+        Conversation.objects
+        .filter(Q(user_low=user) | Q(user_high=user))
+        .select_related('user_low__profile', 'user_high__profile')
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
+
+
+def contact_entry(conversation, user):
+    """Строка списка контактов с точки зрения ``user``"""
+    if conversation.user_low_id == user.id:
+        other, unread = conversation.user_high, conversation.unread_low
+    else:
+        other, unread = conversation.user_low, conversation.unread_high
+    profile = getattr(other, 'profile', None)
+    return {
+        "user_id": other.id,
+        "username": other.username,
+        "avatar": profile.avatar.url if profile is not None and profile.avatar else None,
+        "last_message": conversation.last_message,
+        "last_message_at": conversation.last_message_at,
+        "unread_count": unread,
+    }
+
+
+def record_message(message):
+    """Учитывает новое сообщение в сводке пары (создаёт её при первом сообщении)"""
+    low, high = ordered_pair(message.sender_id, message.receiver_id)
+    unread_low = int(not message.is_read and message.receiver_id == low)
+    unread_high = int(not message.is_read and message.receiver_id == high and low != high)
+    table = Conversation._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (user_low_id, user_high_id, last_message, last_message_at, unread_low, unread_high)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (user_low_id, user_high_id) DO UPDATE SET
+                last_message = CASE
+                    WHEN {table}.last_message_at IS NULL OR {table}.last_message_at <= EXCLUDED.last_message_at
+                    THEN EXCLUDED.last_message ELSE {table}.last_message END,
+                last_message_at = GREATEST({table}.last_message_at, EXCLUDED.last_message_at),
+                unread_low = {table}.unread_low + EXCLUDED.unread_low,
+                unread_high = {table}.unread_high + EXCLUDED.unread_high
+            """,
+            [low, high, message_preview(message), message.created_at, unread_low, unread_high],
+        )
+
+
+def mark_read(reader, other, messages=None):
+    """
+    Помечает входящие от ``other`` сообщения прочитанными и уменьшает
+    счётчик непрочитанных у ``reader`` на число реально изменённых строк.
+    ``messages`` ограничивает набор сообщений (по умолчанию — все).
+    """
+    if messages is None:
+        messages = ChatMessage.objects.all()
+    with transaction.atomic():
+        updated = messages.filter(sender=other, receiver=reader, is_read=False).update(is_read=True)
+        if updated:
+            low, high = ordered_pair(reader.id, other.id)
+            field = 'unread_low' if reader.id == low else 'unread_high'
+            Conversation.objects.filter(user_low_id=low, user_high_id=high).update(
+                **{field: Greatest(F(field) - updated, Value(0))}
+            )
+            transaction.on_commit(lambda: realtime.publish_read(reader.id, other.id, updated))
+    return updated
+
+
+def rebuild_conversations():
+    """Пересобирает все сводки по таблице сообщений (первичное заполнение и восстановление)"""
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL)
+        return Conversation.objects.count()
+
+
+def encode_cursor(message):
+    raw = f"{message.created_at.isoformat()}|{message.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) из курсора; ValueError, если курсор повреждён"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Некорректный курсор") from exc
+
+
+def history_page(user, other, before=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Страница переписки двух пользователей в хронологическом порядке.
+    Без курсоров — самые новые сообщения; ``before`` — сообщения старше курсора,
+    ``after`` — новее курсора. Возвращает (сообщения, есть_ли_ещё_в_этом_направлении).
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    messages = ChatMessage.objects.filter(
+        Q(sender=user, receiver=other) | Q(sender=other, receiver=user)
+    ).select_related('sender', 'receiver')
+
+    if after is not None:
+        created_at, pk = decode_cursor(after)
+        messages = messages.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        rows = list(messages.order_by('created_at', 'id')[:limit + 1])
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        created_at, pk = decode_cursor(before)
+        messages = messages.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    rows = list(messages.order_by('-created_at', '-id')[:limit + 1])
+    return rows[:limit][::-1], len(rows) > limit
+
+
+def read_history(reader, other, before=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Страница истории для ``reader`` с курсорами для следующих запросов.
+    Прочитанными помечаются только входящие сообщения этой страницы.
+    """
+    messages, has_more = history_page(reader, other, before=before, after=after, limit=limit)
+
+    unread_ids = [m.pk for m in messages if m.receiver_id == reader.id and not m.is_read]
+    if unread_ids:
+        mark_read(reader, other, ChatMessage.objects.filter(pk__in=unread_ids))
+        for message in messages:
+            if message.pk in unread_ids:
+                message.is_read = True
+
+    if messages:
+        after_cursor = encode_cursor(messages[-1])
+    else:
+        after_cursor = after
+    before_cursor = encode_cursor(messages[0]) if messages and has_more and after is None else None
+    return {
+        'messages': messages,
+        'before_cursor': before_cursor,
+        'after_cursor': after_cursor,
+        'has_more': has_more,
+    }
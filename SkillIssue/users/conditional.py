@@ -0,0 +1,230 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для руководств и объявлений.
+
+Валидаторы считаются одним лёгким запросом без рендера и сериализации:
+updated_at и счётчики самой записи, а для страниц с обсуждением — сводка
+отзывов/комментариев и ответов на них (число, последнее изменение, суммы
+лайков, см. _thread_stats). Число строк в сводке ловит удаления, суммы
+лайков и поля рейтинга — изменения через QuerySet.update(), которые
+updated_at не трогают. Если валидаторы совпали с If-None-Match /
+If-Modified-Since, клиент получает 304 без markdown и сериализатора.
+
+В ETag входит id пользователя, потому что страница зависит от того, кто
+её смотрит (свои оценки, избранное, кнопки редактирования), поэтому ответы
+помечаются Vary: Cookie, Authorization. Свои лайки и дизлайки зрителя в
+обсуждении входят в ETag сводкой (число, максимальный id, число лайков,
+см. _viewer_votes): снятие оценки с одного отзыва и лайк другого меняют
+максимальный id, смена лайка на дизлайк — число лайков. ETag точнее Last-Modified (удаление
+старого комментария время не сдвигает), а по RFC 9110 при наличии обоих
+заголовков в запросе проверяется If-None-Match.
+"""
+import functools
+import hashlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Exists, JSONField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import JSONObject
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+
+from .models import Announcement, AnnouncementComment, AnnouncementCommentRating, AnnouncementCommentReply, \
+    AnnouncementCommentReplyRating, FavoriteAnnouncement, Guide, GuideReviewRating, Review, ReviewReply, \
+    ReviewReplyRating
+
+
+class Validators:
+    """ETag и время последнего изменения ресурса"""
+
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def make_etag(*parts):
+    raw = DjangoJSONEncoder().encode(parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _user_key(user):
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def _thread_stats(model, link):
+    """Сводка по записям ``model``, привязанным через ``link`` к внешней строке"""
+    rows = (
+        model.objects.filter(**{link: OuterRef('pk')}).order_by().values(link)
+        .annotate(stats=JSONObject(
+            count=Count('id'),
+            updated=Max('updated_at'),
+            likes=Sum('likes_count'),
+            dislikes=Sum('dislikes_count'),
+        ))
+        .values('stats')
+    )
+    return Subquery(rows, output_field=JSONField())
+
+
+def _viewer_votes(model, link, user):
+    """Сводка оценок ``user`` (``model`` — таблица лайков/дизлайков), привязанных через ``link``"""
+    rows = (
+        model.objects.filter(user=user, **{link: OuterRef('pk')}).order_by().values(link)
+        .annotate(stats=JSONObject(
+            count=Count('id'),
+            last=Max('id'),
+            likes=Count('id', filter=Q(is_like=True)),
+        ))
+        .values('stats')
+    )
+    return Subquery(rows, output_field=JSONField())
+
+
+def _latest(*values):
+    moments = []
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get('updated')
+        if isinstance(value, str):
+            value = parse_datetime(value)
+        if value is not None:
+            moments.append(value)
+    return max(moments) if moments else None
+
+
+def guide_validators(pk, user=None, with_reviews=False):
+    """Валидаторы руководства; ``with_reviews`` — для страницы с отзывами"""
+    queryset = Guide.objects.filter(pk=pk).values('updated_at', 'rating', 'rating_count', 'author__username')
+    if with_reviews:
+        queryset = queryset.annotate(
+            reviews=_thread_stats(Review, 'guide'),
+            replies=_thread_stats(ReviewReply, 'review__guide'),
+        )
+        if _user_key(user) is not None:
+            queryset = queryset.annotate(
+                own_review_votes=_viewer_votes(GuideReviewRating, 'review__guide', user),
+                own_reply_votes=_viewer_votes(ReviewReplyRating, 'reply__review__guide', user),
+            )
+    row = queryset.first()
+    if row is None:
+        return None
+    return Validators(
+        make_etag('guide', pk, row, _user_key(user)),
+        _latest(row['updated_at'], row.get('reviews'), row.get('replies')),
+    )
+
+
+def announcement_validators(pk, user=None, with_comments=False):
+    """Валидаторы объявления; ``with_comments`` — для страницы с комментариями"""
+    queryset = Announcement.objects.filter(pk=pk).values('updated_at', 'author__username')
+    if with_comments:
+        queryset = queryset.annotate(
+            comments=_thread_stats(AnnouncementComment, 'announcement'),
+            replies=_thread_stats(AnnouncementCommentReply, 'comment__announcement'),
+        )
+        if _user_key(user) is not None:
+            queryset = queryset.annotate(
+                favorited=Exists(FavoriteAnnouncement.objects.filter(user=user, announcement=OuterRef('pk'))),
+                own_comment_votes=_viewer_votes(AnnouncementCommentRating, 'comment__announcement', user),
+                own_reply_votes=_viewer_votes(AnnouncementCommentReplyRating, 'reply__comment__announcement', user),
+            )
+    row = queryset.first()
+    if row is None:
+        return None
+    return Validators(
+        make_etag('announcement', pk, row, _user_key(user)),
+        _latest(row['updated_at'], row.get('comments'), row.get('replies')),
+    )
+
+
+def guide_page_validators(request, pk):
+    return guide_validators(pk, request.user, with_reviews=True)
+
+
+def announcement_page_validators(request, announcement_id):
+    return announcement_validators(announcement_id, request.user, with_comments=True)
+
+
+def page_validators(items, *extra):
+    """Валидаторы страницы списка по уже загруженным строкам (id, updated_at и т.п.)"""
+    fields = ('pk', 'updated_at', 'rating')
+    rows = [[getattr(item, name, None) for name in fields] for item in items]
+    return Validators(make_etag('page', rows, *extra), _latest(*(item.updated_at for item in items)))
+
+
+def not_modified(request, validators):
+    """Ответ 304 (или 412), если клиентская копия актуальна; иначе None"""
+    if validators is None or request.method not in ('GET', 'HEAD'):
+        return None
+    last_modified = validators.last_modified.timestamp() if validators.last_modified else None
+    response = get_conditional_response(request, etag=validators.etag, last_modified=last_modified)
+    if response is not None:
+        _apply(response, validators)
+    return response
+
+
+def _apply(response, validators):
+    response['ETag'] = validators.etag
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.last_modified.timestamp())
+    patch_vary_headers(response, ('Cookie', 'Authorization'))
+    return response
+
+
+def with_validators(response, validators):
+    """Проставляет ETag / Last-Modified на успешный ответ"""
+    if validators is not None and response.status_code == 200:
+        _apply(response, validators)
+    return response
+
+
+def conditional_view(get_validators):
+    """
+    Декоратор функции-представления: ``get_validators(request, *args, **kwargs)``
+    считает валидаторы, при совпадении представление не вызывается.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            validators = get_validators(request, *args, **kwargs)
+            response = not_modified(request, validators)
+            if response is not None:
+                return response
+            return with_validators(view(request, *args, **kwargs), validators)
+        return wrapper
+    return decorator
+
+
+class ConditionalViewSetMixin:
+    """
+    Условные GET для list и retrieve ViewSet-а. ``object_validators`` —
+    функция (pk) -> Validators; для списка валидаторы считаются по строкам
+    страницы, поэтому 304 экономит сериализацию, но не сам запрос страницы.
+    """
+    object_validators = None
+
+    def get_object_validators(self):
+        try:
+            return type(self).object_validators(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_object_validators()
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return with_validators(super().retrieve(request, *args, **kwargs), validators)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return super().list(request, *args, **kwargs)
+
+        validators = page_validators(page, self.paginator.get_next_link(),
+                                     getattr(self.paginator, 'estimated_count', None))
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(page, many=True)
+        return with_validators(self.get_paginated_response(serializer.data), validators)
@@ -1,7 +1,8 @@
 """
-Контекстный процессор для передачи языка пользователя в шаблоны.
-Читает язык из cookies и передает его в контекст всех шаблонов.
+Контекстные процессоры: язык пользователя из cookies и доступность
+потока событий чата для виджета чата.
 """
+from django.conf import settings
 
 
 def user_language(request):
@@ -15,3 +16,8 @@ def user_language(request):
         language = 'RU'
     return {'user_language': language}
 
+
+
+def chat_stream(request):
+    """Включён ли поток событий чата (CHAT_STREAM_ENABLED, только под ASGI)"""
+    return {'chat_stream_enabled': getattr(settings, 'CHAT_STREAM_ENABLED', False)}
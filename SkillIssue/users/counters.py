@@ -0,0 +1,89 @@
+"""
+Точные счётчики платформы без COUNT(*) на каждый запрос.
+
+В единственной строке PlatformCounter хранится число руководств, объявлений,
+активных пользователей и отзывов. Сигналы (users/signals.py) меняют её
+атомарным UPDATE ... SET x = x + 1 при создании, удалении и активации
+записей, поэтому /api/statistics/ читает одну строку. Изменения в обход
+сигналов (QuerySet.update, bulk_create, правки в базе) дают расхождение,
+которое исправляет периодический запуск ``manage.py reconcile_counters``.
+"""
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Announcement, Guide, PlatformCounter, ProfileReview, Review
+
+COUNTER_PK = 1
+
+COUNTED = {
+    'guides': lambda: Guide.objects.all(),
+    'announcements': lambda: Announcement.objects.all(),
+    'active_users': lambda: User.objects.filter(is_active=True),
+    'reviews': lambda: Review.objects.all(),
+    'profile_reviews': lambda: ProfileReview.objects.all(),
+}
+
+
+def change(**deltas):
+    """Сдвигает счётчики на ``deltas`` (например, guides=1) одним UPDATE"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = PlatformCounter.objects.filter(pk=COUNTER_PK).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        # Строки ещё нет (например, таблицу очистили) — считаем с нуля
+        reconcile()
+
+
+def expected_counts():
+    """Точные значения по исходным таблицам — один запрос с подзапросами COUNT"""
+    parts = []
+    for queryset in COUNTED.values():
+        sql, params = queryset().values('pk').query.sql_with_params()
+        parts.append((f'(SELECT count(*) FROM ({sql}) t)', params))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT ' + ', '.join(sql for sql, _ in parts),
+            [param for _, params in parts for param in params],
+        )
+        return dict(zip(COUNTED, cursor.fetchone()))
+
+
+def reconcile():
+    """
+    Пересчитывает счётчики по исходным таблицам.
+    Возвращает расхождения {поле: (было, стало)}; пустой словарь — всё сходилось.
+    """
+    with transaction.atomic():
+        counter, _ = PlatformCounter.objects.select_for_update().get_or_create(pk=COUNTER_PK)
+        expected = expected_counts()
+        drift = {
+            field: (getattr(counter, field), value)
+            for field, value in expected.items()
+            if getattr(counter, field) != value
+        }
+        PlatformCounter.objects.filter(pk=COUNTER_PK).update(reconciled_at=timezone.now(), **expected)
+    return drift
+
+
+def read():
+    counter = PlatformCounter.objects.filter(pk=COUNTER_PK).first()
+    if counter is None:
+        reconcile()
+        counter = PlatformCounter.objects.get(pk=COUNTER_PK)
+    return counter
+
+
+def statistics():
+    """Данные /api/statistics/ из строки счётчиков"""
+    counter = read()
+    return {
+        'guides': counter.guides,
+        'announcements': counter.announcements,
+        'users': counter.active_users,
+        'ratings': counter.reviews + counter.profile_reviews,
+    }
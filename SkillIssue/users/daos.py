@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, date
 from .dto import GuideInfoDTO
+from .tags import filter_by_tags
 
 class UserDAO:
     """DAO для профилей"""
@@ -85,7 +86,7 @@ class GuideDAO:
             guides = guides.filter(author=author)
 
         if tag:
-            guides = guides.filter(tags__contains=[tag])
+            guides = filter_by_tags(guides, [tag])
 
         if min_rating:
             guides = guides.filter(rating__gte=min_rating)
@@ -158,7 +159,7 @@ class AnnouncementDAO:
 
     @staticmethod
     def get_by_tag(tag):
-        return Announcement.objects.filter(tags__contains=[tag])
+        return filter_by_tags(Announcement.objects.all(), [tag])
 
 class GuideRatingDAO:
     """DAO для рейтинга руководств"""
@@ -0,0 +1,115 @@
+"""
+Счётчики тегов (фасеты) для руководств и объявлений.
+
+Таблица TagUsage хранит количество объектов с каждым тегом и обновляется
+инкрементально сигналами при сохранении и удалении, поэтому облако тегов
+(/api/tags/facets/) читается одним запросом по индексу без обхода объектов.
+
+Фасеты эндпоинтов фильтрации (?facets=1) описывают найденное, а не всю
+таблицу, поэтому считаются по отфильтрованному queryset: GROUP BY по
+развёрнутому tags_normalized совпавших строк (queryset_tag_facets).
+"""
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Announcement, Guide, TagUsage
+
+TARGET_GUIDE = 'GUIDE'
+TARGET_ANNOUNCEMENT = 'ANNOUNCEMENT'
+
+FACETS_LIMIT = 50
+FACETS_MAX_LIMIT = 500
+
+# Тип объекта из параметра запроса ?type=
+TARGET_TYPES = {
+    'guide': TARGET_GUIDE,
+    'guides': TARGET_GUIDE,
+    'announcement': TARGET_ANNOUNCEMENT,
+    'announcements': TARGET_ANNOUNCEMENT,
+}
+
+_MODELS = {
+    TARGET_GUIDE: Guide,
+    TARGET_ANNOUNCEMENT: Announcement,
+}
+
+
+def facets_requested(request):
+    return request.GET.get('facets', '').strip().lower() in ('1', 'true', 'yes')
+
+
+def target_type_for(model):
+    return TARGET_GUIDE if model is Guide else TARGET_ANNOUNCEMENT
+
+
+def increment_tags(target_type, tags):
+    """Атомарно увеличивает счётчики тегов, создавая недостающие строки (INSERT ... ON CONFLICT)"""
+    if not tags:
+        return
+    table = TagUsage._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (target_type, tag, count)
+            SELECT %s, tag, 1 FROM unnest(%s::text[]) AS tag
+            ON CONFLICT (target_type, tag) DO UPDATE SET count = {table}.count + 1
+            """,
+            [target_type, list(tags)],
+        )
+
+
+def decrement_tags(target_type, tags):
+    if not tags:
+        return
+    TagUsage.objects.filter(target_type=target_type, tag__in=tags, count__gt=0).update(count=F('count') - 1)
+
+
+def apply_tags_delta(target_type, added, removed):
+    increment_tags(target_type, added)
+    decrement_tags(target_type, removed)
+
+
+def tag_facets(target_type, limit=FACETS_LIMIT):
+    """Самые популярные теги: [{'tag': ..., 'count': ...}]"""
+    limit = max(1, min(limit, FACETS_MAX_LIMIT))
+    return list(
+        TagUsage.objects.filter(target_type=target_type, count__gt=0)
+        .order_by('-count', 'tag')
+        .values('tag', 'count')[:limit]
+    )
+
+
+def queryset_tag_facets(queryset, limit=FACETS_LIMIT):
+    """Теги строк ``queryset`` с числом строк для каждого: [{'tag': ..., 'count': ...}]"""
+    limit = max(1, min(limit, FACETS_MAX_LIMIT))
+    sql, params = queryset.order_by().values('tags_normalized').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT tag, count(*) AS count
+            FROM ({sql}) AS matched, unnest(matched.tags_normalized) AS tag
+            GROUP BY tag
+            ORDER BY count DESC, tag
+            LIMIT %s
+            """,
+            [*params, limit],
+        )
+        return [{'tag': tag, 'count': count} for tag, count in cursor.fetchall()]
+
+
+def rebuild_tag_usage():
+    """Пересчитывает все счётчики по колонке tags_normalized (восстановление после сбоев)"""
+    table = TagUsage._meta.db_table
+    with transaction.atomic():
+        TagUsage.objects.all().delete()
+        with connection.cursor() as cursor:
+            for target_type, model in _MODELS.items():
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (target_type, tag, count)
+                    SELECT %s, tag, count(*)
+                    FROM {model._meta.db_table}, unnest(tags_normalized) AS tag
+                    GROUP BY tag
+                    """,
+                    [target_type],
+                )
@@ -0,0 +1,153 @@
+"""
+Кэш агрегатов главной страницы: /api/popular-items/ и /api/statistics/.
+
+Оба эндпоинта дёргаются на каждый визит, а данные меняются редко, поэтому
+результат хранится в кэше Django (настройка HOMEPAGE_CACHE_TTL, секунды).
+Запись считается свежей ``ttl`` секунд, после этого ещё ``ttl`` секунд
+хранится как устаревшая: пересчитывает её один запрос (блокировка через
+cache.add), остальные в это время получают устаревшее значение. Пустой кэш
+внутри процесса заполняет один поток, остальные ждут его результата.
+
+Сигналы (users/signals.py) при изменении руководств, объявлений, оценок
+и пользователей помечают записи устаревшими, а не удаляют их, чтобы
+инвалидация под нагрузкой не превращалась в лавину одинаковых пересчётов.
+С кэшем по умолчанию (LocMemCache) каждый воркер держит свою копию;
+общий бэкенд в CACHES делает кэш и инвалидацию общими для всех процессов.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import counters, metrics
+from .models import Announcement, Guide
+
+DEFAULT_TTL = 60
+
+# Сколько секунд держится блокировка пересчёта, если пересчитывающий процесс упал
+REBUILD_LOCK_TIMEOUT = 30
+
+POPULAR_KEY = 'homepage:popular'
+STATISTICS_KEY = 'homepage:statistics'
+
+POPULAR_LIMIT = 5
+CAROUSEL_LIMIT = 6
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def homepage_ttl():
+    return getattr(settings, 'HOMEPAGE_CACHE_TTL', DEFAULT_TTL)
+
+
+def _local_lock(key):
+    with _local_locks_guard:
+        return _local_locks.setdefault(key, threading.Lock())
+
+
+def _store(key, value, ttl):
+    cache.set(key, {'value': value, 'fresh_until': time.time() + ttl}, ttl * 2)
+    return value
+
+
+def cached(key, build):
+    """Значение ``key`` из кэша; ``build()`` вызывается не более чем одним запросом за раз"""
+    ttl = homepage_ttl()
+    if ttl <= 0:
+        return build()
+
+    entry = cache.get(key)
+    if entry is not None:
+        if entry['fresh_until'] > time.time():
+            metrics.CACHE_REQUESTS.inc(cache=key, result='hit')
+            return entry['value']
+        # Устарело: пересчитывает тот, кто взял блокировку, остальные отдают старое
+        metrics.CACHE_REQUESTS.inc(cache=key, result='stale')
+        lock_key = f'{key}:rebuild'
+        if not cache.add(lock_key, 1, REBUILD_LOCK_TIMEOUT):
+            return entry['value']
+        try:
+            return _store(key, build(), ttl)
+        finally:
+            cache.delete(lock_key)
+
+    metrics.CACHE_REQUESTS.inc(cache=key, result='miss')
+    with _local_lock(key):
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+        return _store(key, build(), ttl)
+
+
+def invalidate(*keys):
+    """Помечает записи устаревшими; следующий запрос запустит один пересчёт"""
+    for key in keys:
+        entry = cache.get(key)
+        if entry is not None:
+            entry['fresh_until'] = 0
+            cache.set(key, entry, homepage_ttl())
+
+
+def invalidate_popular():
+    invalidate(POPULAR_KEY)
+
+
+def invalidate_statistics():
+    invalidate(STATISTICS_KEY)
+
+
+def _build_popular():
+    guides = (
+        Guide.objects.select_related('author')
+        .only('id', 'title', 'image', 'rating', 'author__username')
+        .order_by('-rating', '-created_at')[:POPULAR_LIMIT]
+    )
+    announcements = (
+        Announcement.objects.select_related('author')
+        .only('id', 'title', 'image', 'author__username')
+        .order_by('-created_at')[:POPULAR_LIMIT]
+    )
+    return {
+        'guides': [{
+            'id': guide.id,
+            'title': guide.title,
+            'image': guide.image.url if guide.image else None,
+            'author': guide.author.username,
+            'rating': guide.rating,
+            'url': f'/guides/{guide.id}/',
+            'type': 'guide',
+        } for guide in guides],
+        'announcements': [{
+            'id': announcement.id,
+            'title': announcement.title,
+            'image': announcement.image.url if announcement.image else None,
+            'author': announcement.author.username,
+            'url': f'/announcements/{announcement.id}/',
+            'type': 'announcement',
+        } for announcement in announcements],
+    }
+
+
+def popular_items(request=None):
+    """Популярные руководства и объявления; адреса картинок абсолютные, если передан ``request``"""
+    data = cached(POPULAR_KEY, _build_popular)
+
+    def absolute(item):
+        if request is not None and item['image']:
+            return {**item, 'image': request.build_absolute_uri(item['image'])}
+        return item
+
+    guides = [absolute(item) for item in data['guides']]
+    announcements = [absolute(item) for item in data['announcements']]
+    return {
+        'guides': guides,
+        'announcements': announcements,
+        'items': (guides + announcements)[:CAROUSEL_LIMIT],
+    }
+
+
+def statistics():
+    """Число руководств, объявлений, активных пользователей и отзывов из PlatformCounter"""
+    return cached(STATISTICS_KEY, counters.statistics)
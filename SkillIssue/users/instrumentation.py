@@ -0,0 +1,193 @@
+"""
+Замеры каждого запроса: SQL, шаблоны, сериализация (включается настройкой).
+
+RequestInstrumentationMiddleware стоит первой в MIDDLEWARE и при
+REQUEST_INSTRUMENTATION = False отключается сразу при старте (MiddlewareNotUsed).
+Когда она включена, курсоры всех соединений оборачиваются через
+connection.execute_wrapper: считаются запросы, их время и повторы
+(одинаковый SQL с теми же параметрами — дубликат, тот же SQL с другими —
+похожий запрос, типичный признак N+1). Рендер шаблонов Django и
+сериализация DRF (Serializer.data и JSONRenderer) засекаются обёртками,
+которые ставятся один раз при создании middleware; вложенные вызовы
+не считаются дважды. Время шаблонов включает запросы, выполненные
+из шаблона (ленивые QuerySet), поэтому отрезки Server-Timing пересекаются.
+
+Итог отдаётся заголовком Server-Timing (виден в DevTools браузера) и одной
+JSON-строкой в логгер ``users.instrumentation``: INFO для обычных запросов,
+WARNING с именем представления и самым частым SQL, если запрос превысил
+REQUEST_INSTRUMENTATION_MAX_QUERIES или REQUEST_INSTRUMENTATION_MAX_MS.
+Потоковые ответы замеряются до начала отдачи тела.
+"""
+import contextvars
+import functools
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUERIES = 50
+DEFAULT_MAX_MS = 500
+
+TEMPLATES = 'tpl'
+SERIALIZATION = 'ser'
+
+TOP_QUERY_LENGTH = 300
+
+_current = contextvars.ContextVar('request_stats', default=None)
+_hooks_installed = False
+
+
+class RequestStats:
+    """Счётчики одного запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = Counter()
+        self.exact = Counter()
+        self.sections = defaultdict(float)
+        self._depth = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+            if not many:
+                self.exact[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.exact.values())
+
+    @property
+    def similar(self):
+        return sum(count - 1 for count in self.statements.values())
+
+    def top_query(self):
+        if not self.statements:
+            return None
+        sql, count = self.statements.most_common(1)[0]
+        return {'sql': sql[:TOP_QUERY_LENGTH], 'count': count}
+
+
+@contextmanager
+def timed(section):
+    """Засекает отрезок ``section`` текущего запроса (вложенные вызовы — один раз)"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats._depth[section] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._depth[section] -= 1
+        if not stats._depth[section]:
+            stats.sections[section] += time.perf_counter() - started
+
+
+def _timed_function(function, section):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with timed(section):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def install_hooks():
+    """Оборачивает рендер шаблонов и сериализацию DRF (один раз на процесс)"""
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    from django.template.base import Template
+    from rest_framework import renderers, serializers
+
+    Template.render = _timed_function(Template.render, TEMPLATES)
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        serializer_class.data = property(_timed_function(serializer_class.data.fget, SERIALIZATION))
+    renderers.JSONRenderer.render = _timed_function(renderers.JSONRenderer.render, SERIALIZATION)
+    _hooks_installed = True
+
+
+def server_timing(stats, total):
+    parts = [f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries, {stats.duplicates} duplicate"']
+    if TEMPLATES in stats.sections:
+        parts.append(f'tpl;dur={stats.sections[TEMPLATES] * 1000:.1f};desc="templates"')
+    if SERIALIZATION in stats.sections:
+        parts.append(f'ser;dur={stats.sections[SERIALIZATION] * 1000:.1f};desc="serialization"')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else None
+
+
+def report(request, response, stats, total):
+    """Заголовок Server-Timing и строка лога; возвращает данные строки"""
+    timing = server_timing(stats, total)
+    if response.has_header('Server-Timing'):
+        timing = f"{response['Server-Timing']}, {timing}"
+    response['Server-Timing'] = timing
+
+    payload = {
+        'method': request.method,
+        'path': request.path,
+        'view': view_name(request),
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 1),
+        'db_ms': round(stats.sql_seconds * 1000, 1),
+        'queries': stats.queries,
+        'duplicates': stats.duplicates,
+        'similar': stats.similar,
+        'template_ms': round(stats.sections.get(TEMPLATES, 0) * 1000, 1),
+        'serialize_ms': round(stats.sections.get(SERIALIZATION, 0) * 1000, 1),
+    }
+    flags = []
+    if stats.queries > getattr(settings, 'REQUEST_INSTRUMENTATION_MAX_QUERIES', DEFAULT_MAX_QUERIES):
+        flags.append('queries')
+    if payload['total_ms'] > getattr(settings, 'REQUEST_INSTRUMENTATION_MAX_MS', DEFAULT_MAX_MS):
+        flags.append('latency')
+    if flags:
+        payload['flags'] = flags
+        payload['top_query'] = stats.top_query()
+    logger.log(logging.WARNING if flags else logging.INFO, json.dumps(payload, ensure_ascii=False),
+               extra={'request_stats': payload})
+    return payload
+
+
+class RequestInstrumentationMiddleware:
+    """Замеры запроса; отключена, пока REQUEST_INSTRUMENTATION не включена"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_hooks()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats.record_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        report(request, response, stats, time.perf_counter() - started)
+        return response
@@ -0,0 +1,77 @@
+import random
+import re
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.utils import BlacklistMatcher
+
+
+def _legacy_filter(entries, text):
+    """Прежняя реализация: отдельный re.sub на каждое слово"""
+    for word, replacement, case_sensitive in entries:
+        flags = 0 if case_sensitive else re.IGNORECASE
+        text = re.sub(r'\b' + re.escape(word) + r'\b', replacement, text, flags=flags)
+    return text
+
+
+def _random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def _best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = "Микробенчмарк фильтра блэк-листа: старый построчный re.sub против общего выражения"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='100,1000,10000',
+            help="Размеры блэк-листа через запятую",
+        )
+        parser.add_argument(
+            '--text-words',
+            type=int,
+            default=200,
+            help="Количество слов в тестовом тексте (примерно комментарий)",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="Число повторов, берётся лучшее время")
+        parser.add_argument('--no-legacy', action='store_true', help="Не измерять старую реализацию")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f"{'слов':>8} {'сборка, мс':>12} {'фильтр, мс':>12} {'старый, мс':>12}")
+        for size in sizes:
+            words = {_random_word(rng) for _ in range(size)}
+            entries = [(word, '****', index % 5 == 0) for index, word in enumerate(sorted(words))]
+            sample = [word for word, _, _ in entries]
+            text = ' '.join(
+                rng.choice(sample) if rng.random() < 0.05 else _random_word(rng)
+                for _ in range(options['text_words'])
+            )
+
+            started = time.perf_counter()
+            matcher = BlacklistMatcher(entries)
+            build = time.perf_counter() - started
+            matched = _best_time(lambda: matcher.sub(text), repeat)
+
+            legacy = '—'
+            if not options['no_legacy']:
+                legacy = f"{_best_time(lambda: _legacy_filter(entries, text), repeat) * 1000:12.2f}"
+                if _legacy_filter(entries, text) != matcher.sub(text):
+                    self.stderr.write(f"Результаты расходятся для {size} слов")
+
+            self.stdout.write(f"{len(entries):>8} {build * 1000:12.2f} {matched * 1000:12.3f} {legacy:>12}")
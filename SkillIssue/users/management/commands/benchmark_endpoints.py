@@ -0,0 +1,103 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from users.benchmarks import DEFAULT_LATENCY_FACTOR, DEFAULT_LATENCY_SLACK_MS, DEFAULT_REPEAT, collect_endpoints, \
+    compare, growing_query_counts, load_baseline, run_endpoints, save_baseline, unresolved
+from users.seeding import seed
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'endpoints.json'
+
+
+class Command(BaseCommand):
+    help = (
+        "Бенчмарк всех GET-маршрутов на синтетических данных нескольких объёмов: "
+        "число и время SQL-запросов, время Python, размер ответа; сверка с базовой линией"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='100,1000',
+                            help="Числа пользователей через запятую (для каждого — отдельная база)")
+        parser.add_argument('--current-db', action='store_true',
+                            help="Замерить текущую базу без генерации данных (объём «current»)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных")
+        parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Замеров на маршрут (медиана)")
+        parser.add_argument('--only', default=None, help="Замерить только маршруты, содержащие подстроку")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Файл базовой линии (JSON)")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Записать результаты в базовую линию вместо сверки")
+        parser.add_argument('--latency-factor', type=float, default=DEFAULT_LATENCY_FACTOR,
+                            help="Допустимое замедление относительно базовой линии, раз")
+        parser.add_argument('--latency-slack', type=float, default=DEFAULT_LATENCY_SLACK_MS,
+                            help="Абсолютный допуск по времени, мс")
+
+    def handle(self, *args, **options):
+        endpoints = collect_endpoints()
+        missing = unresolved(endpoints)
+        if missing:
+            raise CommandError(f"Нет значений параметров для маршрутов: {', '.join(missing)} (см. users/benchmarks.py)")
+
+        results = {}
+        setup_test_environment()
+        try:
+            if options['current_db']:
+                results['current'] = self.run_scale('current', endpoints, options)
+            else:
+                for scale in [int(value) for value in options['scales'].split(',') if value.strip()]:
+                    results[str(scale)] = self.run_seeded(scale, endpoints, options)
+        finally:
+            teardown_test_environment()
+
+        path = Path(options['baseline'])
+        baseline = load_baseline(path)
+        if options['update_baseline']:
+            if options['only']:
+                # Частичный прогон обновляет только замеренные маршруты
+                for scale, endpoints in results.items():
+                    baseline.setdefault(scale, {}).update(endpoints)
+            else:
+                baseline.update(results)
+            save_baseline(path, baseline)
+            self.stdout.write(self.style.SUCCESS(f"Базовая линия записана: {path}"))
+            return
+
+        for key, counts in sorted(growing_query_counts(results).items()):
+            self.stdout.write(self.style.WARNING(f"Число запросов растёт с объёмом: {key} {counts}"))
+        if not baseline:
+            self.stdout.write(self.style.WARNING(f"Базовой линии нет ({path}), сверка пропущена"))
+        failures = compare(baseline, results, options['latency_factor'], options['latency_slack'])
+        if failures:
+            raise CommandError("Превышены бюджеты:\n" + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS("Все маршруты укладываются в бюджеты"))
+
+    def run_seeded(self, scale, endpoints, options):
+        """Отдельная тестовая база на каждый объём: миграции, генерация, замеры, удаление"""
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            seed(users=scale, seed=options['seed'])
+            return self.run_scale(scale, endpoints, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_scale(self, scale, endpoints, options):
+        cache.clear()
+        results, skipped = run_endpoints(endpoints, repeat=options['repeat'], only=options['only'])
+
+        self.stdout.write(f"\nОбъём: {scale}")
+        self.stdout.write(
+            f"{'маршрут':<60} {'код':>4} {'запр.':>6} {'SQL, мс':>9} {'Python, мс':>11} {'всего, мс':>10} {'КБ':>8}"
+        )
+        for key, metrics in results.items():
+            self.stdout.write(
+                f"{key:<60} {metrics['status']:>4} {metrics['queries']:>6} {metrics['sql_ms']:>9.1f} "
+                f"{metrics['python_ms']:>11.1f} {metrics['total_ms']:>10.1f} {metrics['bytes'] / 1024:>8.1f}"
+            )
+        if skipped and options['verbosity'] > 1:
+            for key, reason in skipped.items():
+                self.stdout.write(f"{key:<60} пропущен: {reason}")
+        return results
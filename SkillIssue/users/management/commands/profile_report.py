@@ -0,0 +1,53 @@
+import io
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.profiling import MODE_CPROFILE, MODE_SAMPLER, folded_stats, profile_files, profiling_dir, prune_profiles
+
+SORT_KEYS = {'cumulative': pstats.SortKey.CUMULATIVE, 'tottime': pstats.SortKey.TIME}
+
+
+class Command(BaseCommand):
+    help = "Сводка профилей запросов (PROFILING_DIR): самые горячие функции"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Каталог профилей (по умолчанию PROFILING_DIR)")
+        parser.add_argument('--top', type=int, default=20, help="Сколько функций выводить")
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='cumulative',
+                            help="Сортировка профилей cProfile")
+        parser.add_argument('--view', default=None, help="Только профили маршрутов, содержащих подстроку")
+        parser.add_argument('--prune', type=float, default=None, metavar='DAYS',
+                            help="Удалить профили старше DAYS дней вместо сводки")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profiling_dir()
+        if options['prune'] is not None:
+            removed = prune_profiles(directory, older_than=max(0, options['prune']) * 86400)
+            self.stdout.write(self.style.SUCCESS(f"Удалено профилей: {removed}"))
+            return
+        files = profile_files(directory, options['view'])
+        if not files[MODE_CPROFILE] and not files[MODE_SAMPLER]:
+            raise CommandError(f"Нет профилей в {directory}")
+        if files[MODE_CPROFILE]:
+            self.report_cprofile(files[MODE_CPROFILE], options)
+        if files[MODE_SAMPLER]:
+            self.report_folded(files[MODE_SAMPLER], options)
+
+    def report_cprofile(self, paths, options):
+        stream = io.StringIO()
+        stats = pstats.Stats(*map(str, paths), stream=stream)
+        stats.sort_stats(SORT_KEYS[options['sort']]).print_stats(options['top'])
+        self.stdout.write(f"cProfile: файлов {len(paths)}")
+        self.stdout.write(stream.getvalue())
+
+    def report_folded(self, paths, options):
+        total, own, inclusive = folded_stats(paths)
+        self.stdout.write(f"Сэмплер: файлов {len(paths)}, снимков {total}")
+        if not total:
+            return
+        for title, counts in (("Собственное время", own), ("Время с вызовами", inclusive)):
+            self.stdout.write(f"\n{title}:")
+            self.stdout.write(f"{'снимков':>8} {'%':>6}  функция")
+            for name, count in counts.most_common(options['top']):
+                self.stdout.write(f"{count:>8} {count * 100 / total:>6.1f}  {name}")
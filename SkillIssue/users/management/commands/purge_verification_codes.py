@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from users.verification import PURGE_BATCH_SIZE, purge_codes, purgeable_codes
+
+
+class Command(BaseCommand):
+    help = "Удаляет использованные и истёкшие коды подтверждения небольшими пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE,
+                            help="Сколько строк удалять в одной транзакции")
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help="Пауза между пачками, секунды")
+        parser.add_argument('--dry-run', action='store_true', help="Только посчитать, что будет удалено")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"К удалению: {purgeable_codes().count()}")
+            return
+        deleted = purge_codes(batch_size=max(1, options['batch_size']), pause=max(0, options['pause']))
+        self.stdout.write(self.style.SUCCESS(f"Удалено кодов: {deleted}"))
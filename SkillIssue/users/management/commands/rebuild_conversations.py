@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.chat import rebuild_conversations
+
+
+class Command(BaseCommand):
+    help = "Пересобирает сводки переписок (список контактов чата) по таблице сообщений"
+
+    def handle(self, *args, **options):
+        total = rebuild_conversations()
+        self.stdout.write(self.style.SUCCESS(f"Сводок переписок: {total}"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.ratings import rebuild_ratings, verify_ratings
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает суммы и количества оценок руководств и профилей и сверяет их с исходными таблицами"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Только сверить агрегаты, ничего не изменяя",
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuild_ratings()
+            self.stdout.write("Агрегаты рейтингов пересчитаны")
+
+        mismatches = verify_ratings()
+        if mismatches['guides'] or mismatches['profiles']:
+            raise CommandError(
+                f"Расхождения: руководства {mismatches['guides']}, профили (user_id) {mismatches['profiles']}"
+            )
+        self.stdout.write(self.style.SUCCESS("Агрегаты рейтингов совпадают с оценками"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.search import rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает поисковые векторы руководств, объявлений и профилей"
+
+    def handle(self, *args, **options):
+        rebuild_search_vectors()
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.facets import rebuild_tag_usage
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики тегов руководств и объявлений"
+
+    def handle(self, *args, **options):
+        rebuild_tag_usage()
+        self.stdout.write(self.style.SUCCESS("Счётчики тегов пересчитаны"))
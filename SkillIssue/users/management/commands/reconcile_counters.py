@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.counters import expected_counts, read, reconcile
+
+
+class Command(BaseCommand):
+    help = "Сверяет счётчики платформы (PlatformCounter) с исходными таблицами и исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Только сверить счётчики, ничего не изменяя",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            counter = read()
+            drift = {
+                field: (getattr(counter, field), value)
+                for field, value in expected_counts().items()
+                if getattr(counter, field) != value
+            }
+        else:
+            drift = reconcile()
+
+        for field, (stored, expected) in drift.items():
+            self.stdout.write(f"{field}: {stored} → {expected}")
+
+        if drift and options['check']:
+            raise CommandError(f"Расхождений в счётчиках: {len(drift)}")
+        if drift:
+            self.stdout.write(self.style.WARNING(f"Исправлено расхождений: {len(drift)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Счётчики совпадают с исходными таблицами"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from users.rendering import RENDERER_VERSION, rerender_guides
+
+
+class Command(BaseCommand):
+    help = "Перерисовывает сохранённый HTML руководств (после изменения конвейера markdown)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Перерисовать все руководства, даже если ключ HTML актуален",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help="Сколько руководств сохранять за один запрос",
+        )
+
+    def handle(self, *args, **options):
+        rendered = rerender_guides(force=options['force'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Перерисовано руководств: {rendered} (версия конвейера {RENDERER_VERSION})"
+        ))
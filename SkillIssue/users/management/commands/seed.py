@@ -0,0 +1,41 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from users.seeding import DEFAULT_BATCH_SIZE, DEFAULT_PREFIX, DEFAULT_USERS, RATIOS, seed
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими данными для нагрузочного тестирования (детерминированно по --seed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=DEFAULT_USERS, help="Число пользователей (с профилями)")
+        for name, ratio in RATIOS.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=None,
+                                help=f"Число строк (по умолчанию {ratio} на пользователя)")
+        parser.add_argument('--seed', type=int, default=0, help="Зерно генератора случайных чисел")
+        parser.add_argument('--prefix', default=DEFAULT_PREFIX, help="Префикс имён пользователей")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Сколько строк вставлять одним запросом")
+        parser.add_argument('--skip-render', action='store_true',
+                            help="Не рендерить HTML руководств (отрисуется при первом просмотре)")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(f"Пользователи с префиксом «{prefix}_» уже есть, укажите другой --prefix")
+
+        started = time.perf_counter()
+        created = seed(
+            users=max(0, options['users']),
+            seed=options['seed'],
+            prefix=prefix,
+            batch_size=max(1, options['batch_size']),
+            render=not options['skip_render'],
+            log=self.stdout.write,
+            **{name: options[name] for name in RATIOS},
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано строк: {sum(created.values())} за {time.perf_counter() - started:.1f} с"
+        ))
@@ -0,0 +1,56 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from users.outbox import DEFAULT_BATCH_SIZE, deliver_pending, purge_finished
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Отправляет письма из очереди OutgoingEmail (воркер; с --once — один проход)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Отправить готовые письма и выйти")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Сколько писем отправлять через одно соединение")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Пауза между проверками очереди, секунды")
+        parser.add_argument('--max-attempts', type=int, default=None,
+                            help="Число попыток до отметки FAILED (по умолчанию OUTBOX_MAX_ATTEMPTS)")
+        parser.add_argument('--purge-interval', type=float, default=3600.0,
+                            help="Как часто удалять завершённые письма старше OUTBOX_RETENTION_HOURS, секунды")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        next_purge = 0
+        while True:
+            try:
+                next_purge = self.run_once(batch_size, next_purge, options)
+            except OperationalError:
+                if options['once']:
+                    raise
+                # База недоступна — пробуем снова на следующей итерации, воркер не завершается
+                logger.exception("Очередь писем: ошибка базы данных, повтор через %s с", options['interval'])
+            if options['once']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
+            # За паузу соединение с базой могло оборваться или устареть (CONN_MAX_AGE)
+            close_old_connections()
+
+    def run_once(self, batch_size, next_purge, options):
+        """Один проход: отправка готовых писем и, когда пора, очистка; возвращает время следующей очистки"""
+        sent, retried, failed = deliver_pending(batch_size=batch_size, max_attempts=options['max_attempts'])
+        if sent or retried or failed:
+            self.stdout.write(f"Отправлено: {sent}, отложено: {retried}, не доставлено: {failed}")
+        if time.monotonic() >= next_purge:
+            purged = purge_finished()
+            if purged:
+                self.stdout.write(f"Удалено завершённых писем: {purged}")
+            next_purge = time.monotonic() + options['purge_interval']
+        return next_purge
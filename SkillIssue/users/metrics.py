@@ -0,0 +1,357 @@
+"""
+Метрики в формате Prometheus (текстовая выдача на /metrics).
+
+Значения копятся в памяти процесса (Registry) под одной блокировкой,
+поэтому учёт стоит словарного сложения. Под gunicorn у каждого воркера
+своя память: если задан METRICS_DIR, процесс не чаще раза в
+METRICS_FLUSH_INTERVAL секунд (и при завершении) атомарно записывает
+снимок в METRICS_DIR/<pid>.json, а /metrics складывает свой текущий
+снимок с файлами остальных воркеров. Счётчики и гистограммы суммируются,
+для gauge берётся максимум по живым процессам. Снимки завершённых
+воркеров при чтении сливаются (под flock) в METRICS_DIR/aggregate.json и
+удаляются, так что их счёт не пропадает, а число файлов не растёт. Без
+METRICS_DIR видны только метрики обслужившего запрос процесса.
+
+Всё работает только при METRICS_ENABLED: иначе учёт ничего не делает, а
+/metrics отвечает 404. Эндпоинт отдаёт метрики только с заголовком
+Authorization: Bearer <METRICS_TOKEN>; без заданного токена он закрыт.
+
+MetricsMiddleware считает запросы, их длительность и число SQL-запросов
+по имени маршрута; имя, а не путь, ограничивает число рядов. Кэш главной
+страницы, блэк-лист и чат обновляют свои метрики сами.
+"""
+import atexit
+import fcntl
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = '.lock'
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', False)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self.name, self._key(labels), lambda value: (value or 0) + amount)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        self.registry.update(self.name, self._key(labels), lambda _: value)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # Счётчики по корзинам (не накопительные), затем сумма и количество
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+
+        def add(current):
+            current = current or [0] * (len(self.buckets) + 3)
+            current[index] += 1
+            current[-2] += value
+            current[-1] += 1
+            return current
+
+        self.registry.update(self.name, self._key(labels), add)
+
+
+class Registry:
+    """Метрики процесса и их снимки для соседних воркеров"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._atexit = False
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        self.values.setdefault(metric.name, {})
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def update(self, name, key, change):
+        if not enabled():
+            return
+        with self._lock:
+            series = self.values[name]
+            series[key] = change(series.get(key))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: [
+                    [list(key), value.copy() if isinstance(value, list) else value]
+                    for key, value in series.items()
+                ]
+                for name, series in self.values.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            for series in self.values.values():
+                series.clear()
+
+    # --- общий каталог снимков ---
+
+    def maybe_flush(self):
+        directory = metrics_dir()
+        if directory is None:
+            return
+        if not self._atexit:
+            self._atexit = True
+            atexit.register(self.flush, directory)
+        now = time.monotonic()
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        if now - self._flushed_at >= interval:
+            self._flushed_at = now
+            self.flush(directory)
+
+    def flush(self, directory=None):
+        directory = directory or metrics_dir()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        _write(directory / f'{os.getpid()}.json', {'pid': os.getpid(), 'metrics': self.snapshot()})
+
+    def compact(self, directory):
+        """Сливает снимки завершённых процессов в aggregate.json и удаляет их файлы"""
+        with open(directory / LOCK_FILE, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for path in directory.glob('*.json'):
+                data = _read(path)
+                if path.name != AGGREGATE_FILE and data is not None and not _alive(data.get('pid')):
+                    dead.append((path, data.get('metrics', {})))
+            if not dead:
+                return
+            aggregate = directory / AGGREGATE_FILE
+            snapshots = [(None, False, values) for _, values in dead]
+            snapshots.append((None, False, (_read(aggregate) or {}).get('metrics', {})))
+            _write(aggregate, {'pid': None, 'metrics': {
+                metric.name: [[list(key), value] for key, value in _merge(metric, snapshots).items()]
+                for metric in self.metrics.values() if metric.type != 'gauge'
+            }})
+            for path, _ in dead:
+                path.unlink(missing_ok=True)
+
+    def collect(self):
+        """Снимки всех процессов: [(pid, жив ли процесс, метрики)], текущий процесс — из памяти"""
+        snapshots = [(os.getpid(), True, self.snapshot())]
+        directory = metrics_dir()
+        if directory is None or not directory.is_dir():
+            return snapshots
+        self.compact(directory)
+        for path in directory.glob('*.json'):
+            data = _read(path)
+            if data is not None and data.get('pid') != os.getpid():
+                snapshots.append((data.get('pid'), _alive(data.get('pid')), data.get('metrics', {})))
+        return snapshots
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    temporary = path.with_suffix('.tmp')
+    temporary.write_text(json.dumps(data), encoding='utf-8')
+    os.replace(temporary, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+
+def metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+def _merge(metric, snapshots):
+    merged = {}
+    for _, alive, values in snapshots:
+        for key, value in values.get(metric.name, []):
+            key = tuple(key)
+            if metric.type == 'gauge':
+                if alive:
+                    merged[key] = max(merged.get(key, value), value)
+            elif metric.type == 'histogram':
+                current = merged.setdefault(key, [0] * len(value))
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def exposition(registry=None):
+    """Текст в формате Prometheus по всем процессам"""
+    registry = registry or REGISTRY
+    snapshots = registry.collect()
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for key, value in sorted(_merge(metric, snapshots).items()):
+            if metric.type != 'histogram':
+                lines.append(f'{metric.name}{_labels(metric.labelnames, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, math.inf), value):
+                cumulative += count
+                labels = _labels(metric.labelnames, key, [('le', _number(float(bound)))])
+                lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+            lines.append(f'{metric.name}_sum{_labels(metric.labelnames, key)} {_number(float(value[-2]))}')
+            lines.append(f'{metric.name}_count{_labels(metric.labelnames, key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    'skillissue_http_requests_total', "Число HTTP-запросов", ('view', 'method', 'status'),
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    'skillissue_http_request_duration_seconds', "Длительность обработки запроса", ('view',),
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    'skillissue_db_queries_per_request', "Число SQL-запросов на HTTP-запрос", ('view',), buckets=QUERY_BUCKETS,
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'skillissue_cache_requests_total', "Обращения к кэшу: hit, stale (отдано устаревшее) или miss",
+    ('cache', 'result'),
+)
+BLACKLIST_WORDS = REGISTRY.gauge(
+    'skillissue_blacklist_words', "Слов в скомпилированном блэк-листе процесса",
+)
+BLACKLIST_REBUILDS = REGISTRY.counter(
+    'skillissue_blacklist_rebuilds_total', "Пересборки блэк-листа",
+)
+CHAT_MESSAGES = REGISTRY.counter(
+    'skillissue_chat_messages_total', "Отправленные сообщения чата", ('kind',),
+)
+
+
+def metrics_view(request):
+    """GET /metrics с заголовком Authorization: Bearer <METRICS_TOKEN>; без METRICS_ENABLED и токена — 404"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not enabled() or not token:
+        return HttpResponse(status=404)
+    provided = request.headers.get('Authorization', '').encode()
+    if not hmac.compare_digest(provided, f'Bearer {token}'.encode()):
+        return HttpResponse(status=401)
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Учёт запросов по маршрутам; отключена, пока METRICS_ENABLED не включена"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = _QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match is not None else None) or UNRESOLVED_VIEW
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_DURATION.observe(elapsed, view=view)
+        REQUEST_QUERIES.observe(queries.count, view=view)
+        REGISTRY.maybe_flush()
+        return response
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:53
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+BACKFILL_SQL = """
+UPDATE users_guide SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A')
+    || setweight(to_tsvector('russian', COALESCE(content, '')), 'B')
+    || setweight(to_tsvector('russian', COALESCE(tags::text, '')), 'C');
+
+UPDATE users_announcement SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(title, '')), 'A')
+    || setweight(to_tsvector('russian', COALESCE(description, '')), 'B')
+    || setweight(to_tsvector('russian', COALESCE(tags::text, '')), 'C');
+
+UPDATE users_profile p SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(u.username, '')), 'A')
+    || setweight(to_tsvector('russian', TRIM(COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, ''))), 'A')
+    || setweight(to_tsvector('russian', COALESCE(p.bio, '')), 'B')
+FROM auth_user u
+WHERE u.id = p.user_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_blacklistword'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='guide',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='announcement_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='guide_search_vector_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='profile_search_vector_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:55
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_search_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='announcement_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='guide_title_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        # auth_user принадлежит django.contrib.auth, поэтому индекс по username создаётся вручную
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS auth_user_username_trgm ON auth_user USING gin (username gin_trgm_ops);",
+            reverse_sql="DROP INDEX IF EXISTS auth_user_username_trgm;",
+        ),
+    ]
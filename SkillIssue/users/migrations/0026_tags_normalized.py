@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 01:58
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+# Теги приводятся к нижнему регистру, пустые и повторы отбрасываются.
+# Часть старых объявлений хранит теги строкой через запятую — её тоже разбираем.
+BACKFILL_SQL = """
+UPDATE {table} t SET tags_normalized = COALESCE((
+    SELECT array_agg(n.tag ORDER BY n.pos)
+    FROM (
+        SELECT lower(btrim(e.value)) AS tag, min(e.pos) AS pos
+        FROM (
+            SELECT a.value, a.pos
+            FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(t.tags) = 'array' THEN t.tags ELSE '[]'::jsonb END
+            ) WITH ORDINALITY AS a(value, pos)
+            UNION ALL
+            SELECT s.value, s.pos
+            FROM regexp_split_to_table(
+                CASE WHEN jsonb_typeof(t.tags) = 'string' THEN t.tags #>> '{{}}' ELSE '' END, ','
+            ) WITH ORDINALITY AS s(value, pos)
+        ) e
+        WHERE btrim(e.value) <> ''
+        GROUP BY lower(btrim(e.value))
+    ) n
+), '{{}}');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcement',
+            name='tags_normalized',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddField(
+            model_name='guide',
+            name='tags_normalized',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags_normalized'], name='announcement_tags_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags_normalized'], name='guide_tags_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL.format(table='users_guide'), reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_SQL.format(table='users_announcement'), reverse_sql=migrations.RunSQL.noop),
+    ]
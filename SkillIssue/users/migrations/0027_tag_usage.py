@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+INSERT INTO users_tagusage (target_type, tag, count)
+SELECT 'GUIDE', tag, count(*) FROM users_guide, unnest(tags_normalized) AS tag GROUP BY tag;
+
+INSERT INTO users_tagusage (target_type, tag, count)
+SELECT 'ANNOUNCEMENT', tag, count(*) FROM users_announcement, unnest(tags_normalized) AS tag GROUP BY tag;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0026_tags_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('GUIDE', 'Руководство'), ('ANNOUNCEMENT', 'Объявление')], max_length=15, verbose_name='Тип объекта')),
+                ('tag', models.TextField(verbose_name='Тег')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Использование тега',
+                'verbose_name_plural': 'Использование тегов',
+                'indexes': [models.Index(fields=['target_type', '-count'], name='tagusage_type_count_idx')],
+                'unique_together': {('target_type', 'tag')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
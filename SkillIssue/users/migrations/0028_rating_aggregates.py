@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+# Голоса руководства: оценки GuideRating и звёзды отзывов (отзывы без звёзд не считаются)
+BACKFILL_SQL = """
+WITH votes AS (
+    SELECT guide_id, rating AS value FROM users_guiderating
+    UNION ALL
+    SELECT guide_id, stars AS value FROM users_review WHERE stars > 0
+), totals AS (
+    SELECT guide_id, sum(value) AS s, count(*) AS c FROM votes GROUP BY guide_id
+)
+UPDATE users_guide g SET
+    rating_sum = COALESCE(t.s, 0),
+    rating_count = COALESCE(t.c, 0),
+    rating = COALESCE((t.s::numeric / NULLIF(t.c, 0))::integer, 0)
+FROM users_guide g2 LEFT JOIN totals t ON t.guide_id = g2.id
+WHERE g.id = g2.id;
+
+WITH totals AS (
+    SELECT author_id, sum(rating_sum) AS s, sum(rating_count) AS c FROM users_guide GROUP BY author_id
+)
+UPDATE users_profile p SET
+    rating_sum = COALESCE(t.s, 0),
+    rating_count = COALESCE(t.c, 0),
+    rating = COALESCE((t.s::numeric / NULLIF(t.c, 0))::numeric(3, 2), 0)
+FROM users_profile p2 LEFT JOIN totals t ON t.author_id = p2.user_id
+WHERE p.id = p2.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0027_tag_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guide',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='guide',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:06
+
+import django.db.models.expressions
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+UPDATE {table} t SET
+    likes_count = (SELECT count(*) FROM {ratings} r WHERE r.{fk}_id = t.id AND r.is_like),
+    dislikes_count = (SELECT count(*) FROM {ratings} r WHERE r.{fk}_id = t.id AND NOT r.is_like);
+"""
+
+COUNTED = [
+    ('users_review', 'users_guidereviewrating', 'review'),
+    ('users_reviewreply', 'users_reviewreplyrating', 'reply'),
+    ('users_announcementcomment', 'users_announcementcommentrating', 'comment'),
+    ('users_announcementcommentreply', 'users_announcementcommentreplyrating', 'reply'),
+    ('users_profilereview', 'users_profilereviewrating', 'review'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0028_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='announcementcomment',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='announcementcomment',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='announcementcommentreply',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='announcementcommentreply',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilereview',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilereview',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reviewreply',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reviewreply',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='announcementcomment',
+            index=models.Index(models.F('announcement'), models.OrderBy(django.db.models.expressions.CombinedExpression(models.F('likes_count'), '-', models.F('dislikes_count')), descending=True), models.OrderBy(models.F('created_at'), descending=True), name='anncomment_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profilereview',
+            index=models.Index(models.F('profile'), models.OrderBy(django.db.models.expressions.CombinedExpression(models.F('likes_count'), '-', models.F('dislikes_count')), descending=True), models.OrderBy(models.F('created_at'), descending=True), name='profilereview_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(models.F('guide'), models.OrderBy(django.db.models.expressions.CombinedExpression(models.F('likes_count'), '-', models.F('dislikes_count')), descending=True), models.OrderBy(models.F('created_at'), descending=True), name='review_popular_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            BACKFILL_SQL.format(table=table, ratings=ratings, fk=fk),
+            reverse_sql=migrations.RunSQL.noop,
+        )
+        for table, ratings, fk in COUNTED
+    ]
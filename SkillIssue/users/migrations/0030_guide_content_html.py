@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0029_like_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guide',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='guide',
+            name='content_html_key',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0030_guide_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blacklistword',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+    ]
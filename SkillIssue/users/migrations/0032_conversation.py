@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Сводки по уже существующим сообщениям (то же, что chat.rebuild_conversations)
+BACKFILL_SQL = """
+INSERT INTO users_conversation (user_low_id, user_high_id, last_message, last_message_at, unread_low, unread_high)
+SELECT DISTINCT ON (lo, hi)
+    lo,
+    hi,
+    CASE
+        WHEN btrim(message, E' \\t\\r\\n') <> '' THEN left(message, 200)
+        WHEN coalesce(image, '') <> '' THEN 'Картинка'
+        ELSE 'Без сообщений'
+    END,
+    created_at,
+    count(*) FILTER (WHERE NOT is_read AND receiver_id = lo) OVER pair,
+    count(*) FILTER (WHERE NOT is_read AND receiver_id = hi) OVER pair
+FROM (
+    SELECT *, least(sender_id, receiver_id) AS lo, greatest(sender_id, receiver_id) AS hi
+    FROM users_chatmessage
+) m
+WINDOW pair AS (PARTITION BY lo, hi)
+ORDER BY lo, hi, created_at DESC, id DESC
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_blacklistword_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message', models.CharField(blank=True, max_length=200)),
+                ('last_message_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_low', models.PositiveIntegerField(default=0)),
+                ('unread_high', models.PositiveIntegerField(default=0)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_low', '-last_message_at'], name='conversation_low_recent_idx'), models.Index(fields=['user_high', '-last_message_at'], name='conversation_high_recent_idx')],
+                'unique_together': {('user_low', 'user_high')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0032_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['-created_at', '-id'], name='announcement_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='guide',
+            index=models.Index(fields=['-rating', '-created_at', '-id'], name='guide_keyset_idx'),
+        ),
+    ]
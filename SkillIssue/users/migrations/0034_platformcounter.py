@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:38
+
+from django.db import migrations, models
+
+# Начальные значения счётчиков (то же, что counters.reconcile)
+BACKFILL_SQL = """
+INSERT INTO users_platformcounter (id, guides, announcements, active_users, reviews, profile_reviews, reconciled_at)
+SELECT 1,
+    (SELECT count(*) FROM users_guide),
+    (SELECT count(*) FROM users_announcement),
+    (SELECT count(*) FROM auth_user WHERE is_active),
+    (SELECT count(*) FROM users_review),
+    (SELECT count(*) FROM users_profilereview),
+    now()
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0033_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guides', models.BigIntegerField(default=0)),
+                ('announcements', models.BigIntegerField(default=0)),
+                ('active_users', models.BigIntegerField(default=0)),
+                ('reviews', models.BigIntegerField(default=0)),
+                ('profile_reviews', models.BigIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Счётчики платформы',
+                'verbose_name_plural': 'Счётчики платформы',
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0034_platformcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # Для существующих отзывов время изменения — время создания, а не время миграции
+        migrations.RunSQL(
+            "UPDATE users_review SET updated_at = created_at",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 02:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0036_outgoingemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverificationcode',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['email', 'code', '-created_at'], name='verification_unused_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailverificationcode',
+            index=models.Index(fields=['expires_at'], name='verification_expires_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0037_verification_code_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='guide',
+            index=models.Index(fields=['-created_at', '-id'], name='guide_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-created_at', '-id'], name='profile_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0038_recent_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverificationcode',
+            index=models.Index(condition=models.Q(('is_used', True)), fields=['id'], name='verification_used_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db.models import BooleanField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import BooleanField, F
 from django.utils import timezone
 from django.db import models
 from django.contrib.auth.models import User
 
+from .tags import normalize_tags
+
 ACTION_CHOICES = [
     ('CREATE', 'Создание'),
     ('UPDATE', 'Обновление'),
@@ -31,6 +36,9 @@ class Profile(models.Model):
         decimal_places=2,
         default=0.00,
     )
+    # Сумма и количество оценок всех руководств пользователя (см. ratings.py)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
 
     allow_reviews = BooleanField(default=True, verbose_name="Разрешить отзывы")
 
@@ -57,11 +65,58 @@ class Profile(models.Model):
     is_moderator = models.BooleanField(default=False, verbose_name="Является модератором")
     moderator_since = models.DateTimeField(null=True, blank=True, verbose_name="Дата назначения модератором")
 
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='profile_search_vector_gin'),
+            # Порядок общего списка элементов (search.all_items_page)
+            models.Index(fields=['-created_at', '-id'], name='profile_recent_idx'),
+        ]
+
     def __str__(self):
         return self.user.username
 
 
-class Announcement(models.Model):
+class NormalizedTagsMixin:
+    """
+    Поддерживает теневую колонку tags_normalized в актуальном состоянии при сохранении
+    и запоминает, какие теги добавились и пропали (для счётчиков TagUsage в signals.py).
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'tags_normalized' in instance.__dict__:
+            instance._saved_tags_normalized = list(instance.tags_normalized)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.tags_normalized = normalize_tags(self.tags)
+        update_fields = kwargs.get('update_fields')
+        tags_written = update_fields is None or 'tags' in update_fields
+        if update_fields is not None and 'tags' in update_fields and 'tags_normalized' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'tags_normalized']
+
+        self._tags_delta = None
+        if tags_written:
+            if self._state.adding:
+                previous = []
+            elif hasattr(self, '_saved_tags_normalized'):
+                previous = self._saved_tags_normalized
+            else:
+                previous = type(self).objects.filter(pk=self.pk).values_list('tags_normalized', flat=True).first() or []
+            added = [tag for tag in self.tags_normalized if tag not in previous]
+            removed = [tag for tag in previous if tag not in self.tags_normalized]
+            if added or removed:
+                self._tags_delta = (added, removed)
+
+        super().save(*args, **kwargs)
+        if tags_written:
+            self._saved_tags_normalized = list(self.tags_normalized)
+
+
+class Announcement(NormalizedTagsMixin, models.Model):
     """Модель объявления"""
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -70,6 +125,17 @@ class Announcement(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     tags = models.JSONField(default=list)
+    tags_normalized = ArrayField(models.TextField(), default=list, blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='announcement_search_vector_gin'),
+            GinIndex(fields=['tags_normalized'], name='announcement_tags_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='announcement_title_trgm'),
+            # Порядок списков и курсорной пагинации (pagination.ANNOUNCEMENT_ORDERING)
+            models.Index(fields=['-created_at', '-id'], name='announcement_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -111,16 +177,57 @@ class ChatMessage(models.Model):
         return bool(self.message) or bool(self.image)
 
 
-class Guide(models.Model):
+class Conversation(models.Model):
+    """
+    Сводка переписки двух пользователей для списка контактов (см. chat.py).
+    Пара хранится упорядоченно: user_low — участник с меньшим id.
+    """
+    user_low = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    user_high = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    last_message = models.CharField(max_length=200, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_low = models.PositiveIntegerField(default=0)
+    unread_high = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user_low', 'user_high')
+        indexes = [
+            models.Index(fields=['user_low', '-last_message_at'], name='conversation_low_recent_idx'),
+            models.Index(fields=['user_high', '-last_message_at'], name='conversation_high_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_low_id} ↔ {self.user_high_id}"
+
+
+class Guide(NormalizedTagsMixin, models.Model):
     """Модель руководства"""
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='guides')
     title = models.CharField(max_length=200)
     content = models.TextField(blank=True)
     image = models.ImageField(upload_to='guides/', blank=True, null=True)
     tags = models.JSONField(blank=True, default=list)
+    tags_normalized = ArrayField(models.TextField(), default=list, blank=True, editable=False)
     rating = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    # Отрендеренный content и ключ (хеш текста + версия конвейера), см. rendering.py
+    content_html = models.TextField(blank=True, editable=False)
+    content_html_key = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='guide_search_vector_gin'),
+            GinIndex(fields=['tags_normalized'], name='guide_tags_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='guide_title_trgm'),
+            # Порядок списков и курсорной пагинации (pagination.GUIDE_ORDERING)
+            models.Index(fields=['-rating', '-created_at', '-id'], name='guide_keyset_idx'),
+            # Порядок общего списка элементов (search.all_items_page)
+            models.Index(fields=['-created_at', '-id'], name='guide_recent_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -162,6 +269,8 @@ class ReviewReply(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Ответ от {self.author.username} к отзыву {self.review.id}"
@@ -191,6 +300,16 @@ class AnnouncementComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_edited = models.BooleanField(default=False)
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                F('announcement'), (F('likes_count') - F('dislikes_count')).desc(), F('created_at').desc(),
+                name='anncomment_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Комментарий от {self.author} к объявлению {self.announcement}"
@@ -204,6 +323,8 @@ class AnnouncementCommentReply(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     is_edited = models.BooleanField(default=False)
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"Ответ от {self.author.username} к комментарию {self.comment.id}"
@@ -232,6 +353,17 @@ class Review(models.Model):
     text = models.TextField()
     stars = models.PositiveSmallIntegerField(default=5)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                F('guide'), (F('likes_count') - F('dislikes_count')).desc(), F('created_at').desc(),
+                name='review_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Review({self.author.username} → {self.guide.title})"
@@ -259,9 +391,17 @@ class ProfileReview(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_edited = models.BooleanField(default=False)
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         unique_together = ('reviewer', 'profile')
+        indexes = [
+            models.Index(
+                F('profile'), (F('likes_count') - F('dislikes_count')).desc(), F('created_at').desc(),
+                name='profilereview_popular_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Отзыв от {self.reviewer} на {self.profile}"
@@ -294,6 +434,16 @@ class EmailVerificationCode(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Проверка кода (verification.find_code) — один проход по этому индексу
+            models.Index(
+                fields=['email', 'code', '-created_at'], name='verification_unused_idx',
+                condition=models.Q(is_used=False),
+            ),
+            # Для очистки устаревших кодов (purge_verification_codes): истёкшие и использованные
+            models.Index(fields=['expires_at'], name='verification_expires_idx'),
+            models.Index(fields=['id'], name='verification_used_idx', condition=models.Q(is_used=True)),
+        ]
 
     def __str__(self):
         return f"Код для {self.email}: {self.code}"
@@ -304,6 +454,42 @@ class EmailVerificationCode(models.Model):
         return timezone.now() > self.expires_at
 
 
+class OutgoingEmail(models.Model):
+    """
+    Письмо в очереди на отправку (см. outbox.py). Представления только
+    ставят письма в очередь, отправляет их команда send_outbox.
+    """
+    STATUS_PENDING = 'PENDING'
+    STATUS_SENT = 'SENT'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_FAILED, 'Не удалось отправить'),
+    ]
+
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at', 'id'], name='outgoing_email_pending_idx',
+                condition=models.Q(status='PENDING'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.get_status_display()})"
+
+
 class UserActivity(models.Model):
     """Модель для хранения истории действий пользователя"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
@@ -326,6 +512,24 @@ class UserActivity(models.Model):
         return f"{self.get_action_display()} {self.get_target_type_display()}: '{self.target_title}' ({self.user.username})"
 
 
+class TagUsage(models.Model):
+    """Количество руководств и объявлений с данным тегом (обновляется сигналами)"""
+    target_type = models.CharField(max_length=15, choices=TARGET_TYPE_CHOICES, verbose_name="Тип объекта")
+    tag = models.TextField(verbose_name="Тег")
+    count = models.IntegerField(default=0, verbose_name="Количество")
+
+    class Meta:
+        unique_together = ('target_type', 'tag')
+        indexes = [
+            models.Index(fields=['target_type', '-count'], name='tagusage_type_count_idx'),
+        ]
+        verbose_name = "Использование тега"
+        verbose_name_plural = "Использование тегов"
+
+    def __str__(self):
+        return f"{self.tag} ({self.get_target_type_display()}): {self.count}"
+
+
 class FavoriteGuide(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='favorite_guides')
     guide = models.ForeignKey(Guide, on_delete=models.CASCADE, related_name='favorited_by')
@@ -369,6 +573,7 @@ class BlacklistWord(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     case_sensitive = models.BooleanField(
         default=False,
@@ -383,3 +588,24 @@ class BlacklistWord(models.Model):
 
     def __str__(self):
         return f"{self.word} → {self.replacement}"
+
+
+class PlatformCounter(models.Model):
+    """
+    Счётчики платформы для /api/statistics/ — единственная строка (pk=1).
+    Меняются сигналами вместе с исходными записями, расхождения исправляет
+    команда reconcile_counters (см. counters.py).
+    """
+    guides = models.BigIntegerField(default=0)
+    announcements = models.BigIntegerField(default=0)
+    active_users = models.BigIntegerField(default=0)
+    reviews = models.BigIntegerField(default=0)
+    profile_reviews = models.BigIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Счётчики платформы"
+        verbose_name_plural = "Счётчики платформы"
+
+    def __str__(self):
+        return f"Руководств {self.guides}, объявлений {self.announcements}, пользователей {self.active_users}"
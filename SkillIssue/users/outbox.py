@@ -0,0 +1,152 @@
+"""
+Исходящая почта через очередь в базе (OutgoingEmail).
+
+Представления не ходят в SMTP: enqueue() сохраняет письмо одной вставкой,
+и ответ не зависит ни от скорости, ни от ошибок почтового сервера.
+Команда ``manage.py send_outbox`` забирает готовые письма пачками
+(SELECT ... FOR UPDATE SKIP LOCKED, так что воркеров может быть несколько),
+отправляет пачку через одно соединение с бэкендом и при ошибке откладывает
+письмо с экспоненциальной задержкой; после OUTBOX_MAX_ATTEMPTS попыток
+письмо помечается FAILED.
+
+Тело отправленного письма сразу очищается (в письмах коды подтверждения),
+а сами завершённые строки воркер удаляет пачками спустя
+OUTBOX_RETENTION_HOURS (purge_finished).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+# Задержка перед повтором: 30 с, 1 мин, 2 мин ... но не больше часа
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+DEFAULT_RETENTION_HOURS = 24
+PURGE_BATCH_SIZE = 1000
+
+CODE_LIFETIME_MINUTES = 15
+
+
+def enqueue(to, subject, body):
+    return OutgoingEmail.objects.create(to=to, subject=subject, body=body)
+
+
+def send_verification_code(email, code):
+    return enqueue(
+        email,
+        'Подтверждение регистрации - Skill Issue',
+        f'Ваш код подтверждения: {code}\nКод действителен в течение {CODE_LIFETIME_MINUTES} минут.',
+    )
+
+
+def send_password_reset_code(email, code):
+    return enqueue(
+        email,
+        'Восстановление пароля - Skill Issue',
+        f'Ваш код восстановления пароля: {code}\nКод действителен в течение {CODE_LIFETIME_MINUTES} минут.',
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY))
+
+
+def deliver_batch(batch_size=DEFAULT_BATCH_SIZE, max_attempts=None, connection=None):
+    """
+    Отправляет одну пачку готовых писем. Возвращает (отправлено, отложено, отказ).
+    Строки пачки заблокированы до конца транзакции, другие воркеры их пропускают.
+    """
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    sent = retried = failed = 0
+
+    with transaction.atomic():
+        now = timezone.now()
+        emails = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutgoingEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if not emails:
+            return sent, retried, failed
+
+        connection = connection or get_connection()
+        try:
+            connection.open()
+            open_error = None
+        except Exception as exc:
+            # Сервер недоступен — попытка засчитывается всем письмам пачки
+            open_error = exc
+        try:
+            for email in emails:
+                email.attempts += 1
+                try:
+                    if open_error is not None:
+                        raise open_error
+                    EmailMessage(email.subject, email.body, None, [email.to], connection=connection).send()
+                except Exception as exc:
+                    email.last_error = f'{type(exc).__name__}: {exc}'
+                    if email.attempts >= max_attempts:
+                        email.status = OutgoingEmail.STATUS_FAILED
+                        failed += 1
+                    else:
+                        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                        retried += 1
+                else:
+                    email.status = OutgoingEmail.STATUS_SENT
+                    email.sent_at = timezone.now()
+                    email.body = ''
+                    email.last_error = ''
+                    sent += 1
+        finally:
+            connection.close()
+
+        OutgoingEmail.objects.bulk_update(
+            emails, ['status', 'body', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+        )
+    return sent, retried, failed
+
+
+def deliver_pending(batch_size=DEFAULT_BATCH_SIZE, max_attempts=None):
+    """Отправляет пачки, пока готовые письма не кончатся; возвращает суммарные счётчики"""
+    totals = [0, 0, 0]
+    while True:
+        counts = deliver_batch(batch_size=batch_size, max_attempts=max_attempts)
+        if not any(counts):
+            return tuple(totals)
+        totals = [total + count for total, count in zip(totals, counts)]
+
+
+def purgeable_emails(now=None, retention_hours=None):
+    """Завершённые письма старше срока хранения: отправленные и окончательно не доставленные"""
+    if retention_hours is None:
+        retention_hours = getattr(settings, 'OUTBOX_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)
+    cutoff = (now or timezone.now()) - timedelta(hours=retention_hours)
+    return OutgoingEmail.objects.filter(
+        Q(status=OutgoingEmail.STATUS_SENT, sent_at__lt=cutoff)
+        | Q(status=OutgoingEmail.STATUS_FAILED, created_at__lt=cutoff)
+    )
+
+
+def purge_finished(batch_size=PURGE_BATCH_SIZE, now=None, retention_hours=None):
+    """Удаляет завершённые письма пачками по ``batch_size``; возвращает число удалённых строк"""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                purgeable_emails(now, retention_hours).order_by().values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                return total
+            deleted, _ = OutgoingEmail.objects.filter(pk__in=ids).delete()
+        total += deleted
+        if len(ids) < batch_size:
+            return total
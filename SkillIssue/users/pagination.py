@@ -0,0 +1,166 @@
+"""
+Постраничная выдача по ключу (keyset/cursor) для списков руководств и объявлений.
+
+Следующая страница выбирается условием «строки после последней показанной»
+по полям сортировки (с id для однозначности), а не OFFSET, поэтому цена
+страницы не растёт с её номером и опирается на составные индексы
+guide_keyset_idx / announcement_keyset_idx.
+
+Точный COUNT(*) не считается: по ``?with_count=1`` отдаётся оценка
+планировщика PostgreSQL (строится по статистике pg_class.reltuples).
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+GUIDE_ORDERING = ('-rating', '-created_at', '-id')
+ANNOUNCEMENT_ORDERING = ('-created_at', '-id')
+
+
+def estimated_count(queryset):
+    """Оценка числа строк из плана запроса (без выполнения самого запроса)"""
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _with_id(ordering):
+    ordering = tuple(ordering)
+    if any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+        return ordering
+    return ordering + (('-id',) if ordering and ordering[0].startswith('-') else ('id',))
+
+
+def keyset_filter(model, ordering, values):
+    """
+    Условие «после строки со значениями ``values``» для сортировки ``ordering``.
+    При одинаковом направлении всех полей — сравнение строк (a, b, id) < (...),
+    которое PostgreSQL выполняет одним диапазоном индекса; иначе — раскрытие через OR.
+    """
+    descending = {field.startswith('-') for field in ordering}
+    names = [field.lstrip('-') for field in ordering]
+
+    if len(descending) == 1:
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(f'{table}.{connection.ops.quote_name(model._meta.get_field(name).column)}'
+                            for name in names)
+        placeholders = ', '.join(['%s'] * len(names))
+        operator = '<' if descending.pop() else '>'
+        return RawSQL(f'({columns}) {operator} ({placeholders})', values, output_field=BooleanField())
+
+    condition = Q()
+    equal = {}
+    for field, name, value in zip(ordering, names, values):
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по полям сортировки.
+    Сортировка берётся из аргумента ``ordering``, атрибута ``keyset_ordering``
+    представления или order_by самого queryset.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'with_count'
+
+    def __init__(self, ordering=None):
+        self.ordering = ordering
+
+    def get_ordering(self, queryset, view):
+        ordering = self.ordering or getattr(view, 'keyset_ordering', None) or queryset.query.order_by
+        if not ordering:
+            ordering = ('-id',)
+        return _with_id(ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values):
+        # DjangoJSONEncoder обрезает время до миллисекунд, а курсору нужна полная точность
+        values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+        raw = json.dumps(values, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, model, names, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(names, values)]
+        except (binascii.Error, UnicodeDecodeError, ValueError, ValidationError):
+            raise NotFound("Некорректный курсор")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        ordering = self.get_ordering(queryset, view)
+
+        self.estimated_count = None
+        if request.query_params.get(self.count_query_param, '').strip().lower() in ('1', 'true', 'yes'):
+            self.estimated_count = estimated_count(queryset)
+
+        page, self.next_cursor = self.paginate(
+            queryset, ordering, self.get_page_size(request), request.query_params.get(self.cursor_query_param)
+        )
+        return page
+
+    def paginate(self, queryset, ordering, size, cursor=None):
+        """Страница из ``size`` строк после курсора и курсор следующей (или None)"""
+        model = queryset.model
+        ordering = _with_id(ordering)
+        names = ['id' if name == 'pk' else name for name in (field.lstrip('-') for field in ordering)]
+        if cursor:
+            queryset = queryset.filter(keyset_filter(model, ordering, self.decode_cursor(model, names, cursor)))
+
+        rows = list(queryset.order_by(*ordering)[:size + 1])
+        page = rows[:size]
+        next_cursor = None
+        if len(rows) > size:
+            next_cursor = self.encode_cursor([getattr(page[-1], name) for name in names])
+        return page, next_cursor
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_page_data(self, data):
+        page = {'next': self.get_next_link(), 'results': data}
+        if self.estimated_count is not None:
+            page['estimated_count'] = self.estimated_count
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_page_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'estimated_count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,243 @@
+"""
+Профилирование выбранных запросов на рабочем сервере.
+
+ProfilingMiddleware (включается PROFILING_ENABLED) профилирует запрос, если:
+  * пришёл заголовок ``X-Profile`` со значением PROFILING_HEADER_TOKEN
+    (пустой токен отключает заголовок), или
+  * запрос подходит под PROFILING_VIEWS (имена маршрутов или префиксы пути,
+    начинающиеся с «/»; пустой список — любой запрос) и выпал с вероятностью
+    PROFILING_SAMPLE_RATE.
+
+Режимы (PROFILING_MODE):
+  * ``sampler`` — фоновый поток раз в PROFILING_INTERVAL секунд снимает стек
+    потока запроса (sys._current_frames); накладные расходы почти не зависят
+    от глубины кода. Результат — файл .folded в формате collapsed stacks
+    (flamegraph.pl, speedscope).
+  * ``cprofile`` — детерминированный cProfile, точные числа вызовов, но
+    заметно медленнее; результат — файл .prof (pstats).
+
+Файлы пишутся в PROFILING_DIR (по умолчанию во временном каталоге, вне
+дерева исходников) с именем маршрута в названии, имя файла возвращается
+заголовком X-Profile-Id. После записи в каталоге остаются только
+PROFILING_MAX_FILES самых новых профилей. ``manage.py profile_report``
+сводит файлы в таблицу самых горячих функций, а с ``--prune`` удаляет
+старые профили.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+MODE_SAMPLER = 'sampler'
+MODE_CPROFILE = 'cprofile'
+
+EXTENSIONS = {MODE_SAMPLER: '.folded', MODE_CPROFILE: '.prof'}
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_MAX_FILES = 500
+HEADER = 'X-Profile'
+
+_SLUG_RE = re.compile(r'[^\w.-]+')
+
+
+def profiling_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def _short_path(filename):
+    for marker in ('site-packages' + os.sep, str(settings.BASE_DIR) + os.sep):
+        position = filename.rfind(marker)
+        if position != -1:
+            return filename[position + len(marker):]
+    return filename
+
+
+def frame_name(code):
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """Стек кадра в виде «внешняя;…;текущая» (формат collapsed stacks)"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Периодически снимает стек одного потока в фоновом потоке"""
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+def _matches(request, view_name, patterns):
+    if not patterns:
+        return True
+    return any(
+        request.path.startswith(pattern) if pattern.startswith('/') else pattern == view_name
+        for pattern in patterns
+    )
+
+
+def should_profile(request, view_name):
+    token = getattr(settings, 'PROFILING_HEADER_TOKEN', '')
+    if token and request.headers.get(HEADER) == token:
+        return True
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+    return rate > 0 and _matches(request, view_name, getattr(settings, 'PROFILING_VIEWS', ())) \
+        and random.random() < rate
+
+
+def profile_path(view_name, mode):
+    slug = _SLUG_RE.sub('_', view_name or 'unresolved')[:60]
+    return profiling_dir() / f'{time.time_ns()}-{os.getpid()}-{slug}{EXTENSIONS[mode]}'
+
+
+class ProfilingMiddleware:
+    """Профилирует выбранные запросы; отключена, пока PROFILING_ENABLED не включена"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            view_name = None
+        if not should_profile(request, view_name):
+            return self.get_response(request)
+
+        mode = getattr(settings, 'PROFILING_MODE', MODE_SAMPLER)
+        path = profile_path(view_name, mode)
+        if mode == MODE_CPROFILE:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # В потоке уже работает другой профилировщик
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            save = profiler.dump_stats
+        else:
+            sampler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_INTERVAL', DEFAULT_INTERVAL))
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            save = sampler.write
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            save(str(path))
+            prune_profiles(path.parent, keep=max(1, getattr(settings, 'PROFILING_MAX_FILES', DEFAULT_MAX_FILES)))
+        except OSError:
+            logger.exception("Не удалось записать профиль %s", path)
+        else:
+            response['X-Profile-Id'] = path.name
+        return response
+
+
+def profile_files(directory=None, view=None):
+    """Файлы профилей каталога (по подстроке имени маршрута) по типам"""
+    directory = Path(directory) if directory else profiling_dir()
+    files = {MODE_SAMPLER: [], MODE_CPROFILE: []}
+    if not directory.is_dir():
+        return files
+    for mode, extension in EXTENSIONS.items():
+        files[mode] = sorted(
+            path for path in directory.glob(f'*{extension}')
+            if view is None or view in path.stem.split('-', 2)[-1]
+        )
+    return files
+
+
+def prune_profiles(directory=None, keep=None, older_than=None):
+    """
+    Удаляет профили сверх ``keep`` самых новых и старше ``older_than``
+    секунд. Возвращает число удалённых файлов.
+    """
+    files = profile_files(directory)
+    # Имя начинается с time_ns, поэтому сортировка по имени — по времени записи
+    paths = sorted(files[MODE_SAMPLER] + files[MODE_CPROFILE], key=lambda path: path.name, reverse=True)
+    kept = paths[:keep] if keep is not None else paths
+    stale = paths[len(kept):]
+    if older_than is not None:
+        cutoff = time.time_ns() - int(older_than * 1e9)
+        stale += [path for path in kept if _written_at(path) < cutoff]
+    removed = 0
+    for path in stale:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def _written_at(path):
+    prefix = path.name.split('-', 1)[0]
+    return int(prefix) if prefix.isdigit() else path.stat().st_mtime_ns
+
+
+def folded_stats(paths):
+    """
+    Сводка collapsed stacks: (число снимков, собственные снимки функции,
+    снимки, в которых функция была в стеке)
+    """
+    total = 0
+    own, inclusive = Counter(), Counter()
+    for path in paths:
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if not stack or not count.isdigit():
+                    continue
+                count = int(count)
+                frames = stack.split(';')
+                total += count
+                own[frames[-1]] += count
+                for frame in set(frames):
+                    inclusive[frame] += count
+    return total, own, inclusive
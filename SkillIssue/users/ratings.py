@@ -0,0 +1,115 @@
+"""
+Рейтинги руководств и их авторов.
+
+Оценки (GuideRating) и звёзды отзывов (Review) копятся в полях
+``rating_sum`` / ``rating_count`` руководства и профиля автора.
+Сигналы меняют их на разницу одним UPDATE с F()-выражениями, поэтому
+цена оценки не зависит от количества оценок и руководств у автора.
+Средний рейтинг (``rating``) пересчитывается в том же UPDATE.
+"""
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Guide, GuideRating, Profile, Review
+
+_NUMERIC = DecimalField(max_digits=12, decimal_places=4)
+
+GUIDE_RATING_FIELD = IntegerField()
+PROFILE_RATING_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def review_vote(stars):
+    """Вклад отзыва в рейтинг: (сумма, количество). Отзыв без звёзд не учитывается"""
+    stars = int(stars or 0)
+    return (stars, 1) if stars > 0 else (0, 0)
+
+
+def _average(delta_sum, delta_count, output_field):
+    """Среднее с учётом изменения; приведение к integer/numeric(3,2) округляет в PostgreSQL"""
+    total = Cast(F('rating_sum') + delta_sum, _NUMERIC)
+    count = NullIf(F('rating_count') + delta_count, Value(0))
+    return Coalesce(
+        Cast(ExpressionWrapper(total / count, output_field=_NUMERIC), output_field),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+def _apply(queryset, delta_sum, delta_count, output_field):
+    queryset.update(
+        rating_sum=F('rating_sum') + delta_sum,
+        rating_count=F('rating_count') + delta_count,
+        rating=_average(delta_sum, delta_count, output_field),
+    )
+
+
+def apply_vote(guide_id, delta_sum, delta_count):
+    """Учитывает изменение оценок руководства в нём самом и в профиле его автора"""
+    if not delta_sum and not delta_count:
+        return
+    _apply(Guide.objects.filter(pk=guide_id), delta_sum, delta_count, GUIDE_RATING_FIELD)
+    author_id = Guide.objects.filter(pk=guide_id).values_list('author_id', flat=True).first()
+    if author_id is not None:
+        _apply(Profile.objects.filter(user_id=author_id), delta_sum, delta_count, PROFILE_RATING_FIELD)
+
+
+def _sum_subquery(queryset, group_field, value):
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_field).annotate(value=value).values('value')[:1]),
+        Value(0),
+    )
+
+
+def _expected_guide_totals():
+    """Суммы и количества голосов руководства, посчитанные по исходным таблицам"""
+    ratings = GuideRating.objects.filter(guide=OuterRef('pk'))
+    reviews = Review.objects.filter(guide=OuterRef('pk'), stars__gt=0)
+    return {
+        'expected_sum': _sum_subquery(ratings, 'guide', Sum('rating')) + _sum_subquery(reviews, 'guide', Sum('stars')),
+        'expected_count': _sum_subquery(ratings, 'guide', Count('id')) + _sum_subquery(reviews, 'guide', Count('id')),
+    }
+
+
+def _expected_profile_totals():
+    ratings = GuideRating.objects.filter(guide__author=OuterRef('user'))
+    reviews = Review.objects.filter(guide__author=OuterRef('user'), stars__gt=0)
+    return {
+        'expected_sum': (
+            _sum_subquery(ratings, 'guide__author', Sum('rating'))
+            + _sum_subquery(reviews, 'guide__author', Sum('stars'))
+        ),
+        'expected_count': (
+            _sum_subquery(ratings, 'guide__author', Count('id'))
+            + _sum_subquery(reviews, 'guide__author', Count('id'))
+        ),
+    }
+
+
+def rebuild_ratings():
+    """Полный пересчёт агрегатов по GuideRating и Review"""
+    totals = _expected_guide_totals()
+    Guide.objects.update(rating_sum=totals['expected_sum'], rating_count=totals['expected_count'])
+    Guide.objects.update(rating=_average(0, 0, GUIDE_RATING_FIELD))
+
+    totals = _expected_profile_totals()
+    Profile.objects.update(rating_sum=totals['expected_sum'], rating_count=totals['expected_count'])
+    Profile.objects.update(rating=_average(0, 0, PROFILE_RATING_FIELD))
+
+
+def _mismatches(queryset, totals):
+    return queryset.annotate(**totals).filter(
+        ~Q(rating_sum=F('expected_sum')) | ~Q(rating_count=F('expected_count'))
+    )
+
+
+def verify_ratings():
+    """
+    Сверяет сохранённые агрегаты с исходными таблицами.
+    Возвращает словарь {'guides': [id, ...], 'profiles': [user_id, ...]} с расхождениями.
+    """
+    return {
+        'guides': list(_mismatches(Guide.objects.all(), _expected_guide_totals()).values_list('pk', flat=True)),
+        'profiles': list(
+            _mismatches(Profile.objects.all(), _expected_profile_totals()).values_list('user_id', flat=True)
+        ),
+    }
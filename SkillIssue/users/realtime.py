@@ -0,0 +1,200 @@
+"""
+Доставка событий чата в реальном времени (Server-Sent Events поверх ASGI).
+
+Клиент держит открытым ``/api/chat/stream/`` и получает новые сообщения
+и отметки о прочтении без повторных запросов к истории. Поток включается
+настройкой CHAT_STREAM_ENABLED и только под ASGI-сервером: под WSGI
+(runserver, gunicorn без uvicorn-воркеров) бесконечный асинхронный ответ
+не отдаётся клиенту, а занимает поток сервера, поэтому там маршрут отвечает 404. Подписчики живут
+в брокере: по умолчанию LocalBroker раздаёт события внутри процесса через
+asyncio.Queue, другой бэкенд подключается настройкой CHAT_BROKER_BACKEND
+(класс с методами ``publish`` и ``subscribe``, см. BaseBroker).
+
+LocalBroker не видит публикаций из других процессов, поэтому при нескольких
+воркерах нужен общий бэкенд (например, на LISTEN/NOTIFY или Redis).
+"""
+import abc
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .serializers import ChatMessageSerializer
+
+DEFAULT_BROKER_BACKEND = 'users.realtime.LocalBroker'
+
+# Размер очереди одного подписчика; при переполнении события теряются,
+# клиент догружает пропущенное курсором ``after`` истории
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Как часто отправлять комментарий-пинг, чтобы прокси не закрывали соединение
+HEARTBEAT_INTERVAL = 15
+
+
+class Subscription:
+    """Очередь событий одного соединения"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+
+    def deliver(self, event):
+        """Кладёт событие в очередь; безопасно вызывать из любого потока"""
+        if self.loop is not None and self.loop.is_running():
+            try:
+                current = asyncio.get_running_loop()
+            except RuntimeError:
+                current = None
+            if current is not self.loop:
+                self.loop.call_soon_threadsafe(self._put, event)
+                return
+        self._put(event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout=None):
+        """Следующее событие или None, если за ``timeout`` секунд ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker(abc.ABC):
+    """
+    Интерфейс бэкенда: публикация события пользователю и подписка на его события.
+    Брокер без какого-либо из методов не создаётся (TypeError при get_broker()).
+    """
+
+    @abc.abstractmethod
+    def publish(self, user_id, event):
+        """Доставляет событие всем подпискам пользователя"""
+
+    @abc.abstractmethod
+    def subscribe(self, user_id):
+        """Новая подписка (Subscription) на события пользователя"""
+
+    @abc.abstractmethod
+    def unsubscribe(self, subscription):
+        """Снимает подписку, полученную от subscribe()"""
+
+
+class LocalBroker(BaseBroker):
+    """Брокер в памяти процесса"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, 'CHAT_BROKER_BACKEND', DEFAULT_BROKER_BACKEND)
+                _broker = import_string(backend)()
+    return _broker
+
+
+def format_event(event):
+    """Событие в формате text/event-stream"""
+    data = json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(user_id, heartbeat=HEARTBEAT_INTERVAL):
+    """Поток SSE пользователя; подписка живёт, пока клиент не отключится"""
+    subscription = get_broker().subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            event = await subscription.get(timeout=heartbeat)
+            yield ": ping\n\n" if event is None else format_event(event)
+    finally:
+        subscription.close()
+
+
+def active_user_id(user_id):
+    """``user_id``, если пользователь активен и не заблокирован; иначе None"""
+    if user_id is None:
+        return None
+    allowed = User.objects.filter(pk=user_id, is_active=True).exclude(profile__is_blocked=True).exists()
+    return user_id if allowed else None
+
+
+def user_id_from_token(raw_token):
+    """
+    id пользователя из access-токена (заголовок Authorization клиентов API);
+    None, если токен невалиден или пользователь отключён либо заблокирован.
+    Браузер подключается с cookie сессии: токен в URL попал бы в логи доступа.
+    """
+    if not raw_token:
+        return None
+    try:
+        user_id = AccessToken(raw_token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+    return active_user_id(user_id)
+
+
+def publish_message(message):
+    """Новое сообщение — отправителю (другие его вкладки) и получателю"""
+    data = ChatMessageSerializer(message).data
+    broker = get_broker()
+    broker.publish(message.receiver_id, {'type': 'message', 'message': {**data, 'direction': 'incoming'}})
+    broker.publish(message.sender_id, {'type': 'message', 'message': {**data, 'direction': 'outgoing'}})
+
+
+def publish_read(reader_id, other_id, count):
+    """Отметка о прочтении: ``reader_id`` прочитал ``count`` сообщений от ``other_id``"""
+    get_broker().publish(other_id, {'type': 'read', 'reader_id': reader_id, 'count': count})
@@ -0,0 +1,162 @@
+"""
+Рендеринг markdown-текста руководств в HTML.
+
+Готовый HTML хранится в ``Guide.content_html`` вместе с ключом
+``content_html_key`` — хешем текста и версии конвейера. Пока ключ
+совпадает, страница руководства отдаёт сохранённый HTML и не запускает
+markdown/Pygments. После изменения конвейера увеличьте PIPELINE_VERSION
+и выполните ``manage.py rerender_guides``.
+"""
+import hashlib
+import re
+
+import markdown
+
+from .models import Guide
+
+try:
+    import pygments
+    _PYGMENTS_VERSION = pygments.__version__
+except ImportError:
+    _PYGMENTS_VERSION = 'none'
+
+# Увеличивать при любом изменении конвейера ниже
+PIPELINE_VERSION = 1
+
+RENDERER_VERSION = f'{PIPELINE_VERSION}:markdown-{markdown.__version__}:pygments-{_PYGMENTS_VERSION}'
+
+
+def convert_youtube_links_to_embed(content):
+    """Конвертирует YouTube ссылки в embed формат"""
+    # Стандартные YouTube ссылки
+    pattern_standard = r'https?://(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
+    # YouTube Shorts
+    pattern_shorts = r'https?://(?:www\.)?youtube\.com/shorts/([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
+
+    def replace_standard(match):
+        video_id = match.group(1)
+        params = match.group(2) or ''
+        if params.startswith('&'):
+            params = '?' + params[1:]
+        elif params and not params.startswith('?'):
+            params = '?' + params
+        return f'https://www.youtube.com/embed/{video_id}{params}'
+
+    def replace_shorts(match):
+        video_id = match.group(1)
+        return f'https://www.youtube.com/embed/{video_id}'
+
+    content = re.sub(pattern_standard, replace_standard, content)
+    content = re.sub(pattern_shorts, replace_shorts, content)
+
+    return content
+
+
+def convert_youtube_embeds_to_html(content):
+    # Паттерн для Shorts (с #shorts в конце URL)
+    pattern_shorts = r'https://www\.youtube\.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>]*)#shorts'
+    # Паттерн для обычных видео
+    pattern_normal = r'https://www\.youtube\.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
+
+    def replace_with_iframe(match, is_shorts):
+        video_id = match.group(1)
+        params = match.group(2) or ''
+        if is_shorts:
+            return f'''<div class="youtube-embed-wrapper">
+                        <iframe width="560" height="315" 
+                            src="https://www.youtube.com/embed/{video_id}" 
+                            frameborder="0" 
+                            allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" 
+                            referrerpolicy="strict-origin-when-cross-origin" 
+                            allowfullscreen 
+                            loading="lazy">
+                        </iframe>
+                    </div><br>'''
+        else:
+            return f'''<div class="youtube-embed-wrapper">
+                <iframe width="560" height="315" 
+                    src="https://www.youtube.com/embed/{video_id}{params}" 
+                    frameborder="0" 
+                    allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" 
+                    referrerpolicy="strict-origin-when-cross-origin" 
+                    allowfullscreen 
+                    loading="lazy">
+                </iframe>
+            </div><br>'''
+
+    content = re.sub(pattern_shorts, lambda m: replace_with_iframe(m, is_shorts=True), content)
+    content = re.sub(pattern_normal, lambda m: replace_with_iframe(m, is_shorts=False), content)
+
+    return content
+
+
+def render_markdown(content):
+    """Полный конвейер: YouTube-ссылки -> iframe -> markdown (extra, codehilite) -> пути картинок"""
+    content = content or ""
+
+    # === 1. Сначала конвертируем YouTube ссылки в embed формат ===
+    content = convert_youtube_links_to_embed(content)
+
+    # === 2. Конвертируем embed URL в iframe HTML (ДО markdown!) ===
+    content = convert_youtube_embeds_to_html(content)
+
+    # === 3. Применяем markdown с safe_mode=False чтобы сохранить HTML ===
+    html = markdown.markdown(
+        content,
+        extensions=['extra', 'codehilite'],
+        output_format='html5'
+    )
+
+    # === 4. Исправляем пути к изображениям ===
+    return re.sub(
+        r'src="(?!https?://|/)([^"]+)"',
+        r'src="/media/guides/\1"',
+        html,
+        flags=re.IGNORECASE
+    )
+
+
+def content_key(content):
+    """Ключ кеша: sha256 от версии конвейера и текста руководства"""
+    digest = hashlib.sha256()
+    digest.update(RENDERER_VERSION.encode())
+    digest.update(b'\0')
+    digest.update((content or '').encode())
+    return digest.hexdigest()
+
+
+def refresh_guide_html(guide, force=False):
+    """
+    Перерисовывает HTML руководства, если текст или конвейер изменились.
+    Возвращает актуальный HTML (при совпадении ключа — сохранённый).
+    """
+    key = content_key(guide.content)
+    if not force and guide.content_html_key == key:
+        return guide.content_html
+
+    html = render_markdown(guide.content)
+    Guide.objects.filter(pk=guide.pk).update(content_html=html, content_html_key=key)
+    guide.content_html, guide.content_html_key = html, key
+    return html
+
+
+def rerender_guides(force=False, batch_size=200):
+    """Массовая перерисовка; возвращает число перерисованных руководств"""
+    rendered = 0
+    batch = []
+    queryset = Guide.objects.only('id', 'content', 'content_html_key').order_by('pk')
+    for guide in queryset.iterator(chunk_size=batch_size):
+        key = content_key(guide.content)
+        if not force and guide.content_html_key == key:
+            continue
+        guide.content_html = render_markdown(guide.content)
+        guide.content_html_key = key
+        batch.append(guide)
+        if len(batch) >= batch_size:
+            Guide.objects.bulk_update(batch, ['content_html', 'content_html_key'])
+            rendered += len(batch)
+            batch = []
+    if batch:
+        Guide.objects.bulk_update(batch, ['content_html', 'content_html_key'])
+        rendered += len(batch)
+    return rendered
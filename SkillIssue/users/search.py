@@ -0,0 +1,321 @@
+"""
+Полнотекстовый поиск по руководствам, объявлениям и профилям.
+
+Поисковые векторы хранятся в полях ``search_vector`` (GIN-индекс) и
+обновляются сигналами при сохранении объектов. Ранжирование выполняется
+в PostgreSQL, поэтому из базы уходят только верхние N строк.
+"""
+import base64
+import binascii
+import re
+from datetime import datetime
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.contrib.auth.models import User
+from django.db.models import Case, CharField, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim
+
+from .models import Announcement, Guide, Profile
+
+# Конфигурация russian стеммит кириллицу, а латиницу обрабатывает english_stem
+SEARCH_CONFIG = 'russian'
+
+# Бонус к рангу, если название начинается с запроса (аналог старых +5 баллов)
+TITLE_PREFIX_BONUS = 1.0
+
+DEFAULT_LIMIT = 20
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_LENGTH = 2
+
+ALL_ITEMS_PAGE_SIZE = 50
+ALL_ITEMS_MAX_PAGE_SIZE = 200
+# Тип элемента и префикс URL по рангу; ранг упорядочивает элементы с одинаковым временем
+ALL_ITEMS_TYPES = (
+    ('профиль', '/users/'),
+    ('объявление', '/announcements/'),
+    ('руководство', '/guides/'),
+)
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def guide_search_vector():
+    """Выражение поискового вектора руководства: название (A), теги (C), текст (B)"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('content', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('tags', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def announcement_search_vector():
+    """Выражение поискового вектора объявления: название (A), теги (C), описание (B)"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('tags', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def profile_search_vector(user):
+    """
+    Выражение поискового вектора профиля.
+    Имя пользователя и ФИО лежат в auth_user, поэтому передаются значениями.
+    """
+    full_name = f"{user.first_name} {user.last_name}".strip()
+    return (
+        SearchVector(Value(user.username), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(full_name), weight='A', config=SEARCH_CONFIG)
+        + SearchVector('bio', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def all_profiles_search_vector():
+    """То же выражение для массового UPDATE: имя и ФИО берутся подзапросом к auth_user"""
+    users = User.objects.filter(pk=OuterRef('user_id'))
+    full_name = users.annotate(full_name=Trim(Concat('first_name', Value(' '), 'last_name'))).values('full_name')
+    return (
+        SearchVector(Subquery(users.values('username')[:1]), weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(full_name[:1]), weight='A', config=SEARCH_CONFIG)
+        + SearchVector('bio', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_guide_vector(guide_id):
+    Guide.objects.filter(pk=guide_id).update(search_vector=guide_search_vector())
+
+
+def update_announcement_vector(announcement_id):
+    Announcement.objects.filter(pk=announcement_id).update(search_vector=announcement_search_vector())
+
+
+def update_profile_vector(profile):
+    Profile.objects.filter(pk=profile.pk).update(search_vector=profile_search_vector(profile.user))
+
+
+def rebuild_search_vectors():
+    """Полная переиндексация (после массовой загрузки данных)"""
+    Guide.objects.update(search_vector=guide_search_vector())
+    Announcement.objects.update(search_vector=announcement_search_vector())
+    Profile.objects.update(search_vector=all_profiles_search_vector())
+
+
+def build_search_query(text):
+    """
+    Строит префиксный tsquery из пользовательского ввода: каждое слово
+    превращается в ``слово:*``, слова объединяются через И.
+    Возвращает None, если в запросе нет ни одного слова.
+    """
+    terms = _TERM_RE.findall(text or '')
+    if not terms:
+        return None
+    raw = ' & '.join(f'{term}:*' for term in terms)
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def _rank(query, text, title_field='title'):
+    return SearchRank(F('search_vector'), query) + Case(
+        When(**{f'{title_field}__istartswith': text}, then=Value(TITLE_PREFIX_BONUS)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def search_guides(text, queryset=None, limit=DEFAULT_LIMIT):
+    """Руководства, отсортированные по релевантности (ранг считается в SQL)"""
+    query = build_search_query(text)
+    if queryset is None:
+        queryset = Guide.objects.all()
+    if query is None:
+        return queryset.none()
+    queryset = queryset.filter(search_vector=query).annotate(relevance=_rank(query, text.strip()))
+    queryset = queryset.order_by('-relevance', '-rating', '-created_at')
+    return queryset[:limit] if limit else queryset
+
+
+def search_announcements(text, queryset=None, limit=DEFAULT_LIMIT):
+    """Объявления, отсортированные по релевантности (ранг считается в SQL)"""
+    query = build_search_query(text)
+    if queryset is None:
+        queryset = Announcement.objects.all()
+    if query is None:
+        return queryset.none()
+    queryset = queryset.filter(search_vector=query).annotate(relevance=_rank(query, text.strip()))
+    queryset = queryset.order_by('-relevance', '-created_at')
+    return queryset[:limit] if limit else queryset
+
+
+def search_profiles(text, queryset=None, limit=DEFAULT_LIMIT):
+    """Профили, отсортированные по релевантности (ранг считается в SQL)"""
+    query = build_search_query(text)
+    if queryset is None:
+        queryset = Profile.objects.all()
+    if query is None:
+        return queryset.none()
+    queryset = queryset.filter(search_vector=query).annotate(
+        relevance=_rank(query, text.strip(), title_field='user__username')
+    )
+    queryset = queryset.order_by('-relevance', 'user__username')
+    return queryset[:limit] if limit else queryset
+
+
+def search_all(text, limit=DEFAULT_LIMIT):
+    """
+    Общий поиск для выпадающего списка в шапке.
+    Из базы забираются только id, заголовки и ранг.
+    """
+    results = []
+
+    profiles = search_profiles(text, limit=limit).values(
+        'relevance', 'user__username', 'user__first_name', 'user__last_name'
+    )
+    for p in profiles:
+        full_name = f"{p['user__first_name']} {p['user__last_name']}".strip()
+        results.append({
+            'title': full_name or p['user__username'],
+            'type': 'профиль',
+            'url': f"/users/{p['user__username']}/",
+            'relevance': p['relevance'],
+        })
+
+    for a in search_announcements(text, limit=limit).values('id', 'title', 'relevance'):
+        results.append({
+            'title': a['title'],
+            'type': 'объявление',
+            'url': f"/announcements/{a['id']}/",
+            'relevance': a['relevance'],
+        })
+
+    for g in search_guides(text, limit=limit).values('id', 'title', 'relevance'):
+        results.append({
+            'title': g['title'],
+            'type': 'руководство',
+            'url': f"/guides/{g['id']}/",
+            'relevance': g['relevance'],
+        })
+
+    results.sort(key=lambda x: x['relevance'], reverse=True)
+    return [{'title': r['title'], 'type': r['type'], 'url': r['url']} for r in results[:limit]]
+
+
+def _autocomplete_queryset(queryset, text, field, limit):
+    """Кандидаты по триграммному сходству слов (оператор <% использует GIN-индекс gin_trgm_ops)"""
+    return queryset.filter(**{f'{field}__trigram_word_similar': text}).annotate(
+        similarity=TrigramWordSimilarity(text, field) + Case(
+            When(**{f'{field}__istartswith': text}, then=Value(TITLE_PREFIX_BONUS)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by('-similarity')[:limit]
+
+
+def autocomplete(text, limit=AUTOCOMPLETE_LIMIT):
+    """
+    Подсказки для строки поиска: префиксные совпадения и опечатки.
+    Для каждой модели берётся не больше ``limit`` строк, затем списки сливаются.
+    """
+    text = (text or '').strip()
+    if len(text) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+
+    results = []
+    profiles = _autocomplete_queryset(Profile.objects.all(), text, 'user__username', limit)
+    for p in profiles.values('similarity', 'user__username'):
+        results.append({
+            'title': p['user__username'],
+            'type': 'профиль',
+            'url': f"/users/{p['user__username']}/",
+            'score': p['similarity'],
+        })
+
+    for a in _autocomplete_queryset(Announcement.objects.all(), text, 'title', limit).values('id', 'title', 'similarity'):
+        results.append({
+            'title': a['title'],
+            'type': 'объявление',
+            'url': f"/announcements/{a['id']}/",
+            'score': a['similarity'],
+        })
+
+    for g in _autocomplete_queryset(Guide.objects.all(), text, 'title', limit).values('id', 'title', 'similarity'):
+        results.append({
+            'title': g['title'],
+            'type': 'руководство',
+            'url': f"/guides/{g['id']}/",
+            'score': g['similarity'],
+        })
+
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return [{'title': r['title'], 'type': r['type'], 'url': r['url']} for r in results[:limit]]
+
+
+def encode_items_cursor(created_at, rank, pk):
+    raw = f"{created_at.isoformat()}|{rank}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_items_cursor(cursor):
+    """(created_at, ранг типа, id) из курсора; ValueError, если курсор повреждён"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, rank, pk = raw.rsplit('|', 2)
+        rank = int(rank)
+        if not 0 <= rank < len(ALL_ITEMS_TYPES):
+            raise ValueError
+        return datetime.fromisoformat(created_at), rank, int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Некорректный курсор") from exc
+
+
+def _all_items_querysets():
+    """Запросы по типам в порядке ранга: (created_at, id, ключ для URL, название)"""
+    profiles = Profile.objects.annotate(
+        item_title=Coalesce(
+            NullIf(Trim(Concat('user__first_name', Value(' '), 'user__last_name')), Value('')),
+            'user__username',
+            output_field=CharField(),
+        ),
+    ).values_list('created_at', 'id', 'user__username', 'item_title')
+    announcements = Announcement.objects.values_list('created_at', 'id', 'id', 'title')
+    guides = Guide.objects.values_list('created_at', 'id', 'id', 'title')
+    return profiles, announcements, guides
+
+
+def all_items_page(cursor=None, limit=ALL_ITEMS_PAGE_SIZE):
+    """
+    Постраничный список всех профилей, объявлений и руководств, новые первыми.
+
+    Порядок — (created_at убыв., ранг типа, id убыв.). Каждая таблица читается
+    по своему индексу (-created_at, -id) не дальше ``limit + 1`` строк после
+    курсора, затем три списка сливаются, поэтому цена страницы не зависит ни от
+    размера таблиц, ни от номера страницы. Возвращает (элементы, курсор следующей
+    страницы или None); ValueError, если курсор повреждён.
+    """
+    limit = max(1, min(limit, ALL_ITEMS_MAX_PAGE_SIZE))
+    position = decode_items_cursor(cursor) if cursor else None
+
+    rows = []
+    for rank, queryset in enumerate(_all_items_querysets()):
+        if position is not None:
+            created_at, cursor_rank, pk = position
+            # Типы с меньшим рангом при равном времени уже показаны, с большим — ещё нет
+            if rank < cursor_rank:
+                queryset = queryset.filter(created_at__lt=created_at)
+            elif rank > cursor_rank:
+                queryset = queryset.filter(created_at__lte=created_at)
+            else:
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        rows += [(row, rank) for row in queryset.order_by('-created_at', '-id')[:limit + 1]]
+
+    rows.sort(key=lambda item: (item[0][0], -item[1], item[0][1]), reverse=True)
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        (created_at, pk, _, _), rank = page[-1]
+        next_cursor = encode_items_cursor(created_at, rank, pk)
+
+    items = []
+    for (_, _, key, title), rank in page:
+        item_type, url_prefix = ALL_ITEMS_TYPES[rank]
+        items.append({'title': title, 'type': item_type, 'url': f'{url_prefix}{key}/'})
+    return items, next_cursor
@@ -0,0 +1,412 @@
+"""
+Синтетические данные для нагрузочного тестирования (``manage.py seed``).
+
+Объёмы задаются числом пользователей и коэффициентами RATIOS (строк на
+пользователя), любой объём можно переопределить. Строки вставляются
+bulk_create пачками по ``batch_size`` в одной транзакции, поэтому миллион
+строк загружается за минуты. Все случайные решения берутся из одного
+random.Random(seed): один и тот же seed даёт те же тексты, теги, оценки
+и связи (первичные ключи зависят от последовательностей базы).
+
+Распределения перекошены (см. Seeder.skewed): небольшая часть пользователей
+пишет большую часть руководств, к популярным руководствам и объявлениям
+приходится основная масса отзывов, оценок и избранного, популярные теги
+встречаются чаще редких. Временные метки полей с auto_now / auto_now_add
+(ChatMessage, избранное, оценки, updated_at) получают время загрузки.
+
+bulk_create не вызывает сигналов, поэтому после загрузки (и ANALYZE
+заполненных таблиц) пересчитываются все денормализованные данные: лайки,
+рейтинги, теги, поисковые векторы, сводки переписок, HTML руководств
+и счётчики платформы.
+"""
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from . import counters, homepage
+from .chat import rebuild_conversations
+from .facets import rebuild_tag_usage
+from .models import Announcement, AnnouncementComment, AnnouncementCommentRating, AnnouncementCommentReply, \
+    AnnouncementCommentReplyRating, ChatMessage, FavoriteAnnouncement, FavoriteGuide, Guide, GuideRating, \
+    GuideReviewRating, Profile, ProfileReview, ProfileReviewRating, Review, ReviewReply, ReviewReplyRating
+from .ratings import rebuild_ratings
+from .rendering import rerender_guides
+from .search import rebuild_search_vectors
+from .tags import normalize_tags
+from .votes import rebuild_vote_counters
+
+DEFAULT_USERS = 1000
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_PREFIX = 'seed'
+SEED_PASSWORD = 'seed-password'
+
+# Строк каждого вида на одного пользователя; 50 000 пользователей дают около миллиона строк
+RATIOS = {
+    'guides': 0.5,
+    'announcements': 0.3,
+    'reviews': 2,
+    'review_replies': 0.5,
+    'comments': 1,
+    'comment_replies': 0.3,
+    'ratings': 3,
+    'votes': 3,
+    'profile_reviews': 0.5,
+    'favorites': 2,
+    'messages': 5,
+}
+
+# Показатель перекоса: индекс = n * random() ** SKEW, чем больше, тем сильнее
+SKEW = 3.0
+INACTIVE_SHARE = 0.05
+LIKE_SHARE = 0.8
+READ_SHARE = 0.9
+GUIDE_FAVORITES_SHARE = 0.7
+
+START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+END = START + timedelta(days=365)
+
+# Таблицы, которые заполняет генератор (после загрузки для них собирается статистика)
+SEEDED_MODELS = (
+    User, Profile, Guide, Announcement, Review, ReviewReply, AnnouncementComment, AnnouncementCommentReply,
+    GuideRating, GuideReviewRating, ReviewReplyRating, AnnouncementCommentRating, AnnouncementCommentReplyRating,
+    ProfileReview, ProfileReviewRating, FavoriteGuide, FavoriteAnnouncement, ChatMessage,
+)
+
+STARS = (1, 2, 3, 4, 5)
+STARS_WEIGHTS = (5, 5, 10, 30, 50)
+
+WORDS = (
+    'игра', 'персонаж', 'уровень', 'билд', 'предмет', 'навык', 'босс', 'рейд', 'карта', 'стратегия',
+    'урон', 'защита', 'скорость', 'ресурс', 'квест', 'команда', 'рейтинг', 'матч', 'тактика', 'оружие',
+    'код', 'функция', 'сервер', 'запрос', 'модуль', 'библиотека', 'алгоритм', 'данные', 'проект', 'тест',
+    'быстро', 'просто', 'сначала', 'потом', 'всегда', 'никогда', 'лучше', 'сильнее', 'важно', 'удобно',
+    'нужно', 'можно', 'собрать', 'прокачать', 'пройти', 'настроить', 'изучить', 'выбрать', 'проверить',
+    'новый', 'старый', 'редкий', 'полезный', 'сложный', 'простой', 'основной', 'последний', 'первый',
+    'и', 'в', 'на', 'для', 'с', 'без', 'после', 'перед', 'через', 'если', 'когда', 'чтобы',
+)
+
+TAGS = (
+    'python', 'гайд', 'новичкам', 'dota 2', 'cs2', 'minecraft', 'javascript', 'django', 'стратегия', 'билд',
+    'speedrun', 'pvp', 'pve', 'рейды', 'экономика', 'моды', 'linux', 'git', 'sql', 'алгоритмы',
+    'valorant', 'league of legends', 'elden ring', 'террария', 'factorio', 'шахматы', 'дизайн', 'frontend',
+    'backend', 'docker', 'тестирование', 'оптимизация', 'карьера', 'собеседование', 'rust', 'go', 'c++',
+    'unity', 'unreal engine', 'геймдизайн', 'музыка', 'стримы', 'киберспорт', 'тренировки', 'лайфхаки',
+)
+
+CODE_SNIPPETS = (
+    ('python', 'def solve(items):\n    return sorted(items, key=len)[:10]'),
+    ('javascript', 'const total = items.reduce((sum, item) => sum + item.price, 0);'),
+    ('sql', 'SELECT author_id, count(*) FROM guides GROUP BY author_id ORDER BY 2 DESC;'),
+    ('bash', 'git checkout -b feature && git push -u origin feature'),
+)
+
+
+class Seeder:
+    """Генерирует и вставляет данные; индексы в списках pk стабильны при одном seed"""
+
+    def __init__(self, seed=0, prefix=DEFAULT_PREFIX, batch_size=DEFAULT_BATCH_SIZE, log=None):
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.log = log
+        self.created = {}
+
+    # --- случайные величины ---
+
+    def skewed(self, n):
+        """Индекс от 0 до n - 1, малые индексы («популярные») выпадают гораздо чаще"""
+        return min(int(n * self.rng.random() ** SKEW), n - 1)
+
+    def uniform(self, n):
+        return self.rng.randrange(n)
+
+    def moment(self, after=START):
+        """Случайный момент между ``after`` и концом интервала генерации"""
+        seconds = max(int((END - after).total_seconds()), 1)
+        return after + timedelta(seconds=self.rng.randrange(seconds))
+
+    def sentence(self, low=5, high=14):
+        words = [self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high))]
+        return ' '.join(words).capitalize() + '.'
+
+    def paragraph(self, low=2, high=6):
+        return ' '.join(self.sentence() for _ in range(self.rng.randint(low, high)))
+
+    def title(self):
+        return self.sentence(3, 8)[:-1]
+
+    def tags(self):
+        tags = []
+        for _ in range(1 + self.skewed(5)):
+            tag = TAGS[self.skewed(len(TAGS))]
+            if tag not in tags:
+                tags.append(tag)
+        return tags
+
+    def markdown(self):
+        """Текст руководства: заголовки, абзацы, списки, код, ссылки и видео"""
+        parts = [f'# {self.title()}', self.paragraph()]
+        for _ in range(1 + self.skewed(10)):
+            parts.append(f'## {self.title()}')
+            parts.append(self.paragraph())
+            kind = self.rng.random()
+            if kind < 0.3:
+                parts.append('\n'.join(f'- {self.sentence(2, 6)}' for _ in range(self.rng.randint(2, 6))))
+            elif kind < 0.5:
+                language, code = self.rng.choice(CODE_SNIPPETS)
+                parts.append(f'```{language}\n{code}\n```')
+            elif kind < 0.6:
+                parts.append(f'Подробнее: [{self.title()}](https://example.com/{self.uniform(10 ** 6)})')
+            elif kind < 0.65:
+                video = ''.join(self.rng.choice('abcdefghijkABCDEFGHIJK0123456789_-') for _ in range(11))
+                parts.append(f'https://www.youtube.com/watch?v={video}')
+        return '\n\n'.join(parts)
+
+    def unique_pairs(self, count, left, right, pick_left, pick_right, exclude_equal=False):
+        """До ``count`` различных пар индексов (пары с повтором отбрасываются)"""
+        seen = set()
+        attempts = 0
+        while len(seen) < count and attempts < count * 3:
+            attempts += 1
+            i, j = pick_left(left), pick_right(right)
+            if exclude_equal and i == j:
+                continue
+            key = i * right + j
+            if key not in seen:
+                seen.add(key)
+                yield i, j
+
+    # --- вставка ---
+
+    def insert(self, name, model, rows):
+        """Вставляет объекты пачками; возвращает список pk в порядке генерации"""
+        pks = []
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                pks.extend(obj.pk for obj in model.objects.bulk_create(batch))
+                batch = []
+        if batch:
+            pks.extend(obj.pk for obj in model.objects.bulk_create(batch))
+        self.created[name] = self.created.get(name, 0) + len(pks)
+        if self.log:
+            self.log(f"{name}: {len(pks)}")
+        return pks
+
+    def run(self, users, volumes, render=True):
+        with transaction.atomic():
+            self.load(users, volumes)
+            self.rebuild(render)
+        return self.created
+
+    def load(self, users, volumes):
+        rng = self.rng
+        password = make_password(SEED_PASSWORD)
+
+        joined = [self.moment(START) for _ in range(users)]
+        user_ids = self.insert('users', User, (
+            User(
+                username=f'{self.prefix}_{i}',
+                email=f'{self.prefix}_{i}@example.com',
+                password=password,
+                date_joined=joined[i],
+                is_active=rng.random() >= INACTIVE_SHARE,
+            )
+            for i in range(users)
+        ))
+        profile_ids = self.insert('profiles', Profile, (
+            Profile(user_id=user_id, bio=self.sentence() if rng.random() < 0.5 else '')
+            for user_id in user_ids
+        ))
+        if not users:
+            return
+
+        guide_authors = [self.skewed(users) for _ in range(volumes['guides'])]
+        guide_dates = [self.moment(joined[author]) for author in guide_authors]
+        guide_ids = self.insert('guides', Guide, (
+            Guide(
+                author_id=user_ids[author],
+                title=self.title(),
+                content=self.markdown(),
+                tags=tags,
+                tags_normalized=normalize_tags(tags),
+                created_at=guide_dates[i],
+            )
+            for i, author in enumerate(guide_authors)
+            for tags in [self.tags()]
+        ))
+
+        announcement_authors = [self.skewed(users) for _ in range(volumes['announcements'])]
+        announcement_ids = self.insert('announcements', Announcement, (
+            Announcement(
+                author_id=user_ids[author],
+                title=self.title(),
+                description=self.paragraph(1, 4),
+                tags=tags,
+                tags_normalized=normalize_tags(tags),
+            )
+            for author in announcement_authors
+            for tags in [self.tags()]
+        ))
+
+        review_ids, review_dates = [], []
+        if guide_ids:
+            review_guides = [self.skewed(len(guide_ids)) for _ in range(volumes['reviews'])]
+            review_dates = [self.moment(guide_dates[guide]) for guide in review_guides]
+            review_ids = self.insert('reviews', Review, (
+                Review(
+                    guide_id=guide_ids[guide],
+                    author_id=user_ids[self.uniform(users)],
+                    text=self.paragraph(1, 3),
+                    stars=rng.choices(STARS, STARS_WEIGHTS)[0],
+                    created_at=review_dates[i],
+                )
+                for i, guide in enumerate(review_guides)
+            ))
+
+        reply_ids = []
+        if review_ids:
+            reply_ids = self.insert('review_replies', ReviewReply, (
+                ReviewReply(
+                    review_id=review_ids[review],
+                    author_id=user_ids[self.skewed(users)],
+                    text=self.sentence(),
+                    created_at=self.moment(review_dates[review]),
+                )
+                for review in (self.skewed(len(review_ids)) for _ in range(volumes['review_replies']))
+            ))
+
+        comment_ids = []
+        if announcement_ids:
+            comment_ids = self.insert('comments', AnnouncementComment, (
+                AnnouncementComment(
+                    announcement_id=announcement_ids[self.skewed(len(announcement_ids))],
+                    author_id=user_ids[self.uniform(users)],
+                    content=self.paragraph(1, 2),
+                )
+                for _ in range(volumes['comments'])
+            ))
+
+        comment_reply_ids = []
+        if comment_ids:
+            comment_reply_ids = self.insert('comment_replies', AnnouncementCommentReply, (
+                AnnouncementCommentReply(
+                    comment_id=comment_ids[self.skewed(len(comment_ids))],
+                    author_id=user_ids[self.skewed(users)],
+                    content=self.sentence(),
+                )
+                for _ in range(volumes['comment_replies'])
+            ))
+
+        if guide_ids:
+            self.insert('ratings', GuideRating, (
+                GuideRating(
+                    guide_id=guide_ids[guide],
+                    reviewer_id=user_ids[reviewer],
+                    rating=rng.choices(STARS, STARS_WEIGHTS)[0],
+                )
+                for guide, reviewer in self.unique_pairs(
+                    volumes['ratings'], len(guide_ids), users, self.skewed, self.uniform
+                )
+            ))
+
+        # Голоса делятся между видами оценок пропорционально числу объектов
+        vote_targets = [
+            (GuideReviewRating, 'review_id', review_ids),
+            (ReviewReplyRating, 'reply_id', reply_ids),
+            (AnnouncementCommentRating, 'comment_id', comment_ids),
+            (AnnouncementCommentReplyRating, 'reply_id', comment_reply_ids),
+        ]
+
+        if users > 1:
+            profile_review_ids = self.insert('profile_reviews', ProfileReview, (
+                ProfileReview(
+                    profile_id=profile_ids[profile],
+                    reviewer_id=user_ids[reviewer],
+                    comment=self.paragraph(1, 2),
+                )
+                for profile, reviewer in self.unique_pairs(
+                    volumes['profile_reviews'], users, users, self.skewed, self.uniform, exclude_equal=True
+                )
+            ))
+            vote_targets.append((ProfileReviewRating, 'review_id', profile_review_ids))
+
+        total_targets = sum(len(targets) for _, _, targets in vote_targets)
+        for rating_model, field, targets in vote_targets:
+            if not targets:
+                continue
+            count = volumes['votes'] * len(targets) // total_targets
+            self.insert('votes', rating_model, (
+                rating_model(**{field: targets[target]}, user_id=user_ids[voter], is_like=rng.random() < LIKE_SHARE)
+                for target, voter in self.unique_pairs(count, len(targets), users, self.skewed, self.uniform)
+            ))
+
+        guide_favorites = int(volumes['favorites'] * GUIDE_FAVORITES_SHARE) if announcement_ids else volumes['favorites']
+        if guide_ids:
+            self.insert('favorites', FavoriteGuide, (
+                FavoriteGuide(user_id=user_ids[user], guide_id=guide_ids[guide])
+                for user, guide in self.unique_pairs(guide_favorites, users, len(guide_ids), self.uniform, self.skewed)
+            ))
+        if announcement_ids:
+            self.insert('favorites', FavoriteAnnouncement, (
+                FavoriteAnnouncement(user_id=user_ids[user], announcement_id=announcement_ids[announcement])
+                for user, announcement in self.unique_pairs(
+                    volumes['favorites'] - guide_favorites, users, len(announcement_ids), self.uniform, self.skewed
+                )
+            ))
+
+        if users > 1:
+            self.insert('messages', ChatMessage, (
+                ChatMessage(
+                    sender_id=user_ids[sender],
+                    receiver_id=user_ids[receiver],
+                    message=self.sentence(1, 20),
+                    is_read=rng.random() < READ_SHARE,
+                )
+                for sender, receiver in (
+                    (self.skewed(users), self.skewed(users)) for _ in range(volumes['messages'])
+                )
+                if sender != receiver
+            ))
+
+    def analyze(self):
+        """
+        Статистика планировщика для только что загруженных таблиц: без неё
+        коррелированные подзапросы пересчёта идут последовательным сканированием
+        """
+        with connection.cursor() as cursor:
+            for model in SEEDED_MODELS:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def rebuild(self, render=True):
+        """Пересчёт всего, что при обычной записи поддерживают сигналы"""
+        self.analyze()
+        rebuild_vote_counters()
+        rebuild_ratings()
+        rebuild_tag_usage()
+        rebuild_search_vectors()
+        rebuild_conversations()
+        if render:
+            rerender_guides()
+        counters.reconcile()
+        homepage.invalidate_popular()
+        homepage.invalidate_statistics()
+
+
+def default_volumes(users):
+    return {name: int(users * ratio) for name, ratio in RATIOS.items()}
+
+
+def seed(users=DEFAULT_USERS, seed=0, prefix=DEFAULT_PREFIX, batch_size=DEFAULT_BATCH_SIZE, render=True,
+         log=None, **volumes):
+    """
+    Загружает синтетические данные; ``volumes`` переопределяет объёмы из RATIOS.
+    Возвращает число вставленных строк по видам.
+    """
+    planned = default_volumes(users)
+    planned.update({name: value for name, value in volumes.items() if value is not None})
+    return Seeder(seed=seed, prefix=prefix, batch_size=batch_size, log=log).run(users, planned, render=render)
@@ -1,6 +1,14 @@
+import re
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+from django.urls import reverse
+from rest_framework.utils.urls import replace_query_param
+
 from .models import Profile, Review, Guide, Announcement, ChatMessage, ProfileReview
+from .pagination import KeysetPagination
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -34,27 +42,38 @@ class ReviewSerializer(serializers.ModelSerializer):
         return None
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    username = serializers.CharField(source="user.username", read_only=True)
-    rating = serializers.FloatField(read_only=True)
-    reviews = ReviewSerializer(many=True, read_only=True)
-    guides = serializers.SerializerMethodField()
-    announcements = serializers.SerializerMethodField()
+EXCERPT_LENGTH = 200
 
-    class Meta:
-        model = Profile
-        fields = ["username", "avatar", "bio", "rating", "reviews", "guides", "announcements"]
+_WHITESPACE_RE = re.compile(r'\s+')
 
-    def get_guides(self, obj):
-        guides = Guide.objects.filter(author=obj.user).order_by('-created_at')
-        return GuideSerializer(guides, many=True).data
 
-    def get_announcements(self, obj):
-        announcements = Announcement.objects.filter(author=obj.user).order_by('-created_at')
-        return AnnouncementSerializer(announcements, many=True).data
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """Начало текста в одну строку; многоточие, если текст длиннее ``length``"""
+    text = _WHITESPACE_RE.sub(' ', text or '').strip()
+    return text if len(text) <= length else text[:length].rstrip() + '…'
+
+
+def requested_fields(request):
+    """Поля из ?fields=id,title (None, если параметр не передан)"""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    raw = request.query_params.get('fields', '') if hasattr(request, 'query_params') else request.GET.get('fields', '')
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    return fields or None
+
 
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля из ?fields= (при чтении; неизвестные имена игнорируются)"""
 
-class GuideSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = set(requested_fields(self.context.get('request')) or ())
+        if fields & set(self.fields):
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class GuideSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source='author.username', read_only=True)
 
     class Meta:
@@ -62,7 +81,7 @@ class GuideSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'content', 'image', 'tags', 'rating', 'author_name', 'created_at']
 
 
-class AnnouncementSerializer(serializers.ModelSerializer):
+class AnnouncementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.CharField(source='author.username', read_only=True)
 
     class Meta:
@@ -70,6 +89,83 @@ class AnnouncementSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'description', 'image', 'author', 'tags', 'created_at', 'updated_at']
 
 
+class ListSerializerQuerysetMixin:
+    """
+    Списочный сериализатор сам готовит queryset: автор через JOIN, из таблицы
+    только нужные колонки, а вместо полного текста — его начало, обрезанное в SQL.
+    """
+    excerpt_source = None
+    # Поле ответа -> колонки, которые для него нужны
+    columns = {}
+    # Колонки, которые нужны всегда (id, ключи сортировки для курсора и updated_at для ETag)
+    required_columns = ('id',)
+
+    @classmethod
+    def setup_queryset(cls, queryset, request=None):
+        # Неизвестные имена игнорируются, как в SparseFieldsMixin: без известных — все поля
+        fields = [name for name in requested_fields(request) or () if name in cls.columns or name == 'excerpt']
+        fields = fields or list(cls.columns) + ['excerpt']
+        columns = set(cls.required_columns)
+        for name in fields:
+            columns.update(cls.columns.get(name, ()))
+        if any(column.startswith('author__') for column in columns):
+            queryset = queryset.select_related('author')
+        queryset = queryset.only(*columns)
+        if 'excerpt' in fields:
+            queryset = queryset.annotate(excerpt_raw=Substr(cls.excerpt_source, 1, EXCERPT_LENGTH * 2))
+        return queryset
+
+    def get_excerpt(self, obj):
+        raw = getattr(obj, 'excerpt_raw', None)
+        if raw is None:
+            raw = getattr(obj, self.excerpt_source)
+        return make_excerpt(raw)
+
+
+class GuideListSerializer(ListSerializerQuerysetMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Карточка руководства для списков и поиска: без полного content"""
+    author_name = serializers.CharField(source='author.username', read_only=True)
+    excerpt = serializers.SerializerMethodField()
+
+    excerpt_source = 'content'
+    columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'image': ('image',),
+        'tags': ('tags',),
+        'rating': ('rating',),
+        'author_name': ('author__username',),
+        'created_at': ('created_at',),
+    }
+    required_columns = ('id', 'rating', 'created_at', 'updated_at')
+
+    class Meta:
+        model = Guide
+        fields = ['id', 'title', 'excerpt', 'image', 'tags', 'rating', 'author_name', 'created_at']
+
+
+class AnnouncementListSerializer(ListSerializerQuerysetMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """Карточка объявления для списков и поиска: без полного description"""
+    author = serializers.CharField(source='author.username', read_only=True)
+    excerpt = serializers.SerializerMethodField()
+
+    excerpt_source = 'description'
+    columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'image': ('image',),
+        'author': ('author__username',),
+        'tags': ('tags',),
+        'created_at': ('created_at',),
+        'updated_at': ('updated_at',),
+    }
+    required_columns = ('id', 'created_at', 'updated_at')
+
+    class Meta:
+        model = Announcement
+        fields = ['id', 'title', 'excerpt', 'image', 'author', 'tags', 'created_at', 'updated_at']
+
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(source="sender.username", read_only=True)
     receiver_username = serializers.CharField(source="receiver.username", read_only=True)
@@ -143,3 +239,83 @@ class ProfileCommentSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.reviewer.profile.avatar.url)
             return obj.reviewer.profile.avatar.url
         return None
+
+
+# Сколько элементов каждой секции отдаётся вместе с профилем
+PROFILE_SECTION_LIMIT = 10
+PROFILE_SECTION_ORDERING = ('-created_at', '-id')
+
+
+def _count_subquery(queryset, field, outer):
+    counted = queryset.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(total=Count('id'))
+    return Coalesce(Subquery(counted.values('total')[:1]), Value(0), output_field=IntegerField())
+
+
+def profile_section(section, profile, request=None):
+    """Queryset и сериализатор секции профиля: guides, announcements или reviews"""
+    if section == 'guides':
+        queryset = Guide.objects.filter(author_id=profile.user_id)
+        return GuideListSerializer.setup_queryset(queryset, request), GuideListSerializer
+    if section == 'announcements':
+        queryset = Announcement.objects.filter(author_id=profile.user_id)
+        return AnnouncementListSerializer.setup_queryset(queryset, request), AnnouncementListSerializer
+    if section == 'reviews':
+        queryset = ProfileReview.objects.filter(profile=profile).select_related('reviewer__profile', 'profile__user')
+        return queryset, ProfileCommentSerializer
+    raise ValueError(f"Неизвестная секция профиля: {section}")
+
+
+class UserProfileSerializer(serializers.ModelSerializer):
+    """
+    Профиль с первыми страницами секций. Каждая секция — {'count', 'results', 'next'},
+    где ``next`` ведёт на /api/profile/<username>/<секция>/?cursor=...
+    Число запросов не зависит от количества контента: профиль со счётчиками
+    (подзапросы COUNT) — один запрос, каждая секция — ещё один.
+    """
+    username = serializers.CharField(source="user.username", read_only=True)
+    rating = serializers.FloatField(read_only=True)
+    reviews = serializers.SerializerMethodField()
+    guides = serializers.SerializerMethodField()
+    announcements = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Profile
+        fields = ["username", "avatar", "bio", "rating", "reviews", "guides", "announcements"]
+
+    @staticmethod
+    def setup_queryset(queryset):
+        return queryset.select_related('user').annotate(
+            guides_count=_count_subquery(Guide.objects.all(), 'author', 'user'),
+            announcements_count=_count_subquery(Announcement.objects.all(), 'author', 'user'),
+            reviews_count=_count_subquery(ProfileReview.objects.all(), 'profile', 'pk'),
+        )
+
+    def _section(self, obj, section):
+        request = self.context.get('request')
+        queryset, serializer_class = profile_section(section, obj, request)
+        page, next_cursor = KeysetPagination().paginate(queryset, PROFILE_SECTION_ORDERING, PROFILE_SECTION_LIMIT)
+
+        next_url = None
+        if next_cursor is not None:
+            next_url = reverse(f'profile_{section}_api', kwargs={'username': obj.user.username})
+            if request is not None:
+                next_url = request.build_absolute_uri(next_url)
+            next_url = replace_query_param(next_url, KeysetPagination.cursor_query_param, next_cursor)
+
+        count = getattr(obj, f'{section}_count', None)
+        if count is None:
+            count = queryset.count()
+        return {
+            'count': count,
+            'results': serializer_class(page, many=True, context=self.context).data,
+            'next': next_url,
+        }
+
+    def get_reviews(self, obj):
+        return self._section(obj, 'reviews')
+
+    def get_guides(self, obj):
+        return self._section(obj, 'guides')
+
+    def get_announcements(self, obj):
+        return self._section(obj, 'announcements')
@@ -1,119 +1,284 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models import Avg
-from .models import Profile, GuideRating, Announcement, UserActivity, Guide
+from django.contrib.auth.models import User
+from . import activity, chat, counters, facets, homepage, ratings, realtime, rendering, search, utils, votes
+from .models import Profile, GuideRating, Announcement, Guide, Review, BlacklistWord, ChatMessage, \
+    ProfileReview
+from .tags import normalize_tags
 
 
-@receiver([post_save, post_delete], sender=GuideRating)
-def update_profile_rating(sender, instance, **kwargs):
-    guide = instance.guide
-    author = guide.author
+# --- Рейтинги руководств и профилей ---
 
-    try:
-        profile = author.profile
-    except Profile.DoesNotExist:
-        return
+@receiver(pre_save, sender=GuideRating)
+def remember_guide_rating(sender, instance, **kwargs):
+    instance._previous_vote = None
+    if instance.pk:
+        rating = GuideRating.objects.filter(pk=instance.pk).values_list('rating', flat=True).first()
+        if rating is not None:
+            instance._previous_vote = (rating, 1)
+
+
+@receiver(post_save, sender=GuideRating)
+def apply_guide_rating(sender, instance, created, **kwargs):
+    old_sum, old_count = getattr(instance, '_previous_vote', None) or (0, 0)
+    ratings.apply_vote(instance.guide_id, int(instance.rating) - old_sum, 1 - old_count)
+
+
+@receiver(post_delete, sender=GuideRating)
+def revert_guide_rating(sender, instance, **kwargs):
+    ratings.apply_vote(instance.guide_id, -int(instance.rating), -1)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_stars(sender, instance, **kwargs):
+    instance._previous_vote = None
+    if instance.pk:
+        stars = Review.objects.filter(pk=instance.pk).values_list('stars', flat=True).first()
+        if stars is not None:
+            instance._previous_vote = ratings.review_vote(stars)
+
+
+@receiver(post_save, sender=Review)
+def apply_review_stars(sender, instance, created, **kwargs):
+    old_sum, old_count = getattr(instance, '_previous_vote', None) or (0, 0)
+    new_sum, new_count = ratings.review_vote(instance.stars)
+    ratings.apply_vote(instance.guide_id, new_sum - old_sum, new_count - old_count)
+
+
+@receiver(post_delete, sender=Review)
+def revert_review_stars(sender, instance, **kwargs):
+    vote_sum, vote_count = ratings.review_vote(instance.stars)
+    ratings.apply_vote(instance.guide_id, -vote_sum, -vote_count)
 
-    avg_rating = GuideRating.objects.filter(
-        guide__author=author
-    ).aggregate(Avg('rating'))['rating__avg']
+GUIDE_ACTIVITY_FIELDS = {'title', 'content', 'image', 'tags'}
+ANNOUNCEMENT_ACTIVITY_FIELDS = {'title', 'description', 'image', 'tags'}
 
-    profile.rating = round(avg_rating or 0.00, 2)
-    profile.save(update_fields=['rating'])
 
 @receiver(post_save, sender=Guide)
-def log_guide_creation_update(sender, instance, created, **kwargs):
+def log_guide_creation_update(sender, instance, created, update_fields=None, **kwargs):
     """
     Логирует создание или обновление руководства.
-    Создает запись активности только при реальном изменении полей объекта.
+    Обновление логируется, только если в update_fields есть содержательные поля:
+    без update_fields нельзя отличить правку от служебного сохранения.
     """
-    if created:
-        # При создании всегда логируем
-        action = 'CREATE'
-        UserActivity.objects.create(
-            user=instance.author,
-            action=action,
-            target_type='GUIDE',
-            target_title=instance.title,
-            guide=instance
-        )
-    else:
-        # При обновлении проверяем, были ли изменены важные поля
-        update_fields = kwargs.get('update_fields')
-        if update_fields:
-            # Проверяем, изменялись ли важные поля (не только служебные)
-            important_fields = {'title', 'content', 'image', 'tags'}
-            if any(field in update_fields for field in important_fields):
-                UserActivity.objects.create(
-                    user=instance.author,
-                    action='UPDATE',
-                    target_type='GUIDE',
-                    target_title=instance.title,
-                    guide=instance
-                )
-        else:
-            # Если update_fields не указан, проверяем через сравнение с БД
-            # Но это может быть неэффективно, поэтому создаем запись только если явно указаны поля
-            pass
+    if created or (update_fields and GUIDE_ACTIVITY_FIELDS.intersection(update_fields)):
+        activity.log_activity(instance.author_id, 'CREATE' if created else 'UPDATE', 'GUIDE', instance.title,
+                              guide_id=instance.pk)
 
 
 @receiver(post_delete, sender=Guide)
 def log_guide_deletion(sender, instance, **kwargs):
-    """
-    Логирует удаление руководства.
-    Сохраняет название, даже если объект уже удалён из БД.
-    """
-    UserActivity.objects.create(
-        user=instance.author,
-        action='DELETE',
-        target_type='GUIDE',
-        target_title=instance.title
-        # Поле 'guide' остаётся null, так как объект удалён
-    )
+    """Логирует удаление руководства; ссылка на руководство остаётся пустой"""
+    activity.log_activity(instance.author_id, 'DELETE', 'GUIDE', instance.title)
 
 
 @receiver(post_save, sender=Announcement)
-def log_announcement_creation_update(sender, instance, created, **kwargs):
-    """
-    Логирует создание или обновление объявления.
-    Создает запись активности только при реальном изменении полей объекта.
-    """
-    if created:
-        # При создании всегда логируем
-        action = 'CREATE'
-        UserActivity.objects.create(
-            user=instance.author,
-            action=action,
-            target_type='ANNOUNCEMENT',
-            target_title=instance.title,
-            announcement=instance
-        )
-    else:
-        # При обновлении проверяем, были ли изменены важные поля
-        update_fields = kwargs.get('update_fields')
-        if update_fields:
-            # Проверяем, изменялись ли важные поля (не только служебные)
-            important_fields = {'title', 'description', 'image', 'tags'}
-            if any(field in update_fields for field in important_fields):
-                UserActivity.objects.create(
-                    user=instance.author,
-                    action='UPDATE',
-                    target_type='ANNOUNCEMENT',
-                    target_title=instance.title,
-                    announcement=instance
-                )
-        # Если update_fields не указан, не создаем запись активности
-        # чтобы избежать ложных срабатываний при автоматических сохранениях
+def log_announcement_creation_update(sender, instance, created, update_fields=None, **kwargs):
+    """Логирует создание или обновление объявления (правила те же, что у руководств)"""
+    if created or (update_fields and ANNOUNCEMENT_ACTIVITY_FIELDS.intersection(update_fields)):
+        activity.log_activity(instance.author_id, 'CREATE' if created else 'UPDATE', 'ANNOUNCEMENT',
+                              instance.title, announcement_id=instance.pk)
 
 
 @receiver(post_delete, sender=Announcement)
 def log_announcement_deletion(sender, instance, **kwargs):
-    """
-    Логирует удаление объявления.
-    """
-    UserActivity.objects.create(
-        user=instance.author,
-        action='DELETE',
-        target_type='ANNOUNCEMENT',
-        target_title=instance.title
-    )
\ No newline at end of file
+    """Логирует удаление объявления"""
+    activity.log_activity(instance.author_id, 'DELETE', 'ANNOUNCEMENT', instance.title)
+
+
+# --- Поисковые векторы ---
+
+GUIDE_SEARCH_FIELDS = {'title', 'content', 'tags'}
+ANNOUNCEMENT_SEARCH_FIELDS = {'title', 'description', 'tags'}
+PROFILE_SEARCH_FIELDS = {'bio', 'user'}
+USER_SEARCH_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+def _touches(update_fields, fields):
+    """True, если сохранение затрагивает индексируемые поля (или поля не указаны)"""
+    return update_fields is None or bool(fields.intersection(update_fields))
+
+
+@receiver(post_save, sender=Guide)
+def update_guide_search_vector(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, GUIDE_SEARCH_FIELDS):
+        search.update_guide_vector(instance.pk)
+
+
+@receiver(post_save, sender=Guide)
+def update_guide_content_html(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, {'content'}):
+        rendering.refresh_guide_html(instance)
+
+
+@receiver(post_save, sender=Announcement)
+def update_announcement_search_vector(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, ANNOUNCEMENT_SEARCH_FIELDS):
+        search.update_announcement_vector(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def update_profile_search_vector(sender, instance, update_fields=None, **kwargs):
+    if _touches(update_fields, PROFILE_SEARCH_FIELDS):
+        search.update_profile_vector(instance)
+
+
+@receiver(post_save, sender=User)
+def update_user_profile_search_vector(sender, instance, update_fields=None, **kwargs):
+    if not _touches(update_fields, USER_SEARCH_FIELDS):
+        return
+    try:
+        profile = instance.profile
+    except Profile.DoesNotExist:
+        return
+    search.update_profile_vector(profile)
+
+
+# --- Счётчики тегов ---
+
+@receiver(post_save, sender=Guide)
+@receiver(post_save, sender=Announcement)
+def update_tag_usage(sender, instance, **kwargs):
+    delta = getattr(instance, '_tags_delta', None)
+    if delta:
+        facets.apply_tags_delta(facets.target_type_for(sender), *delta)
+        instance._tags_delta = None
+
+
+@receiver(post_delete, sender=Guide)
+@receiver(post_delete, sender=Announcement)
+def release_tag_usage(sender, instance, **kwargs):
+    tags = getattr(instance, '_saved_tags_normalized', None)
+    if tags is None:
+        tags = normalize_tags(instance.tags)
+    facets.decrement_tags(facets.target_type_for(sender), tags)
+
+
+# --- Счётчики лайков/дизлайков ---
+
+def _rating_target_id(instance):
+    return getattr(instance, f'{votes.RATING_TARGETS[type(instance)]}_id')
+
+
+def remember_vote(sender, instance, **kwargs):
+    instance._previous_is_like = None
+    if instance.pk:
+        instance._previous_is_like = sender.objects.filter(pk=instance.pk).values_list('is_like', flat=True).first()
+
+
+def count_vote(sender, instance, created, **kwargs):
+    target_id = _rating_target_id(instance)
+    previous = getattr(instance, '_previous_is_like', None)
+    is_like = bool(instance.is_like)
+    if created or previous is None:
+        votes.change_counters(sender, target_id, is_like, 1)
+    elif previous != is_like:
+        votes.change_counters(sender, target_id, previous, -1)
+        votes.change_counters(sender, target_id, is_like, 1)
+
+
+def uncount_vote(sender, instance, **kwargs):
+    votes.change_counters(sender, _rating_target_id(instance), bool(instance.is_like), -1)
+
+
+for _rating_model in votes.RATING_TARGETS:
+    pre_save.connect(remember_vote, sender=_rating_model, dispatch_uid=f'remember_vote_{_rating_model.__name__}')
+    post_save.connect(count_vote, sender=_rating_model, dispatch_uid=f'count_vote_{_rating_model.__name__}')
+    post_delete.connect(uncount_vote, sender=_rating_model, dispatch_uid=f'uncount_vote_{_rating_model.__name__}')
+
+
+# --- Сводки переписок ---
+
+@receiver(post_save, sender=ChatMessage)
+def update_conversation(sender, instance, created, **kwargs):
+    if created:
+        chat.record_message(instance)
+        transaction.on_commit(lambda: realtime.publish_message(instance))
+
+
+# --- Блэк-лист ---
+
+@receiver(post_save, sender=BlacklistWord)
+@receiver(post_delete, sender=BlacklistWord)
+def invalidate_blacklist_matcher(sender, **kwargs):
+    # Остальные воркеры увидят новую версию при следующей сверке
+    utils.invalidate_blacklist()
+
+
+# --- Счётчики платформы ---
+
+COUNTER_FIELDS = {
+    Guide: 'guides',
+    Announcement: 'announcements',
+    Review: 'reviews',
+    ProfileReview: 'profile_reviews',
+}
+
+
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change(**{COUNTER_FIELDS[sender]: 1})
+
+
+def count_deleted(sender, instance, **kwargs):
+    counters.change(**{COUNTER_FIELDS[sender]: -1})
+
+
+for _counted_model in COUNTER_FIELDS:
+    post_save.connect(count_created, sender=_counted_model, dispatch_uid=f'count_created_{_counted_model.__name__}')
+    post_delete.connect(count_deleted, sender=_counted_model, dispatch_uid=f'count_deleted_{_counted_model.__name__}')
+
+
+@receiver(pre_save, sender=User)
+def remember_user_active(sender, instance, update_fields=None, **kwargs):
+    instance._was_active = None
+    if instance.pk and _touches(update_fields, {'is_active'}):
+        instance._was_active = User.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def count_active_user(sender, instance, created, **kwargs):
+    # Активация после подтверждения почты (VerifyEmailView) — обычный save() с is_active=True
+    was_active = False if created else getattr(instance, '_was_active', None)
+    if was_active is not None and was_active != instance.is_active:
+        counters.change(active_users=1 if instance.is_active else -1)
+
+
+@receiver(post_delete, sender=User)
+def uncount_active_user(sender, instance, **kwargs):
+    if instance.is_active:
+        counters.change(active_users=-1)
+
+
+# --- Кэш главной страницы ---
+
+@receiver(post_save, sender=Guide)
+@receiver(post_delete, sender=Guide)
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@receiver(post_save, sender=GuideRating)
+@receiver(post_delete, sender=GuideRating)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_homepage_popular(sender, **kwargs):
+    # Оценки и отзывы меняют рейтинг руководства, а значит и карусель
+    transaction.on_commit(homepage.invalidate_popular)
+
+
+@receiver(post_save, sender=Guide)
+@receiver(post_delete, sender=Guide)
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProfileReview)
+@receiver(post_delete, sender=ProfileReview)
+def invalidate_homepage_statistics(sender, created=True, update_fields=None, **kwargs):
+    # Правка существующей записи счётчики не меняет; у пользователя важен только is_active
+    # (вход обновляет last_login через update_fields и кэш не трогает)
+    if not created and (sender is not User or not _touches(update_fields, {'is_active'})):
+        return
+    transaction.on_commit(homepage.invalidate_statistics)
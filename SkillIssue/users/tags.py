@@ -0,0 +1,56 @@
+"""
+Работа с тегами руководств и объявлений.
+
+Исходные теги хранятся как ввёл автор (JSON-список в поле ``tags``),
+а для фильтрации используется теневая колонка ``tags_normalized`` —
+массив тегов в нижнем регистре с GIN-индексом. Поиск «любой из тегов»
+и «все теги» выполняется операторами массивов ``&&`` и ``@>``.
+"""
+
+
+def split_tags(raw):
+    """Разбирает строку «тег1, тег2» в список непустых тегов"""
+    return [tag.strip() for tag in (raw or '').split(',') if tag.strip()]
+
+
+def normalize_tags(tags):
+    """
+    Нормализованный список тегов: нижний регистр, без пробелов по краям,
+    без пустых значений и повторов, порядок сохраняется.
+    Принимает список или строку через запятую (старые записи объявлений).
+    """
+    if isinstance(tags, str):
+        tags = split_tags(tags)
+    elif not isinstance(tags, (list, tuple)):
+        return []
+
+    normalized = []
+    for tag in tags:
+        if tag is None:
+            continue
+        value = str(tag).strip().lower()
+        if value and value not in normalized:
+            normalized.append(value)
+    return normalized
+
+
+def filter_by_tags(queryset, tags, match_all=False):
+    """
+    Фильтрует руководства или объявления по тегам на стороне БД.
+    По умолчанию достаточно совпадения любого тега, ``match_all`` требует все.
+    """
+    tags = normalize_tags(tags)
+    if not tags:
+        return queryset
+    if match_all:
+        return queryset.filter(tags_normalized__contains=tags)
+    return queryset.filter(tags_normalized__overlap=tags)
+
+
+def filter_by_tags_query(queryset, request):
+    """Применяет GET-параметры ``tags`` (через запятую) и ``tags_mode`` (any/all)"""
+    tags_query = request.GET.get('tags', '').strip()
+    if not tags_query:
+        return queryset
+    match_all = request.GET.get('tags_mode', 'any').strip().lower() == 'all'
+    return filter_by_tags(queryset, tags_query, match_all=match_all)
@@ -1,17 +1,34 @@
 import json
-from unittest.mock import patch
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest.mock import DEFAULT, patch
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth.models import User
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.urls import reverse
+from . import activity, benchmarks, counters, homepage, instrumentation, metrics, outbox, profiling, realtime, \
+    rendering, seeding, utils, votes
+from . import verification as verification_codes
+from .ratings import verify_ratings
 from .models import (
-    Profile, EmailVerificationCode, UserActivity, Guide, Announcement, Review, AnnouncementComment
+    Profile, EmailVerificationCode, UserActivity, Guide, Announcement, Review, AnnouncementComment, TagUsage,
+    GuideRating, GuideReviewRating, BlacklistWord, ChatMessage, Conversation, ProfileReview,
+    PlatformCounter, OutgoingEmail
 )
 
 
-@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', ACTIVITY_LOG_MODE='sync')
 class BaseAPITest(APITestCase):
     """Базовый класс с настройками аутентификации и общими данными"""
 
@@ -116,6 +133,46 @@ class ProfileAPITests(BaseAPITest):
         res = self.client.get(f'/api/users/{self.user.username}/activities/')
         self.assertEqual(res.status_code, 200)
 
+    def _fill_profile(self, count, prefix='reviewer'):
+        Guide.objects.bulk_create([Guide(author=self.user, title=f'G {i}') for i in range(count)])
+        Announcement.objects.bulk_create([Announcement(author=self.user, title=f'A {i}') for i in range(count)])
+        reviewers = User.objects.bulk_create([User(username=f'{prefix}{i}') for i in range(count)])
+        ProfileReview.objects.bulk_create([
+            ProfileReview(reviewer=reviewer, profile=self.profile, comment='ok') for reviewer in reviewers
+        ])
+
+    def test_profile_detail_query_count_is_constant(self):
+        client = APIClient()
+        url = f'/api/profile/{self.user.username}/'
+        self._fill_profile(3)
+        # профиль со счётчиками + по запросу на секцию
+        with self.assertNumQueries(4):
+            client.get(url)
+
+        self._fill_profile(20, prefix='more')
+        with self.assertNumQueries(4):
+            res = client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['guides']['count'], 24)
+        self.assertEqual(res.data['announcements']['count'], 24)
+        self.assertEqual(res.data['reviews']['count'], 23)
+        self.assertEqual(len(res.data['reviews']['results']), 10)
+        self.assertEqual(res.data['reviews']['results'][0]['author'], 'more19')
+
+    def test_profile_section_load_more(self):
+        self._fill_profile(12)
+        res = APIClient().get(f'/api/profile/{self.user.username}/')
+        next_url = res.data['guides']['next']
+        self.assertIn('/api/profile/testuser/guides/?cursor=', next_url)
+
+        shown = [item['id'] for item in res.data['guides']['results']]
+        res = APIClient().get(next_url)
+        self.assertEqual(res.status_code, 200)
+        rest = [item['id'] for item in res.data['results']]
+        self.assertEqual(len(shown) + len(rest), 13)
+        self.assertFalse(set(shown) & set(rest))
+        self.assertIsNone(res.data['next'])
+
 
 # ================= GUIDES =================
 class GuideAPITests(BaseAPITest):
@@ -125,6 +182,89 @@ class GuideAPITests(BaseAPITest):
         res = self.client.get('/api/guides/')
         self.assertEqual(res.status_code, 200)
 
+    def test_guide_list_keyset_pages(self):
+        """Курсорная пагинация: страницы без повторов в порядке рейтинг, дата, id"""
+        for i in range(4):
+            Guide.objects.create(author=self.user, title=f'Same {i}', rating=3)
+        Guide.objects.create(author=self.user, title='Top', rating=5)
+        expected = list(Guide.objects.order_by('-rating', '-created_at', '-id').values_list('id', flat=True))
+
+        seen, url = [], '/api/guides/?page_size=2'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            self.assertLessEqual(len(res.data['results']), 2)
+            seen += [g['id'] for g in res.data['results']]
+            url = res.data['next']
+        self.assertEqual(seen, expected)
+
+        res = self.client.get('/api/guides/?cursor=broken')
+        self.assertEqual(res.status_code, 404)
+
+    def test_guide_list_cursor_keeps_microseconds(self):
+        """Строки с разницей created_at меньше миллисекунды не теряются между страницами"""
+        moment = timezone.now().replace(microsecond=500000)
+        for i in range(3):
+            guide = Guide.objects.create(author=self.user, title=f'Close {i}', rating=4)
+            Guide.objects.filter(pk=guide.pk).update(created_at=moment.replace(microsecond=500000 + i * 100))
+        expected = list(Guide.objects.order_by('-rating', '-created_at', '-id').values_list('id', flat=True))
+
+        seen, url = [], '/api/guides/?page_size=1'
+        while url:
+            res = self.client.get(url)
+            seen += [g['id'] for g in res.data['results']]
+            url = res.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_filter_guides_paginated_with_estimate(self):
+        for i in range(3):
+            Guide.objects.create(author=self.user, title=f'Guide {i}')
+        res = self.client.get('/api/guides/filter/?page_size=2&with_count=1')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsInstance(res.data['estimated_count'], int)
+        self.assertNotIn('count', res.data)
+
+        res = self.client.get('/api/guides/filter/?cursor=broken')
+        self.assertEqual(res.status_code, 404)
+
+    def test_guide_list_lightweight_and_sparse(self):
+        other = User.objects.get(username='otheruser')
+        for i in range(3):
+            Guide.objects.create(author=other, title=f'Long {i}', content='word ' * 200)
+
+        # Пользователь из JWT + одна выборка страницы вместе с авторами
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/guides/?page_size=10')
+        card = next(g for g in res.data['results'] if g['title'] == 'Long 0')
+        self.assertNotIn('content', card)
+        self.assertEqual(card['author_name'], 'otheruser')
+        self.assertTrue(card['excerpt'].endswith('…'))
+        self.assertLessEqual(len(card['excerpt']), 201)
+
+        res = self.client.get('/api/guides/filter/?fields=id,title')
+        self.assertEqual(set(res.data['results'][0]), {'id', 'title'})
+
+        res = self.client.get(f'/api/guides/{self.guide.id}/?fields=title,content')
+        self.assertEqual(res.data, {'title': 'Test Guide', 'content': 'Content'})
+
+    def test_list_fields_without_author_and_unknown_fields(self):
+        Announcement.objects.create(author=self.user, title='Sparse', description='Text')
+        for url in ('/api/guides/?fields=title', '/api/guides/?fields=id', '/api/announcements/?fields=title'):
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200, url)
+            self.assertEqual({key for row in res.data['results'] for key in row}, {url.rsplit('=', 1)[1]})
+
+        Guide.objects.create(author=self.user, title='Second', content='More')
+        # Неизвестные имена не откладывают колонки: пользователь из JWT + одна выборка, без догрузки по строкам
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/guides/?fields=bogus')
+        self.assertIn('author_name', res.data['results'][0])
+        with self.assertNumQueries(2):
+            res = self.client.get('/api/guides/filter/?fields=bogus,content')
+        self.assertIn('excerpt', res.data['results'][0])
+
     def test_guide_create_authenticated(self):
         """Тест создания руководства авторизованным пользователем"""
         payload = {'title': 'New Guide', 'content': 'Content here', 'tags': ['test']}
@@ -177,9 +317,9 @@ class GuideAPITests(BaseAPITest):
         """Тест экшна get_guides_from_dao"""
         res = self.client.get('/api/guides/dao-guides/')
         self.assertEqual(res.status_code, 200)
-        self.assertIsInstance(res.data, list)
-        if res.data:
-            self.assertIn('title', res.data[0])
+        self.assertIsInstance(res.data['results'], list)
+        if res.data['results']:
+            self.assertIn('title', res.data['results'][0])
 
     def test_guide_dto_action(self):
         """Тест экшна get_dto_guides"""
@@ -267,6 +407,23 @@ class GuideAPITests(BaseAPITest):
         self.assertEqual(res.status_code, 200)
         self.assertGreaterEqual(res.data['count'], 1)
 
+    def test_filter_guides_by_tags_all_mode(self):
+        """Тест фильтрации по всем тегам без учёта регистра"""
+        Guide.objects.create(author=self.user, title='Django Guide', tags=['Django', 'Python'])
+        Guide.objects.create(author=self.user, title='Flask Guide', tags=['flask', 'python'])
+
+        res = self.client.get('/api/guides/filter/?tags=python,DJANGO&tags_mode=all')
+        self.assertEqual(res.status_code, 200)
+        titles = [r['title'] for r in res.data['results']]
+        self.assertEqual(titles, ['Django Guide'])
+
+    def test_tags_normalized_on_partial_save(self):
+        """Теневая колонка тегов обновляется при save(update_fields=['tags'])"""
+        self.guide.tags = [' Rust ', 'rust', 'WASM']
+        self.guide.save(update_fields=['tags'])
+        self.guide.refresh_from_db()
+        self.assertEqual(self.guide.tags_normalized, ['rust', 'wasm'])
+
 
 # ================= ANNOUNCEMENTS =================
 class AnnouncementAPITests(BaseAPITest):
@@ -367,4 +524,920 @@ class ReviewAPITests(BaseAPITest):
 
         # Reply
         res = self.client.post(f'/api/reviews/{review.id}/reply/', {'text': 'Thanks!'}, format='json')
-        self.assertEqual(res.status_code, 201)
\ No newline at end of file
+        self.assertEqual(res.status_code, 201)
+
+    def test_review_like_counters(self):
+        review = Review.objects.create(guide=self.guide, author=self.other_user, text='Nice', stars=5)
+        url = f'/api/reviews/{review.id}/rate/'
+
+        res = self.client.post(url, {'is_like': True}, format='json')
+        self.assertEqual((res.data['likes'], res.data['dislikes'], res.data['user_action']), (1, 0, True))
+
+        res = self.client.post(url, {'is_like': False}, format='json')
+        self.assertEqual((res.data['likes'], res.data['dislikes']), (0, 1))
+
+        res = self.client.post(url, {'is_like': False}, format='json')
+        self.assertEqual((res.data['likes'], res.data['dislikes'], res.data['user_action']), (0, 0, None))
+
+        review.refresh_from_db()
+        self.assertEqual((review.likes_count, review.dislikes_count), (0, 0))
+
+    def test_guide_detail_popular_sort(self):
+        third = User.objects.create_user(username='third', password='ThirdPass123!')
+        plain = Review.objects.create(guide=self.guide, author=third, text='Plain', stars=3)
+        liked = Review.objects.create(guide=self.guide, author=self.other_user, text='Liked', stars=5)
+        GuideReviewRating.objects.create(review=liked, user=self.user, is_like=True)
+        GuideReviewRating.objects.create(review=plain, user=self.other_user, is_like=False)
+
+        res = self.client.get(f'/guides/{self.guide.id}/?sort=Popular')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r.text for r in res.context['reviews']], ['Liked', 'Plain'])
+
+# ================= SEARCH =================
+class SearchAPITests(BaseAPITest):
+    def test_search_vector_updated_on_save(self):
+        guide = Guide.objects.create(author=self.user, title='Docker Basics', content='Containers')
+        guide.refresh_from_db()
+        self.assertIsNotNone(guide.search_vector)
+
+    def test_search_items_prefix_match(self):
+        Guide.objects.create(author=self.user, title='Kubernetes Guide', content='Pods and services')
+        res = self.client.get('/api/search/?q=kuber')
+        self.assertEqual(res.status_code, 200)
+        titles = [r['title'] for r in res.data]
+        self.assertIn('Kubernetes Guide', titles)
+
+    def test_search_items_title_ranked_above_content(self):
+        Guide.objects.create(author=self.user, title='Misc notes', content='Some words about rust')
+        Guide.objects.create(author=self.user, title='Rust ownership', content='Borrowing')
+        res = self.client.get('/api/search/?q=rust')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data[0]['title'], 'Rust ownership')
+
+    def test_search_items_profiles(self):
+        res = self.client.get('/api/search/?q=otheru')
+        self.assertEqual(res.status_code, 200)
+        urls = [r['url'] for r in res.data]
+        self.assertIn('/users/otheruser/', urls)
+
+    def test_guides_list_search(self):
+        res = self.client.get('/guides/?search=Test')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(self.guide, list(res.context['popular_guides']))
+
+    def test_autocomplete_typo_and_prefix(self):
+        Guide.objects.create(author=self.user, title='Kubernetes Guide', content='Pods')
+        res = self.client.get('/api/search/autocomplete/?q=kubernets')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Kubernetes Guide', [r['title'] for r in res.data])
+
+        res = self.client.get('/api/search/autocomplete/?q=k')
+        self.assertEqual(res.data, [])
+
+    def test_search_all_items_paginated(self):
+        res = self.client.get('/api/search/all/?limit=2')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(f"/api/search/all/?cursor={res.data['next']}&limit=100")
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNone(res.data['next'])
+
+        res = self.client.get('/api/search/all/?cursor=broken')
+        self.assertEqual(res.status_code, 400)
+
+    def test_search_all_items_cursor_merges_types(self):
+        """Новые первыми; при равном времени — профили, объявления, руководства; без пропусков и повторов"""
+        moment = timezone.now()
+        guides = [Guide.objects.create(author=self.user, title=f'Guide {i}') for i in range(10)]
+        Guide.objects.filter(pk__in=[g.pk for g in guides]).update(created_at=moment)
+        Profile.objects.filter(pk=self.profile.pk).update(created_at=moment)
+        Announcement.objects.filter(pk=self.announcement.pk).update(created_at=moment)
+
+        seen, url = [], '/api/search/all/?limit=3'
+        while url:
+            res = self.client.get(url)
+            seen += [item['url'] for item in res.data['results']]
+            url = f"/api/search/all/?limit=3&cursor={res.data['next']}" if res.data['next'] else None
+        expected = ['/users/testuser/', f'/announcements/{self.announcement.pk}/']
+        expected += [f'/guides/{pk}/' for pk in sorted((g.pk for g in guides), reverse=True)]
+        self.assertEqual(seen[:len(expected)], expected)
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), len(expected) + 2)
+
+
+class TagFacetsAPITests(BaseAPITest):
+    def _facets(self, target_type='guides'):
+        res = self.client.get(f'/api/tags/facets/?type={target_type}')
+        self.assertEqual(res.status_code, 200)
+        return {f['tag']: f['count'] for f in res.data}
+
+    def test_counters_follow_create_update_delete(self):
+        guide = Guide.objects.create(author=self.user, title='Django Guide', tags=['Django', 'python'])
+        Guide.objects.create(author=self.user, title='Flask Guide', tags=['flask', 'Python'])
+        self.assertEqual(self._facets()['python'], 2)
+        self.assertEqual(self._facets()['django'], 1)
+
+        guide.tags = ['python', 'orm']
+        guide.save(update_fields=['tags'])
+        facets = self._facets()
+        self.assertNotIn('django', facets)
+        self.assertEqual(facets['orm'], 1)
+        self.assertEqual(facets['python'], 2)
+
+        guide.delete()
+        self.assertEqual(self._facets()['python'], 1)
+
+    def test_filter_returns_facets(self):
+        Announcement.objects.create(author=self.user, title='Ann', description='D', tags=['Go'])
+        res = self.client.get('/api/announcements/filter/?tags=go&facets=1')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn({'tag': 'go', 'count': 1}, res.data['facets'])
+
+    def test_filter_facets_describe_matched_rows(self):
+        """Фасеты фильтра считаются по найденным объектам, а не по всей таблице"""
+        Guide.objects.create(author=self.user, title='Django ORM', tags=['python', 'django'])
+        Guide.objects.create(author=self.user, title='Flask intro', tags=['python', 'flask'])
+        Guide.objects.create(author=self.user, title='Rust intro', tags=['rust'])
+
+        res = self.client.get('/api/guides/filter/?tags=django&facets=1')
+        self.assertEqual(res.data['facets'], [{'tag': 'django', 'count': 1}, {'tag': 'python', 'count': 1}])
+
+        res = self.client.get('/api/guides/filter/?search=intro&facets=1')
+        self.assertEqual(
+            res.data['facets'],
+            [{'tag': 'flask', 'count': 1}, {'tag': 'python', 'count': 1}, {'tag': 'rust', 'count': 1}],
+        )
+
+    def test_rebuild_tag_usage_command(self):
+        Guide.objects.create(author=self.user, title='Rust Guide', tags=['rust'])
+        TagUsage.objects.all().delete()
+        call_command('rebuild_tag_usage', stdout=StringIO())
+        self.assertEqual(self._facets()['rust'], 1)
+
+
+class RatingAggregateTests(BaseAPITest):
+    def test_aggregates_follow_ratings_and_reviews(self):
+        rating = GuideRating.objects.create(guide=self.guide, reviewer=self.other_user, rating=5)
+        GuideRating.objects.create(guide=self.guide, reviewer=self.user, rating=2)
+        self.guide.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.guide.rating_sum, self.guide.rating_count, self.guide.rating), (7, 2, 4))
+        self.assertEqual(float(self.profile.rating), 3.5)
+
+        rating.rating = 3
+        rating.save()
+        review = Review.objects.create(guide=self.guide, author=self.other_user, text='Ok', stars=4)
+        self.guide.refresh_from_db()
+        self.assertEqual((self.guide.rating_sum, self.guide.rating_count), (9, 3))
+
+        review.delete()
+        rating.delete()
+        self.guide.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.guide.rating_sum, self.guide.rating_count, self.guide.rating), (2, 1, 2))
+        self.assertEqual(float(self.profile.rating), 2.0)
+
+    def test_rebuild_ratings_command(self):
+        GuideRating.objects.create(guide=self.guide, reviewer=self.other_user, rating=5)
+        call_command('rebuild_ratings', '--check', stdout=StringIO())
+
+        Guide.objects.filter(pk=self.guide.pk).update(rating_sum=0, rating_count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ratings', '--check', stdout=StringIO())
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.guide.refresh_from_db()
+        self.assertEqual((self.guide.rating_sum, self.guide.rating_count, self.guide.rating), (5, 1, 5))
+
+
+class HomepageCacheTests(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+    def test_statistics_cached_and_invalidated(self):
+        client = APIClient()
+        with self.assertNumQueries(1):
+            res = client.get('/api/statistics/')
+        self.assertEqual(res.data, {'guides': 1, 'announcements': 1, 'users': 2, 'ratings': 0})
+        with self.assertNumQueries(0):
+            client.get('/api/statistics/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Guide.objects.create(author=self.user, title='New')
+        # Устаревшее значение пересчитывается одним запросом
+        with self.assertNumQueries(1):
+            res = client.get('/api/statistics/')
+        self.assertEqual(res.data['guides'], 2)
+
+    def test_stale_entry_served_while_rebuilding(self):
+        client = APIClient()
+        client.get('/api/popular-items/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guide.title = 'Renamed'
+            self.guide.save()
+
+        # Пока другой процесс держит блокировку пересчёта, отдаётся старая карусель
+        cache.add(f'{homepage.POPULAR_KEY}:rebuild', 1)
+        with self.assertNumQueries(0):
+            res = client.get('/api/popular-items/')
+        self.assertEqual(res.data['guides'][0]['title'], 'Test Guide')
+
+        cache.delete(f'{homepage.POPULAR_KEY}:rebuild')
+        with self.assertNumQueries(2):
+            res = client.get('/api/popular-items/')
+        self.assertEqual(res.data['guides'][0]['title'], 'Renamed')
+        self.assertEqual(res.data['items'][0]['author'], 'testuser')
+
+
+class PlatformCounterTests(BaseAPITest):
+    def test_counters_follow_signals(self):
+        counter = PlatformCounter.objects.get()
+        self.assertEqual((counter.guides, counter.announcements, counter.active_users), (1, 1, 2))
+
+        inactive = User.objects.create_user(username='pending', email='pending@example.com', password='x')
+        inactive.is_active = False
+        inactive.save()
+        Review.objects.create(guide=self.guide, author=self.other_user, text='ok', stars=4)
+        self.guide.delete()
+        counter.refresh_from_db()
+        self.assertEqual((counter.guides, counter.active_users, counter.reviews), (0, 2, 0))
+
+        inactive.is_active = True
+        inactive.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.statistics()['users'], 3)
+
+    def test_reconcile_command_fixes_drift(self):
+        Guide.objects.update(title='bulk')
+        Guide.objects.bulk_create([Guide(author=self.user, title='bulk') for _ in range(3)])
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', '--check', stdout=StringIO())
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('guides: 1 → 4', out.getvalue())
+        self.assertEqual(PlatformCounter.objects.get().guides, 4)
+        call_command('reconcile_counters', '--check', stdout=StringIO())
+
+
+class ConditionalGetTests(BaseAPITest):
+    def test_guide_api_detail_not_modified(self):
+        url = f'/api/guides/{self.guide.id}/'
+        res = self.client.get(url)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+
+        with patch('users.views.GuideViewSet.get_serializer') as serializer:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        serializer.assert_not_called()
+
+        # Рейтинг меняется через UPDATE без updated_at, но ETag всё равно другой
+        GuideRating.objects.create(guide=self.guide, reviewer=self.other_user, rating=4)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_guide_page_revalidates_after_review_changes(self):
+        url = f'/guides/{self.guide.id}/'
+        etag = self.client.get(url)['ETag']
+        with patch('users.views.refresh_guide_html') as render_markdown:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        render_markdown.assert_not_called()
+
+        review = Review.objects.create(guide=self.guide, author=self.other_user, text='ok', stars=5)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+
+        review.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Вошедший пользователь видит другую страницу и получает свой ETag
+        logged_in = APIClient()
+        logged_in.force_login(self.user)
+        self.assertNotEqual(logged_in.get(url)['ETag'], self.client.get(url)['ETag'])
+
+    def test_guide_page_etag_follows_viewer_votes(self):
+        """Перенос лайка на другой отзыв не меняет суммы, но меняет страницу зрителя"""
+        first = Review.objects.create(guide=self.guide, author=self.other_user, text='one', stars=5)
+        second = Review.objects.create(guide=self.guide, author=self.other_user, text='two', stars=4)
+        viewer = APIClient()
+        viewer.force_login(self.user)
+        url = f'/guides/{self.guide.id}/'
+
+        votes.toggle_vote(GuideReviewRating, first, self.user, True)
+        etag = viewer.get(url)['ETag']
+        self.assertEqual(viewer.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        votes.toggle_vote(GuideReviewRating, first, self.user, True)
+        votes.toggle_vote(GuideReviewRating, second, self.user, True)
+        res = viewer.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+
+        # Лайк на дизлайк у того же отзыва
+        etag = res['ETag']
+        votes.toggle_vote(GuideReviewRating, second, self.user, False)
+        self.assertEqual(viewer.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_announcement_list_not_modified(self):
+        url = '/api/announcements/'
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.announcement.title = 'Changed'
+        self.announcement.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ActivityBufferTests(BaseAPITest):
+    def test_sync_mode_writes_in_request(self):
+        Guide.objects.create(author=self.user, title='Sync')
+        self.assertTrue(UserActivity.objects.filter(action='CREATE', target_title='Sync').exists())
+
+    @override_settings(ACTIVITY_LOG_MODE='buffered')
+    def test_buffered_events_flushed_after_commit(self):
+        buffer = activity.ActivityBuffer(max_size=3, flush_interval=60)
+        with patch('users.activity.get_buffer', return_value=buffer):
+            with self.captureOnCommitCallbacks(execute=True):
+                guide = Guide.objects.create(author=self.user, title='Queued')
+            self.assertEqual(len(buffer), 1)
+            self.assertFalse(UserActivity.objects.filter(target_title='Queued').exists())
+
+            # Руководство удалено до записи: ссылка обнуляется, а не ломает bulk_create
+            with self.captureOnCommitCallbacks(execute=True):
+                guide.delete()
+            # Проверка авторов и руководств + один INSERT на всю пачку
+            with self.assertNumQueries(3):
+                self.assertEqual(buffer.flush(), 2)
+
+            rows = UserActivity.objects.filter(target_title='Queued').order_by('id')
+            self.assertEqual([(row.action, row.guide_id) for row in rows], [('CREATE', None), ('DELETE', None)])
+
+            # Переполнение очереди сбрасывает её сразу в вызывающем потоке
+            with self.captureOnCommitCallbacks(execute=True):
+                for i in range(3):
+                    Announcement.objects.create(author=self.user, title=f'Bulk {i}')
+            self.assertEqual(len(buffer), 0)
+            self.assertEqual(UserActivity.objects.filter(target_title__startswith='Bulk').count(), 3)
+
+
+class EmailOutboxTests(BaseAPITest):
+    def test_views_enqueue_and_worker_sends(self):
+        res = self.client.post('/api/register/', {
+            'username': 'queued', 'email': 'queued@test.com', 'password': 'NewPass123!'
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.client.post('/api/auth/password-reset/request/', {'email': 'test@example.com'}, format='json')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_PENDING).count(), 2)
+
+        out = StringIO()
+        call_command('send_outbox', '--once', stdout=out)
+        self.assertIn('Отправлено: 2', out.getvalue())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['queued@test.com', 'test@example.com'])
+        code = EmailVerificationCode.objects.get(email='queued@test.com').code
+        self.assertTrue(any(code in message.body for message in mail.outbox))
+        self.assertFalse(OutgoingEmail.objects.exclude(status=OutgoingEmail.STATUS_SENT).exists())
+
+    def test_failed_delivery_backs_off_then_gives_up(self):
+        email = outbox.enqueue('x@example.com', 'Subject', 'Body')
+        with patch('users.outbox.EmailMessage.send', side_effect=ConnectionError('smtp down')):
+            self.assertEqual(outbox.deliver_batch(max_attempts=2), (0, 1, 0))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, 1)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            self.assertIn('smtp down', email.last_error)
+
+            # До истечения задержки письмо не берётся
+            self.assertEqual(outbox.deliver_batch(max_attempts=2), (0, 0, 0))
+            OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(outbox.deliver_batch(max_attempts=2), (0, 0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_FAILED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_survives_database_errors(self):
+        outbox.enqueue('a@example.com', 'Subject', 'Body')
+        command = 'users.management.commands.send_outbox'
+        # Первый проход падает на базе, второй отправляет письмо, на второй паузе воркер останавливают
+        with patch(f'{command}.deliver_pending', wraps=outbox.deliver_pending,
+                   side_effect=[OperationalError('gone'), DEFAULT]), \
+                patch(f'{command}.close_old_connections') as close_old, \
+                patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]), \
+                self.assertLogs(command, 'ERROR'):
+            out = StringIO()
+            call_command('send_outbox', stdout=out)
+        self.assertEqual(close_old.call_count, 1)
+        self.assertIn('Отправлено: 1', out.getvalue())
+
+    def test_sent_bodies_cleared_and_finished_purged(self):
+        sent = outbox.enqueue('a@example.com', 'Subject', 'Код: 123456')
+        self.assertEqual(outbox.deliver_batch(), (1, 0, 0))
+        sent.refresh_from_db()
+        self.assertEqual(sent.status, OutgoingEmail.STATUS_SENT)
+        self.assertEqual(sent.body, '')
+
+        failed = outbox.enqueue('b@example.com', 'Subject', 'Body')
+        OutgoingEmail.objects.filter(pk=failed.pk).update(status=OutgoingEmail.STATUS_FAILED)
+        pending = outbox.enqueue('c@example.com', 'Subject', 'Body')
+
+        # Свежие строки остаются до истечения срока хранения
+        self.assertEqual(outbox.purge_finished(), 0)
+        later = timezone.now() + timezone.timedelta(hours=25)
+        self.assertEqual(outbox.purge_finished(batch_size=1, now=later), 2)
+        self.assertEqual(list(OutgoingEmail.objects.values_list('pk', flat=True)), [pending.pk])
+
+
+class VerificationCodeTests(BaseAPITest):
+    def _code(self, code, minutes=15, is_used=False, user=None):
+        return EmailVerificationCode.objects.create(
+            user=user or self.user, email=(user or self.user).email, code=code, is_used=is_used,
+            expires_at=timezone.now() + timezone.timedelta(minutes=minutes),
+        )
+
+    def test_verify_email_single_lookup(self):
+        self.user.is_active = False
+        self.user.save()
+        self._code('111111')
+        with self.assertNumQueries(1):
+            verification = verification_codes.find_code('test@example.com', '111111')
+            self.assertEqual(verification.user, self.user)
+        self.assertIsNone(verification_codes.find_code('other@example.com', '111111'))
+
+        anonymous = APIClient()
+        res = anonymous.post('/api/verify-email/', {'email': 'test@example.com', 'code': '111111'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+        res = anonymous.post('/api/verify-email/', {'email': 'nobody@example.com', 'code': '1'}, format='json')
+        self.assertEqual(res.status_code, 404)
+
+    def test_purge_removes_used_and_expired_in_batches(self):
+        keep = self._code('000001')
+        self._code('000002', is_used=True)
+        for i in range(4):
+            self._code(f'10000{i}', minutes=-1, user=self.other_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(verification_codes.purge_codes(batch_size=2), 5)
+        # Два прохода пачками по 2 строки: использованные (1), затем истёкшие (2 + 2)
+        deletes = [query for query in queries.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        # Каждый проход выбирает по одному условию, чтобы работал свой индекс
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertFalse(any(' OR ' in sql for sql in selects))
+        self.assertEqual(list(EmailVerificationCode.objects.all()), [keep])
+
+        out = StringIO()
+        call_command('purge_verification_codes', stdout=out)
+        self.assertIn('Удалено кодов: 0', out.getvalue())
+
+
+class GuideRenderCacheTests(BaseAPITest):
+    def test_html_rendered_on_save_and_reused(self):
+        guide = Guide.objects.create(author=self.user, title='Code', content='# Header\n\n`x = 1`')
+        guide.refresh_from_db()
+        self.assertIn('<h1>Header</h1>', guide.content_html)
+        self.assertEqual(guide.content_html_key, rendering.content_key(guide.content))
+
+        with patch('users.rendering.render_markdown') as render:
+            res = self.client.get(f'/guides/{guide.id}/')
+        self.assertEqual(res.status_code, 200)
+        render.assert_not_called()
+        self.assertIn('<h1>Header</h1>', str(res.context['guide_content_html']))
+
+        guide.content = '## Changed'
+        guide.save(update_fields=['content'])
+        guide.refresh_from_db()
+        self.assertIn('<h2>Changed</h2>', guide.content_html)
+
+    def test_rerender_guides_command(self):
+        Guide.objects.filter(pk=self.guide.pk).update(content_html='', content_html_key='stale')
+        call_command('rerender_guides', stdout=StringIO())
+        self.guide.refresh_from_db()
+        self.assertEqual(self.guide.content_html_key, rendering.content_key(self.guide.content))
+        self.assertIn('Content', self.guide.content_html)
+
+
+class BlacklistFilterTests(BaseAPITest):
+    def setUp(self):
+        super().setUp()
+        utils.invalidate_blacklist()
+
+    def tearDown(self):
+        utils.invalidate_blacklist()
+        super().tearDown()
+
+    def test_replacement_and_case_sensitivity(self):
+        BlacklistWord.objects.create(word='bad', replacement='***')
+        BlacklistWord.objects.create(word='bad word', replacement='[censored]')
+        BlacklistWord.objects.create(word='Java', replacement='J***', case_sensitive=True)
+        BlacklistWord.objects.create(word='off', is_active=False)
+
+        self.assertEqual(
+            utils.filter_text('BAD idea, a bad word, badminton, Java and java, off'),
+            '*** idea, a [censored], badminton, J*** and java, off',
+        )
+
+    def test_matcher_rebuilt_when_blacklist_changes(self):
+        word = BlacklistWord.objects.create(word='spam')
+        self.assertEqual(utils.filter_text('spam'), '****')
+
+        word.replacement = '#'
+        word.save()
+        self.assertEqual(utils.filter_text('spam'), '#')
+
+        # Изменение из другого воркера (без сигналов) видно после очередной сверки версии
+        BlacklistWord.objects.bulk_create([BlacklistWord(word='eggs')])
+        utils._state['checked_at'] = 0.0
+        self.assertEqual(utils.filter_text('spam eggs'), '# ****')
+
+        word.delete()
+        self.assertEqual(utils.filter_text('spam eggs'), 'spam ****')
+
+
+class ChatConversationTests(BaseAPITest):
+    def _send(self, receiver, text):
+        return self.client.post('/api/chat/send/', {'receiver_id': receiver.id, 'message': text}, format='multipart')
+
+    def test_contacts_use_conversation_summary(self):
+        self.assertEqual(self._send(self.other_user, 'Привет').status_code, 201)
+        self.assertEqual(self._send(self.other_user, 'Как дела?').status_code, 201)
+
+        other_client = APIClient()
+        other_client.force_authenticate(self.other_user)
+        res = other_client.get('/api/chat/contacts/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['username'], 'testuser')
+        self.assertEqual(res.data[0]['last_message'], 'Как дела?')
+        self.assertEqual(res.data[0]['unread_count'], 2)
+
+        res = self.client.get('/api/chat/contacts/')
+        self.assertEqual(res.data[0]['unread_count'], 0)
+
+        other_client.get(f'/api/chat/{self.user.id}/messages/')
+        res = other_client.get('/api/chat/contacts/')
+        self.assertEqual(res.data[0]['unread_count'], 0)
+        self.assertFalse(ChatMessage.objects.filter(is_read=False).exists())
+
+    def test_rebuild_conversations_command(self):
+        self._send(self.other_user, 'Первое')
+        ChatMessage.objects.create(sender=self.other_user, receiver=self.user, message='Ответ')
+        expected = list(Conversation.objects.values_list('last_message', 'unread_low', 'unread_high'))
+
+        Conversation.objects.all().delete()
+        call_command('rebuild_conversations', stdout=StringIO())
+        self.assertEqual(list(Conversation.objects.values_list('last_message', 'unread_low', 'unread_high')), expected)
+        self.assertEqual(expected, [('Ответ', 1, 1)])
+
+    def test_history_keyset_pages_and_window_read(self):
+        for i in range(5):
+            ChatMessage.objects.create(sender=self.other_user, receiver=self.user, message=f'm{i}')
+
+        res = self.client.get(f'/api/chat/{self.other_user.id}/messages/?limit=2')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([m['message'] for m in res.data['results']], ['m3', 'm4'])
+        self.assertTrue(res.data['has_more'])
+        # Прочитаны только сообщения полученной страницы
+        self.assertEqual(ChatMessage.objects.filter(is_read=False).count(), 3)
+        self.assertEqual(Conversation.objects.get().unread_low, 3)
+
+        res = self.client.get(f'/api/chat/{self.other_user.id}/messages/',
+                              {'limit': 2, 'before': res.data['before_cursor']})
+        self.assertEqual([m['message'] for m in res.data['results']], ['m1', 'm2'])
+        after_cursor = res.data['after_cursor']
+
+        res = self.client.get(f'/api/chat/{self.other_user.id}/messages/', {'after': after_cursor})
+        self.assertEqual([m['message'] for m in res.data['results']], ['m3', 'm4'])
+        self.assertFalse(res.data['has_more'])
+
+        res = self.client.get(f'/api/chat/{self.other_user.id}/messages/', {'after': 'broken'})
+        self.assertEqual(res.status_code, 400)
+
+
+class ChatRealtimeTests(BaseAPITest):
+    def test_incomplete_broker_fails_on_creation(self):
+        class PublishOnly(realtime.BaseBroker):
+            def publish(self, user_id, event):
+                pass
+
+        with self.assertRaises(TypeError):
+            PublishOnly()
+        self.assertIsInstance(realtime.LocalBroker(), realtime.BaseBroker)
+
+    def test_message_and_read_receipt_published(self):
+        broker = realtime.get_broker()
+        sender_events = broker.subscribe(self.user.id)
+        receiver_events = broker.subscribe(self.other_user.id)
+        self.addCleanup(sender_events.close)
+        self.addCleanup(receiver_events.close)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/chat/send/', {'receiver_id': self.other_user.id, 'message': 'Привет'},
+                             format='multipart')
+        event = receiver_events.queue.get_nowait()
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual((event['message']['message'], event['message']['direction']), ('Привет', 'incoming'))
+        self.assertEqual(sender_events.queue.get_nowait()['message']['direction'], 'outgoing')
+
+        other_client = APIClient()
+        other_client.force_authenticate(self.other_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            other_client.get(f'/api/chat/{self.user.id}/messages/')
+        self.assertEqual(sender_events.queue.get_nowait(),
+                         {'type': 'read', 'reader_id': self.other_user.id, 'count': 1})
+
+    @override_settings(CHAT_STREAM_ENABLED=True)
+    async def test_stream_endpoint(self):
+        response = await self.async_client.get('/api/chat/stream/')
+        self.assertEqual(response.status_code, 401)
+        # Токен в адресе не принимается: он попадал бы в логи доступа
+        response = await self.async_client.get('/api/chat/stream/', {'token': self.access_token})
+        self.assertEqual(response.status_code, 401)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/chat/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+
+        realtime.get_broker().publish(self.user.id, {'type': 'read', 'reader_id': 7, 'count': 2})
+        chunk = (await anext(stream)).decode()
+        self.assertTrue(chunk.startswith('event: read\n'))
+        self.assertIn('"count": 2', chunk)
+        await stream.aclose()
+
+    def test_stream_disabled_and_blocked_users(self):
+        # Выключен по умолчанию и недоступен под WSGI (синхронный тестовый клиент)
+        self.assertEqual(self.client.get('/api/chat/stream/').status_code, 404)
+        with self.settings(CHAT_STREAM_ENABLED=True):
+            self.assertEqual(self.client.get('/api/chat/stream/').status_code, 404)
+        self.assertNotIn('data-stream-url', self.client.get('/').content.decode())
+        with self.settings(CHAT_STREAM_ENABLED=True):
+            self.assertIn('data-stream-url="/api/chat/stream/"', self.client.get('/').content.decode())
+
+        self.assertEqual(realtime.user_id_from_token(self.access_token), self.user.id)
+        Profile.objects.filter(user=self.user).update(is_blocked=True)
+        self.assertIsNone(realtime.user_id_from_token(self.access_token))
+        User.objects.filter(pk=self.other_user.pk).update(is_active=False)
+        self.assertIsNone(realtime.user_id_from_token(str(RefreshToken.for_user(self.other_user).access_token)))
+
+
+class SeedCommandTests(BaseAPITest):
+    """Генератор синтетических данных"""
+
+    VOLUMES = {'users': 30, 'guides': 12, 'reviews': 40, 'ratings': 50, 'votes': 60, 'messages': 80}
+
+    def _guides(self, prefix):
+        return list(
+            Guide.objects.filter(author__username__startswith=f'{prefix}_').order_by('pk')
+            .values_list('title', 'content', 'tags', 'rating')
+        )
+
+    def test_same_seed_gives_same_data(self):
+        first = seeding.seed(seed=7, prefix='first', **self.VOLUMES)
+        seeding.seed(seed=7, prefix='second', **self.VOLUMES)
+        seeding.seed(seed=8, prefix='third', **self.VOLUMES)
+
+        self.assertEqual(first['users'], 30)
+        self.assertEqual(first['guides'], 12)
+        self.assertEqual(self._guides('first'), self._guides('second'))
+        self.assertNotEqual(self._guides('first'), self._guides('third'))
+        self.assertLessEqual(first['ratings'], 50)
+
+    def test_denormalized_data_is_rebuilt(self):
+        out = StringIO()
+        call_command('seed', '--users', '30', '--guides', '12', '--seed', '3', stdout=out)
+        self.assertIn('Создано строк', out.getvalue())
+
+        counter = counters.read()
+        self.assertEqual(
+            {field: getattr(counter, field) for field in counters.COUNTED},
+            counters.expected_counts(),
+        )
+        self.assertEqual(verify_ratings(), {'guides': [], 'profiles': []})
+        review = Review.objects.filter(author__username__startswith='seed_').order_by('-likes_count').first()
+        self.assertEqual(review.likes_count, GuideReviewRating.objects.filter(review=review, is_like=True).count())
+        self.assertTrue(Conversation.objects.filter(user_low__username__startswith='seed_').exists())
+        self.assertTrue(TagUsage.objects.filter(count__gt=0).exists())
+        guide = Guide.objects.filter(author__username__startswith='seed_').first()
+        self.assertEqual(guide.content_html_key, rendering.content_key(guide.content))
+
+        with self.assertRaises(CommandError):
+            call_command('seed', '--users', '5', stdout=StringIO())
+
+
+class EndpointBenchmarkTests(BaseAPITest):
+    """Бенчмарк маршрутов и сверка с бюджетами"""
+
+    def test_every_get_route_is_measured(self):
+        seeding.seed(users=12, seed=1, render=False)
+        endpoints = benchmarks.collect_endpoints()
+        self.assertEqual(benchmarks.unresolved(endpoints), [])
+
+        results, skipped = benchmarks.run_endpoints(endpoints, repeat=1)
+        self.assertEqual({key: m['status'] for key, m in results.items() if m['status'] >= 500}, {})
+        detail = results['/guides/<int:pk>/']
+        self.assertGreater(detail['queries'], 0)
+        self.assertGreater(detail['bytes'], 0)
+        self.assertEqual(skipped['/api/register/'], "нет GET")
+        self.assertNotIn('/logout/', results)
+        # Бюджеты только для настоящих страниц, не для перенаправлений
+        self.assertEqual({key: m['status'] for key, m in results.items() if 300 <= m['status'] < 400}, {})
+        self.assertNotIn('/blocked/', results)
+        self.assertEqual(results['/announcements/<int:announcement_id>/edit/']['status'], 200)
+
+    def test_compare_reports_budget_violations(self):
+        baseline = {'100': {'/guides/': {'queries': 5, 'total_ms': 20.0}}}
+        within = {'100': {'/guides/': {'status': 200, 'queries': 5, 'total_ms': 35.0}}}
+        self.assertEqual(benchmarks.compare(baseline, within, latency_factor=1.5, latency_slack_ms=5), [])
+
+        worse = {'100': {'/guides/': {'status': 200, 'queries': 6, 'total_ms': 36.0}}}
+        self.assertEqual(len(benchmarks.compare(baseline, worse, latency_factor=1.5, latency_slack_ms=5)), 2)
+        self.assertEqual(
+            benchmarks.growing_query_counts({'100': worse['100'], '1000': {'/guides/': {'queries': 60}}}),
+            {'/guides/': [6, 60]},
+        )
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, REQUEST_INSTRUMENTATION_MAX_QUERIES=1,
+                   REQUEST_INSTRUMENTATION_MAX_MS=60000)
+class RequestInstrumentationTests(BaseAPITest):
+    """Server-Timing и строка лога с замерами запроса"""
+
+    def test_page_over_query_budget_is_flagged(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('users.instrumentation', 'WARNING') as logs:
+            res = self.client.get(f'/guides/{self.guide.id}/')
+        self.assertRegex(res['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ duplicate", tpl;dur=')
+
+        payload = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(payload['view'], 'guide_detail')
+        self.assertEqual(payload['flags'], ['queries'])
+        self.assertGreater(payload['queries'], 1)
+        self.assertGreater(payload['template_ms'], 0)
+        self.assertIn('sql', payload['top_query'])
+
+    def test_api_serialization_and_duplicates(self):
+        with self.settings(REQUEST_INSTRUMENTATION_MAX_QUERIES=100):
+            with self.assertLogs('users.instrumentation', 'INFO') as logs:
+                res = self.client.get('/api/guides/')
+        self.assertIn('ser;dur=', res['Server-Timing'])
+        self.assertEqual(logs.records[-1].levelname, 'INFO')
+        self.assertEqual(logs.records[-1].request_stats['view'], 'guides-list')
+
+        stats = instrumentation.RequestStats()
+        with connection.execute_wrapper(stats.record_query):
+            for _ in range(3):
+                list(Guide.objects.filter(pk=self.guide.pk))
+            list(Guide.objects.filter(pk=self.guide.pk + 1))
+        self.assertEqual((stats.queries, stats.duplicates, stats.similar), (4, 2, 3))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_DIR=None, METRICS_TOKEN='secret')
+class MetricsTests(BaseAPITest):
+    """Метрики Prometheus"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        metrics.REGISTRY.reset()
+        self.addCleanup(metrics.REGISTRY.reset)
+
+    def scrape(self, token='secret'):
+        headers = {'Authorization': f'Bearer {token}'} if token is not None else {}
+        return APIClient().get('/metrics', headers=headers)
+
+    def test_requests_cache_and_chat_are_exposed(self):
+        self.client.get('/api/statistics/')
+        self.client.get('/api/statistics/')
+        self.client.post('/api/chat/send/', {'receiver_id': self.other_user.id, 'message': 'Привет'},
+                         format='multipart')
+
+        res = self.scrape()
+        self.assertEqual(res['Content-Type'], metrics.CONTENT_TYPE)
+        text = res.content.decode()
+        self.assertIn('skillissue_http_requests_total{view="statistics",method="GET",status="200"} 2', text)
+        self.assertIn('skillissue_http_request_duration_seconds_bucket{view="statistics",le="+Inf"} 2', text)
+        self.assertIn('skillissue_db_queries_per_request_count{view="chat_send_message"} 1', text)
+        self.assertIn('skillissue_cache_requests_total{cache="homepage:statistics",result="miss"} 1', text)
+        self.assertIn('skillissue_cache_requests_total{cache="homepage:statistics",result="hit"} 1', text)
+        self.assertIn('skillissue_chat_messages_total{kind="text"} 1', text)
+
+        self.assertEqual(self.scrape(None).status_code, 401)
+        self.assertEqual(self.scrape('secreT').status_code, 401)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.scrape('').status_code, 404)
+
+    def test_disabled_metrics_record_nothing(self):
+        with self.settings(METRICS_ENABLED=False):
+            metrics.CHAT_MESSAGES.inc(kind='text')
+            metrics.BLACKLIST_WORDS.set(3)
+            self.assertEqual(self.scrape().status_code, 404)
+        self.assertEqual(metrics.REGISTRY.snapshot()['skillissue_chat_messages_total'], [])
+        self.assertEqual(metrics.REGISTRY.snapshot()['skillissue_blacklist_words'], [])
+
+    def test_snapshots_of_other_workers_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        metrics.CHAT_MESSAGES.inc(kind='text')
+        metrics.BLACKLIST_WORDS.set(3)
+        dead_pid = 2 ** 22 + 1
+        with open(os.path.join(directory, f'{dead_pid}.json'), 'w') as file:
+            json.dump({'pid': dead_pid, 'metrics': {
+                'skillissue_chat_messages_total': [[['text'], 4]],
+                'skillissue_blacklist_words': [[[], 50]],
+            }}, file)
+
+        with self.settings(METRICS_DIR=directory):
+            metrics.REGISTRY.flush()
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{os.getpid()}.json')))
+            text = metrics.exposition()
+            # Снимок завершившегося воркера слит в aggregate.json, счёт не теряется при повторном чтении
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith('.json')),
+                [f'{os.getpid()}.json', metrics.AGGREGATE_FILE],
+            )
+            self.assertIn('skillissue_chat_messages_total{kind="text"} 5', metrics.exposition())
+        self.assertIn('skillissue_chat_messages_total{kind="text"} 5', text)
+        # gauge завершившегося воркера не учитывается
+        self.assertIn('skillissue_blacklist_words 3', text)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_VIEWS=[],
+                   PROFILING_HEADER_TOKEN='', PROFILING_INTERVAL=0.001)
+class ProfilingTests(BaseAPITest):
+    """Профилирование выбранных запросов и сводка profile_report"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = self.settings(PROFILING_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_cprofile_by_view_and_report(self):
+        self.client.force_login(self.user)
+        with self.settings(PROFILING_MODE='cprofile', PROFILING_SAMPLE_RATE=1.0, PROFILING_VIEWS=['guide_detail']):
+            res = self.client.get(f'/guides/{self.guide.id}/')
+            other = self.client.get('/api/statistics/')
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('X-Profile-Id', other)
+        self.assertEqual(os.listdir(self.directory), [res['X-Profile-Id']])
+        self.assertTrue(res['X-Profile-Id'].endswith('-guide_detail.prof'))
+
+        out = StringIO()
+        call_command('profile_report', '--dir', self.directory, '--top', '5', stdout=out)
+        self.assertIn("cProfile: файлов 1", out.getvalue())
+        self.assertIn('function calls', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('profile_report', '--dir', self.directory, '--view', 'statistics', stdout=StringIO())
+
+    def test_sampler_by_header_and_folded_stats(self):
+        with self.settings(PROFILING_HEADER_TOKEN='secret'):
+            self.client.get('/api/statistics/', headers={'X-Profile': 'wrong'})
+            self.assertEqual(os.listdir(self.directory), [])
+            res = self.client.get('/api/guides/', headers={'X-Profile': 'secret'})
+        self.assertTrue(res['X-Profile-Id'].endswith('-guides-list.folded'))
+
+        path = os.path.join(self.directory, 'manual.folded')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('main (a.py:1);view (b.py:2);query (c.py:3) 3\nmain (a.py:1);view (b.py:2) 1\n')
+        total, own, inclusive = profiling.folded_stats([path])
+        self.assertEqual(total, 4)
+        self.assertEqual(own.most_common(1), [('query (c.py:3)', 3)])
+        self.assertEqual(inclusive['view (b.py:2)'], 4)
+
+        out = StringIO()
+        call_command('profile_report', '--dir', self.directory, stdout=out)
+        self.assertIn("Сэмплер: файлов 2", out.getvalue())
+        self.assertIn('query (c.py:3)', out.getvalue())
+
+    def test_profiles_are_pruned_and_capped(self):
+        now = time.time_ns()
+        old, recent = f'{now - 3 * 86400 * 10 ** 9}-1-old.folded', f'{now - 10 ** 9}-1-recent.prof'
+        for name in (old, recent):
+            open(os.path.join(self.directory, name), 'w').close()
+
+        out = StringIO()
+        call_command('profile_report', '--dir', self.directory, '--prune', '1', stdout=out)
+        self.assertIn("Удалено профилей: 1", out.getvalue())
+        self.assertEqual(os.listdir(self.directory), [recent])
+
+        # В каталоге остаются только PROFILING_MAX_FILES самых новых профилей
+        with self.settings(PROFILING_HEADER_TOKEN='secret', PROFILING_MAX_FILES=1):
+            res = self.client.get('/api/guides/', headers={'X-Profile': 'secret'})
+        self.assertEqual(os.listdir(self.directory), [res['X-Profile-Id']])
@@ -2,6 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
 from . import views
+from .metrics import metrics_view
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -29,6 +30,7 @@ urlpatterns = [
     path("api/chat/contacts/", views.ChatContactsView.as_view(), name="chat_contacts"),
     path("api/chat/<int:user_id>/messages/", views.ChatMessagesView.as_view(), name="chat_messages"),
     path("api/chat/send/", views.ChatSendMessageView.as_view(), name="chat_send_message"),
+    path("api/chat/stream/", views.chat_stream, name="chat_stream"),
     path("logout/", views.logout_view, name="logout_page"),
 
     # --- Основные страницы ---
@@ -45,7 +47,12 @@ urlpatterns = [
     # --- API для профилей ---
     path("api/profile/<str:username>/", views.UserProfileDetailView.as_view(), name="profile-detail"),
     path("api/profile/reviews/create/", views.ReviewCreateView.as_view(), name="review-create"),
-    path('api/profile/<str:username>/guides/', views.profile_guides_api, name='profile_guides_api'),
+    path('api/profile/<str:username>/guides/', views.ProfileSectionView.as_view(section='guides'),
+         name='profile_guides_api'),
+    path('api/profile/<str:username>/announcements/', views.ProfileSectionView.as_view(section='announcements'),
+         name='profile_announcements_api'),
+    path('api/profile/<str:username>/reviews/', views.ProfileSectionView.as_view(section='reviews'),
+         name='profile_reviews_api'),
     path('api/profile/comments/create/', ProfileCommentCreateView.as_view(), name='profile-comment-create'),
     path('api/profile/comments/<int:pk>/update/', ProfileCommentUpdateView.as_view(), name='profile-comment-update'),
     path('api/profile/comments/<int:pk>/delete/', ProfileCommentDeleteView.as_view(), name='profile-comment-delete'),
@@ -88,11 +95,14 @@ urlpatterns = [
     path('api/', include(router.urls)),
 
     path('api/search/all/', views.search_all_items, name='search_all'),
+    path('api/search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
     path('api/search/', views.search_items, name='search'),
+    path('api/tags/facets/', views.tag_facets_view, name='tag_facets'),
     path('api/popular-items/', views.popular_items, name='popular_items'),
     path('api/statistics/', views.statistics, name='statistics'),
     path('api/users/<str:username>/activities/', views.user_activities, name='user_activities'),
     path('api/set-language/', views.set_language, name='set_language'),
+    path('metrics', metrics_view, name='metrics'),
 
     # --- Избранное ---
     path('announcements/<int:announcement_id>/toggle-favorite/', views.toggle_favorite_announcement,
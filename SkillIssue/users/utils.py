@@ -1,7 +1,27 @@
+"""
+Фильтрация текста по блэк-листу.
+
+Все активные слова компилируются в одно регулярное выражение-префиксное
+дерево (отдельно для слов с учётом регистра и без), поэтому текст
+просматривается за один проход независимо от размера блэк-листа.
+Сборка выполняется один раз на версию блэк-листа: версия — это
+количество слов, максимальный id и время последнего изменения.
+Сигналы BlacklistWord сбрасывают matcher в текущем процессе сразу,
+а остальные воркеры сверяют версию не чаще раза в BLACKLIST_CHECK_INTERVAL секунд.
+"""
 import re
+import threading
+import time
+
 from django.db import DatabaseError, ProgrammingError
+from django.db.models import Count, Max
+
+from . import metrics
 from .models import BlacklistWord
 
+# Как часто (в секундах) процесс сверяет версию блэк-листа с базой
+BLACKLIST_CHECK_INTERVAL = 5
+
 
 def _load_blacklist_cache():
     try:
@@ -14,23 +34,114 @@ def _load_blacklist_cache():
         return []
 
 
+def _blacklist_version():
+    try:
+        stats = BlacklistWord.objects.aggregate(count=Count('id'), last_id=Max('id'), changed=Max('updated_at'))
+    except (DatabaseError, ProgrammingError):
+        return None
+    return stats['count'], stats['last_id'], stats['changed']
+
+
+def _trie_pattern(words):
+    """
+    Регулярное выражение по префиксному дереву слов: общие префиксы
+    проверяются один раз, а более длинное слово пробуется раньше короткого.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        is_word = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_word:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if is_word else group
+
+    return build(trie)
+
+
+class BlacklistMatcher:
+    """Скомпилированный блэк-лист: entries — список (слово, замена, учитывать_регистр)"""
+
+    def __init__(self, entries):
+        self.sensitive = {}
+        self.insensitive = {}
+        for word, replacement, case_sensitive in entries:
+            if not word:
+                continue
+            if case_sensitive:
+                self.sensitive.setdefault(word, replacement)
+            else:
+                self.insensitive.setdefault(word.lower(), replacement)
+
+        self._sensitive_re = self._compile(self.sensitive, 0)
+        self._insensitive_re = self._compile(self.insensitive, re.IGNORECASE)
+
+    @staticmethod
+    def _compile(words, flags):
+        if not words:
+            return None
+        return re.compile(r'\b' + _trie_pattern(words) + r'\b', flags)
+
+    def _replace_insensitive(self, match):
+        # IGNORECASE сопоставляет и редкие варианты регистра, которых нет среди ключей
+        return self.insensitive.get(match.group(0).lower(), match.group(0))
+
+    def _replace_sensitive(self, match):
+        return self.sensitive[match.group(0)]
+
+    def __len__(self):
+        return len(self.sensitive) + len(self.insensitive)
+
+    def sub(self, text):
+        if self._insensitive_re is not None:
+            text = self._insensitive_re.sub(self._replace_insensitive, text)
+        if self._sensitive_re is not None:
+            text = self._sensitive_re.sub(self._replace_sensitive, text)
+        return text
+
+
+_state = {'matcher': None, 'version': None, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def get_blacklist_matcher():
+    """Matcher для текущей версии блэк-листа; пересобирается только при её смене"""
+    now = time.monotonic()
+    matcher = _state['matcher']
+    if matcher is not None and now - _state['checked_at'] < BLACKLIST_CHECK_INTERVAL:
+        return matcher
+
+    with _lock:
+        version = _blacklist_version()
+        if _state['matcher'] is None or version is None or version != _state['version']:
+            _state['matcher'] = BlacklistMatcher(_load_blacklist_cache())
+            _state['version'] = version
+            metrics.BLACKLIST_WORDS.set(len(_state['matcher']))
+            metrics.BLACKLIST_REBUILDS.inc()
+        _state['checked_at'] = now
+        return _state['matcher']
+
+
+def invalidate_blacklist():
+    """Сбрасывает matcher текущего процесса (вызывается сигналами BlacklistWord)"""
+    with _lock:
+        _state['matcher'] = None
+        _state['version'] = None
+
+
 def filter_text(text: str) -> str:
     """
     Заменяет слова из блэк-листа на указанные замены.
-    Используется кэширование запросов для производительности.
+    Все слова проверяются одним проходом скомпилированного выражения.
     """
     if not text:
         return text
-
-    if not hasattr(filter_text, '_blacklist_cache'):
-        filter_text._blacklist_cache = _load_blacklist_cache()
-
-    result = text
-    for word, replacement, case_sensitive in filter_text._blacklist_cache:
-        if not word:
-            continue
-        flags = 0 if case_sensitive else re.IGNORECASE
-        escaped_word = re.escape(word)
-        pattern = r'\b' + escaped_word + r'\b'
-        result = re.sub(pattern, replacement, result, flags=flags)
-    return result
\ No newline at end of file
+    return get_blacklist_matcher().sub(text)
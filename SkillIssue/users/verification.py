@@ -0,0 +1,70 @@
+"""
+Коды подтверждения email и восстановления пароля.
+
+Проверка кода — один запрос по частичному индексу verification_unused_idx
+(email, code, -created_at WHERE NOT is_used), пользователь подтягивается
+JOIN-ом по первичному ключу. Использованные и истёкшие коды больше не
+нужны и удаляются командой purge_verification_codes небольшими пачками,
+каждая в своей короткой транзакции, чтобы очистка не держала долгих блокировок.
+Очистка идёт двумя проходами, каждый по своему индексу: использованные коды —
+по частичному verification_used_idx, истёкшие — по verification_expires_idx
+(OR двух условий индексы не использует и читает всю таблицу).
+"""
+import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailVerificationCode
+
+PURGE_BATCH_SIZE = 1000
+
+
+def find_code(email, code):
+    """Последний неиспользованный код пользователя с этим email (с user) или None"""
+    return (
+        EmailVerificationCode.objects
+        .filter(user__email=email, email=email, code=code, is_used=False)
+        .select_related('user')
+        .order_by('-created_at')
+        .first()
+    )
+
+
+def mark_used(verification):
+    verification.is_used = True
+    verification.save(update_fields=['is_used'])
+
+
+def purgeable_codes(now=None):
+    """Коды, которые уже нельзя использовать: использованные и истёкшие"""
+    return EmailVerificationCode.objects.filter(Q(is_used=True) | Q(expires_at__lt=now or timezone.now()))
+
+
+def purge_codes(batch_size=PURGE_BATCH_SIZE, pause=0, now=None):
+    """
+    Удаляет ненужные коды пачками по ``batch_size`` с паузой ``pause`` секунд
+    между ними. Возвращает число удалённых строк.
+    """
+    now = now or timezone.now()
+    passes = (
+        EmailVerificationCode.objects.filter(is_used=True),
+        EmailVerificationCode.objects.filter(expires_at__lt=now),
+    )
+    return sum(_purge_batches(queryset, batch_size, pause) for queryset in passes)
+
+
+def _purge_batches(queryset, batch_size, pause):
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return total
+            deleted, _ = EmailVerificationCode.objects.filter(pk__in=ids).delete()
+        total += deleted
+        if len(ids) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
@@ -1,33 +1,34 @@
 import json
 import re
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.middleware.csrf import get_token
 from django.views.decorators.clickjacking import xframe_options_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import ListView
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework import status, permissions, generics, viewsets, serializers
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import BasePermission
 from rest_framework.decorators import api_view
-import markdown
 from rest_framework.parsers import MultiPartParser, FormParser
 from .daos import GuideDAO
-from django.db.models import Avg, Count, Prefetch
-from django.db.models import Q, F
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.core.mail import send_mail
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.auth.hashers import make_password
@@ -40,8 +41,20 @@ from .models import Profile, GuideRating, Review, Guide, ProfileReview, Announce
     GuideReviewRating, AnnouncementCommentRating, ProfileReviewRating, ReviewReply, ReviewReplyRating, \
     AnnouncementCommentReplyRating, AnnouncementCommentReply
 from .serializers import RegisterSerializer, UserProfileSerializer, ReviewSerializer, GuideSerializer, \
-    AnnouncementSerializer, ChatMessageSerializer, ChatContactSerializer, ProfileCommentSerializer
+    AnnouncementSerializer, ChatMessageSerializer, ChatContactSerializer, ProfileCommentSerializer, \
+    GuideListSerializer, AnnouncementListSerializer, PROFILE_SECTION_ORDERING, profile_section
 from .forms import GuideForm
+from .rendering import convert_youtube_links_to_embed, refresh_guide_html
+from .search import ALL_ITEMS_MAX_PAGE_SIZE, ALL_ITEMS_PAGE_SIZE, all_items_page, autocomplete, search_all, \
+    search_announcements, search_guides
+from .tags import filter_by_tags_query, split_tags
+from .facets import FACETS_LIMIT, FACETS_MAX_LIMIT, TARGET_TYPES, facets_requested, queryset_tag_facets, tag_facets
+from . import chat, homepage, metrics, outbox, realtime
+from . import verification as verification_codes
+from .conditional import ConditionalViewSetMixin, announcement_page_validators, announcement_validators, \
+    conditional_view, guide_page_validators, guide_validators
+from .pagination import ANNOUNCEMENT_ORDERING, GUIDE_ORDERING, KeysetPagination
+from .votes import POPULAR_ORDERING, toggle_vote
 from .utils import filter_text
 
 
@@ -82,15 +95,10 @@ def profile_page(request, username):
     activities = UserActivity.objects.filter(user=user_obj).order_by('-created_at')[:20]
 
     sort_by = request.GET.get('sort', 'new')
-    reviews = ProfileReview.objects.filter(profile=profile).select_related('reviewer', 'reviewer__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    )
+    reviews = ProfileReview.objects.filter(profile=profile).select_related('reviewer', 'reviewer__profile')
 
     if sort_by == 'Popular':
-        reviews = reviews.annotate(
-            net_rating=F('likes_count') - F('dislikes_count')
-        ).order_by('-net_rating', '-created_at')
+        reviews = reviews.order_by(*POPULAR_ORDERING)
     else:
         reviews = reviews.order_by('-created_at')
 
@@ -127,21 +135,6 @@ def favorites_page(request):
     })
 
 
-def profile_guides_api(username):
-    user_obj = get_object_or_404(User, username=username)
-    guides = Guide.objects.filter(author=user_obj).order_by('-created_at')
-    guides_data = [
-        {
-            "id": g.id,
-            "title": g.title,
-            "image": g.image.url if g.image else None,
-            "created_at": g.created_at,
-        }
-        for g in guides
-    ]
-    return JsonResponse({"guides": guides_data})
-
-
 class GuideListView(ListView):
     model = Guide
     template_name = 'users/guides.html'
@@ -152,33 +145,7 @@ class GuideListView(ListView):
         search_query = self.request.GET.get('search')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query)
-            )
-
-            query_lower = search_query.lower()
-            guides = list(queryset)
-
-            for guide in guides:
-                relevance = 0
-                title_lower = guide.title.lower()
-                content_lower = (guide.content or '').lower()
-
-                # +5 за совпадение в начале названия
-                if title_lower.startswith(query_lower):
-                    relevance += 5
-                # +3 за совпадение в названии
-                elif query_lower in title_lower:
-                    relevance += 3
-                # +1 за совпадение в содержании
-                if query_lower in content_lower:
-                    relevance += 1
-
-                guide.relevance = relevance
-
-            guides.sort(key=lambda x: x.relevance, reverse=True)
-            return guides[:20]
+            return search_guides(search_query, queryset.select_related('author'))
 
         return queryset.order_by('-rating')[:6]
 
@@ -219,19 +186,7 @@ class GuideReviewRatingView(APIView):
         if is_like is None:
             return Response({"error": "Не указан тип оценки"}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating = GuideReviewRating.objects.filter(review=review, user=request.user).first()
-
-        if rating and rating.is_like == is_like:
-            rating.delete()
-            user_action = None
-        else:
-            GuideReviewRating.objects.update_or_create(
-                review=review, user=request.user, defaults={'is_like': is_like}
-            )
-            user_action = is_like
-
-        likes = review.ratings.filter(is_like=True).count()
-        dislikes = review.ratings.filter(is_like=False).count()
+        likes, dislikes, user_action = toggle_vote(GuideReviewRating, review, request.user, is_like)
 
         return Response({
             'likes': likes,
@@ -284,16 +239,7 @@ class ReviewReplyRatingView(APIView):
         if is_like is None:
             return Response({"error": "Не указан тип оценки"}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating = ReviewReplyRating.objects.filter(reply=reply, user=request.user).first()
-        if rating and rating.is_like == is_like:
-            rating.delete()
-            user_action = None
-        else:
-            ReviewReplyRating.objects.update_or_create(reply=reply, user=request.user, defaults={'is_like': is_like})
-            user_action = is_like
-
-        likes = reply.ratings.filter(is_like=True).count()
-        dislikes = reply.ratings.filter(is_like=False).count()
+        likes, dislikes, user_action = toggle_vote(ReviewReplyRating, reply, request.user, is_like)
         return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 
@@ -307,35 +253,9 @@ class AnnouncementListView(ListView):
         search_query = self.request.GET.get('search')
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-
-            query_lower = search_query.lower()
-            announcements = list(queryset)
-
-            for ann in announcements:
-                relevance = 0
-                title_lower = ann.title.lower()
-                desc_lower = (ann.description or '').lower()
-
-                # +5 за совпадение в начале названия
-                if title_lower.startswith(query_lower):
-                    relevance += 5
-                # +3 за совпадение в названии
-                elif query_lower in title_lower:
-                    relevance += 3
-                # +1 за совпадение в описании
-                if query_lower in desc_lower:
-                    relevance += 1
-
-                ann.relevance = relevance
-
-            announcements.sort(key=lambda x: x.relevance, reverse=True)
-            return announcements[:20]
+            return search_announcements(search_query, queryset.select_related('author'))
 
-        return queryset.order_by('-created_at')
+        return queryset.select_related('author').order_by('-created_at')
 
 
 @login_required
@@ -418,49 +338,21 @@ def create_guide(request):
 
 
 @xframe_options_exempt
+@conditional_view(guide_page_validators)
 def guide_detail(request, pk):
     guide = get_object_or_404(Guide, pk=pk)
-    content = guide.content or ""
 
-    # === 1. Сначала конвертируем YouTube ссылки в embed формат ===
-    content = convert_youtube_links_to_embed(content)
-
-    # === 2. Конвертируем embed URL в iframe HTML (ДО markdown!) ===
-    content = convert_youtube_embeds_to_html(content)
-
-    # === 3. Применяем markdown с safe_mode=False чтобы сохранить HTML ===
-    html = markdown.markdown(
-        content,
-        extensions=['extra', 'codehilite'],
-        output_format='html5'
-    )
-
-    # === 4. Исправляем пути к изображениям ===
-    html = re.sub(
-        r'src="(?!https?://|/)([^"]+)"',
-        r'src="/media/guides/\1"',
-        html,
-        flags=re.IGNORECASE
-    )
-
-    guide_content_html = mark_safe(html)
+    # HTML хранится в руководстве и перерисовывается только при изменении текста
+    guide_content_html = mark_safe(refresh_guide_html(guide))
 
     sort_by = request.GET.get('sort', 'new')
 
-    reviews = guide.reviews.select_related("author", "author__profile").annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    ).prefetch_related(
-        Prefetch('replies', queryset=ReviewReply.objects.select_related('author', 'author__profile').annotate(
-            likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-            dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-        ).order_by('created_at'))
+    reviews = guide.reviews.select_related("author", "author__profile").prefetch_related(
+        Prefetch('replies', queryset=ReviewReply.objects.select_related('author', 'author__profile').order_by('created_at'))
     )
 
     if sort_by == 'Popular':
-        reviews = reviews.annotate(
-            net_rating=F('likes_count') - F('dislikes_count')
-        ).order_by('-net_rating', '-created_at')
+        reviews = reviews.order_by(*POPULAR_ORDERING)
     else:
         reviews = reviews.order_by('-created_at')
 
@@ -500,27 +392,20 @@ def guide_detail(request, pk):
 
 
 
+@conditional_view(announcement_page_validators)
 def announcement_detail(request, announcement_id):
     announcement = get_object_or_404(Announcement, id=announcement_id)
     sort_by = request.GET.get('sort', 'new')
 
-    comments = announcement.comments.select_related('author', 'author__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    )
+    comments = announcement.comments.select_related('author', 'author__profile')
 
     if sort_by == 'Popular':
-        comments = comments.annotate(
-            net_rating=F('likes_count') - F('dislikes_count')
-        ).order_by('-net_rating', '-created_at')
+        comments = comments.order_by(*POPULAR_ORDERING)
     else:
         comments = comments.order_by('-created_at')
 
-    # Prefetch ответов с их рейтингами
-    replies_qs = AnnouncementCommentReply.objects.select_related('author', 'author__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    ).order_by('created_at')
+    # Prefetch ответов (счётчики лайков хранятся в самих ответах)
+    replies_qs = AnnouncementCommentReply.objects.select_related('author', 'author__profile').order_by('created_at')
 
     comments = comments.prefetch_related(Prefetch('replies', queryset=replies_qs))
 
@@ -666,7 +551,7 @@ def update_announcement(request, announcement_id):
         update_fields = ['title', 'description', 'tags']
         announcement.title = request.POST.get('title')
         announcement.description = request.POST.get('description')
-        announcement.tags = request.POST.get('tags', '')
+        announcement.tags = split_tags(request.POST.get('tags', ''))
 
         if 'image' in request.FILES:
             announcement.image = request.FILES['image']
@@ -731,14 +616,8 @@ class RegisterView(APIView):
                 expires_at=expires_at
             )
             
-            # Отправляем код на email
-            send_mail(
-                subject='Подтверждение регистрации - Skill Issue',
-                message=f'Ваш код подтверждения: {code}\nКод действителен в течение 15 минут.',
-                from_email=None,  # Используется DEFAULT_FROM_EMAIL из settings
-                recipient_list=[email],
-                fail_silently=False,
-            )
+            # Письмо с кодом отправит воркер send_outbox
+            outbox.send_verification_code(email, code)
             
             return Response({
                 "message": "Пользователь зарегистрирован. Код подтверждения отправлен на email.",
@@ -845,29 +724,21 @@ class VerifyEmailView(APIView):
         if not email or not code:
             return Response({"error": "Укажите email и код"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response({"error": "Пользователь не найден"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Ищем актуальный код подтверждения
-        verification = EmailVerificationCode.objects.filter(
-            user=user,
-            email=email,
-            code=code,
-            is_used=False
-        ).order_by('-created_at').first()
+        # Код и пользователь — одним запросом по частичному индексу
+        verification = verification_codes.find_code(email, code)
 
         if not verification:
+            if not User.objects.filter(email=email).exists():
+                return Response({"error": "Пользователь не найден"}, status=status.HTTP_404_NOT_FOUND)
             return Response({"error": "Неверный код подтверждения"}, status=status.HTTP_400_BAD_REQUEST)
+        user = verification.user
 
         if verification.is_expired():
             return Response({"error": "Код подтверждения истек. Запросите новый код."}, 
                           status=status.HTTP_400_BAD_REQUEST)
 
         # Помечаем код как использованный
-        verification.is_used = True
-        verification.save()
+        verification_codes.mark_used(verification)
 
         # Активируем пользователя
         user.is_active = True
@@ -931,14 +802,8 @@ class ResendVerificationCodeView(APIView):
             expires_at=expires_at
         )
 
-        # Отправляем код на email
-        send_mail(
-            subject='Подтверждение регистрации - Skill Issue',
-            message=f'Ваш код подтверждения: {code}\nКод действителен в течение 15 минут.',
-            from_email=None,
-            recipient_list=[email],
-            fail_silently=False,
-        )
+        # Письмо с кодом отправит воркер send_outbox
+        outbox.send_verification_code(email, code)
 
         return Response({
             "message": "Код подтверждения отправлен повторно на email"
@@ -995,7 +860,39 @@ class UserProfileDetailView(generics.RetrieveAPIView):
 
     def get_object(self):
         username = self.kwargs.get("username")
-        return get_object_or_404(Profile, user__username=username)
+        return get_object_or_404(UserProfileSerializer.setup_queryset(Profile.objects.all()), user__username=username)
+
+
+class ProfileSectionView(generics.ListAPIView):
+    """Продолжение секции профиля (руководства, объявления, отзывы) по курсору из ``next``"""
+    section = None
+    keyset_ordering = PROFILE_SECTION_ORDERING
+
+    @swagger_auto_schema(
+        operation_description="Следующие элементы секции профиля (ссылка ``next`` из ответа профиля)",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Курсор следующей страницы",
+                              type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Размер страницы",
+                              type=openapi.TYPE_INTEGER),
+        ],
+        responses={404: "Профиль не найден"},
+        tags=['Профили']
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_section(self):
+        if not hasattr(self, '_section'):
+            profile = get_object_or_404(Profile.objects.select_related('user'), user__username=self.kwargs.get("username"))
+            self._section = profile_section(self.section, profile, self.request)
+        return self._section
+
+    def get_queryset(self):
+        return self.get_section()[0]
+
+    def get_serializer_class(self):
+        return self.get_section()[1]
 
 
 class ProfileReviewRatingView(APIView):
@@ -1020,19 +917,7 @@ class ProfileReviewRatingView(APIView):
         if is_like is None:
             return Response({"error": "Не указан тип оценки"}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating = ProfileReviewRating.objects.filter(review=review, user=request.user).first()
-
-        if rating and rating.is_like == is_like:
-            rating.delete()
-            user_action = None
-        else:
-            ProfileReviewRating.objects.update_or_create(
-                review=review, user=request.user, defaults={'is_like': is_like}
-            )
-            user_action = is_like
-
-        likes = review.ratings.filter(is_like=True).count()
-        dislikes = review.ratings.filter(is_like=False).count()
+        likes, dislikes, user_action = toggle_vote(ProfileReviewRating, review, request.user, is_like)
 
         return Response({
             'likes': likes,
@@ -1083,17 +968,8 @@ class ReviewCreateView(generics.CreateAPIView):
         # Сохраняем отзыв
         text = self.request.data.get('text', '')
         filtered_text = filter_text(text)
-        review = serializer.save(author=self.request.user, guide=guide, stars=stars, text=filtered_text)
-
-        # Пересчитываем средний рейтинг руководства
-        avg_rating = guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0
-        guide.rating = int(round(avg_rating))
-        guide.save(update_fields=['rating'])
-
-        author_avg_rating = Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0
-        profile = guide.author.profile
-        profile.rating = int(round(author_avg_rating))
-        profile.save(update_fields=['rating'])
+        # Рейтинг руководства и автора обновляется сигналом (ratings.apply_vote)
+        serializer.save(author=self.request.user, guide=guide, stars=stars, text=filtered_text)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -1158,8 +1034,8 @@ class PasswordResetRequestView(APIView):
             expires_at=expires_at
         )
 
-        # Отправляем код на email (в консоль для разработки)
-        print(f"Код восстановления пароля для {email}: {code}")
+        # Письмо с кодом отправит воркер send_outbox
+        outbox.send_password_reset_code(email, code)
 
         return Response({
             "message": "Код восстановления отправлен на email"
@@ -1208,30 +1084,21 @@ class PasswordResetConfirmView(APIView):
             return Response({"error": "Пароль должен содержать минимум 8 символов"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        # Находим пользователя
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response({"error": "Пользователь не найден"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Ищем актуальный код восстановления
-        verification = EmailVerificationCode.objects.filter(
-            user=user,
-            email=email,
-            code=code,
-            is_used=False
-        ).order_by('-created_at').first()
+        # Код и пользователь — одним запросом по частичному индексу
+        verification = verification_codes.find_code(email, code)
 
         if not verification:
+            if not User.objects.filter(email=email).exists():
+                return Response({"error": "Пользователь не найден"}, status=status.HTTP_404_NOT_FOUND)
             return Response({"error": "Неверный код восстановления"}, status=status.HTTP_400_BAD_REQUEST)
+        user = verification.user
 
         if verification.is_expired():
             return Response({"error": "Код восстановления истек. Запросите новый код."},
                             status=status.HTTP_400_BAD_REQUEST)
 
         # Помечаем код как использованный
-        verification.is_used = True
-        verification.save()
+        verification_codes.mark_used(verification)
 
         # Меняем пароль пользователя
         user.password = make_password(new_password)
@@ -1332,7 +1199,7 @@ class IsAuthorOrReadOnly(BasePermission):
         return obj.author == request.user or is_moderator
 
 
-class GuideViewSet(viewsets.ModelViewSet):
+class GuideViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления руководствами (гайдами).
     
@@ -1342,9 +1209,23 @@ class GuideViewSet(viewsets.ModelViewSet):
     update: Обновить руководство (только автор)
     destroy: Удалить руководство (только автор)
     """
-    queryset = Guide.objects.all().order_by('-rating', '-created_at')
+    queryset = Guide.objects.order_by('-rating', '-created_at')
     serializer_class = GuideSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    keyset_ordering = GUIDE_ORDERING
+    object_validators = guide_validators
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'get_guides_from_dao'):
+            return GuideListSerializer
+        return GuideSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # JOIN автора добавляет setup_queryset, только если его поля запрошены
+            return GuideListSerializer.setup_queryset(queryset, self.request)
+        return queryset.select_related('author')
 
     @action(detail=False, methods=['get'], url_path='dao-guides')
     def get_guides_from_dao(self, request):
@@ -1352,9 +1233,9 @@ class GuideViewSet(viewsets.ModelViewSet):
         Метод, использующий DAO для получения списка руководств.
         Аналог @GetMapping("students").
         """
-        guides = GuideDAO.get_all()
-        serializer = GuideSerializer(guides, many=True)
-        return Response(serializer.data)
+        guides = self.paginate_queryset(GuideListSerializer.setup_queryset(GuideDAO.get_all(), request))
+        serializer = self.get_serializer(guides, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='dto-guides')
     def get_dto_guides(self, request):
@@ -1458,18 +1339,12 @@ class GuideRateAPIView(APIView):
             defaults={'rating': rating_value}
         )
 
-        avg_guide_rating = guide.ratings.aggregate(avg=Avg('rating'))['avg'] or 0
-        guide.rating = int(round(avg_guide_rating))
-        guide.save(update_fields=['rating'])
-
-        author_avg_rating = Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0
-        profile = guide.author.profile
-        profile.rating = int(round(author_avg_rating))
-        profile.save(update_fields=['rating'])
+        guide.refresh_from_db(fields=['rating'])
+        profile = Profile.objects.only('rating').get(user_id=guide.author_id)
 
         return Response({
             "guide_average_rating": guide.rating,
-            "profile_average_rating": profile.rating
+            "profile_average_rating": round(profile.rating)
         })
 
 
@@ -1495,70 +1370,7 @@ def create_announcement_view(request):
     return render(request, "users/create_announcement.html")
 
 
-def convert_youtube_links_to_embed(content):
-    """Конвертирует YouTube ссылки в embed формат"""
-    # Стандартные YouTube ссылки
-    pattern_standard = r'https?://(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
-    # YouTube Shorts
-    pattern_shorts = r'https?://(?:www\.)?youtube\.com/shorts/([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
-
-    def replace_standard(match):
-        video_id = match.group(1)
-        params = match.group(2) or ''
-        if params.startswith('&'):
-            params = '?' + params[1:]
-        elif params and not params.startswith('?'):
-            params = '?' + params
-        return f'https://www.youtube.com/embed/{video_id}{params}'
-
-    def replace_shorts(match):
-        video_id = match.group(1)
-        return f'https://www.youtube.com/embed/{video_id}'
-
-    content = re.sub(pattern_standard, replace_standard, content)
-    content = re.sub(pattern_shorts, replace_shorts, content)
-
-    return content
-
-
-def convert_youtube_embeds_to_html(content):
-    # Паттерн для Shorts (с #shorts в конце URL)
-    pattern_shorts = r'https://www\.youtube\.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>]*)#shorts'
-    # Паттерн для обычных видео
-    pattern_normal = r'https://www\.youtube\.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>]*)'
-
-    def replace_with_iframe(match, is_shorts):
-        video_id = match.group(1)
-        params = match.group(2) or ''
-        if is_shorts:
-            return f'''<div class="youtube-embed-wrapper">
-                        <iframe width="560" height="315" 
-                            src="https://www.youtube.com/embed/{video_id}" 
-                            frameborder="0" 
-                            allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" 
-                            referrerpolicy="strict-origin-when-cross-origin" 
-                            allowfullscreen 
-                            loading="lazy">
-                        </iframe>
-                    </div><br>'''
-        else:
-            return f'''<div class="youtube-embed-wrapper">
-                <iframe width="560" height="315" 
-                    src="https://www.youtube.com/embed/{video_id}{params}" 
-                    frameborder="0" 
-                    allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" 
-                    referrerpolicy="strict-origin-when-cross-origin" 
-                    allowfullscreen 
-                    loading="lazy">
-                </iframe>
-            </div><br>'''
-
-    content = re.sub(pattern_shorts, lambda m: replace_with_iframe(m, is_shorts=True), content)
-    content = re.sub(pattern_normal, lambda m: replace_with_iframe(m, is_shorts=False), content)
-
-    return content
-
-class AnnouncementViewSet(viewsets.ModelViewSet):
+class AnnouncementViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления объявлениями.
     
@@ -1568,10 +1380,24 @@ class AnnouncementViewSet(viewsets.ModelViewSet):
     update: Обновить объявление
     destroy: Удалить объявление
     """
-    queryset = Announcement.objects.all().order_by("-created_at")
+    queryset = Announcement.objects.order_by("-created_at")
     serializer_class = AnnouncementSerializer
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    keyset_ordering = ANNOUNCEMENT_ORDERING
+    object_validators = announcement_validators
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AnnouncementListSerializer
+        return AnnouncementSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # JOIN автора добавляет setup_queryset, только если его поля запрошены
+            return AnnouncementListSerializer.setup_queryset(queryset, self.request)
+        return queryset.select_related('author')
 
     @swagger_auto_schema(
         operation_description="Получить список всех объявлений, отсортированных по дате создания",
@@ -1644,19 +1470,7 @@ class AnnouncementCommentRatingView(APIView):
         if is_like is None:
             return Response({"error": "Не указан тип оценки"}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating = AnnouncementCommentRating.objects.filter(comment=comment, user=request.user).first()
-
-        if rating and rating.is_like == is_like:
-            rating.delete()
-            user_action = None
-        else:
-            AnnouncementCommentRating.objects.update_or_create(
-                comment=comment, user=request.user, defaults={'is_like': is_like}
-            )
-            user_action = is_like
-
-        likes = comment.ratings.filter(is_like=True).count()
-        dislikes = comment.ratings.filter(is_like=False).count()
+        likes, dislikes, user_action = toggle_vote(AnnouncementCommentRating, comment, request.user, is_like)
 
         return Response({
             'likes': likes,
@@ -1704,18 +1518,7 @@ class AnnouncementCommentReplyRatingView(APIView):
         if is_like is None:
             return Response({"error": "Не указан тип оценки"}, status=status.HTTP_400_BAD_REQUEST)
 
-        rating = AnnouncementCommentReplyRating.objects.filter(reply=reply, user=request.user).first()
-        if rating and rating.is_like == is_like:
-            rating.delete()
-            user_action = None
-        else:
-            AnnouncementCommentReplyRating.objects.update_or_create(
-                reply=reply, user=request.user, defaults={'is_like': is_like}
-            )
-            user_action = is_like
-
-        likes = reply.ratings.filter(is_like=True).count()
-        dislikes = reply.ratings.filter(is_like=False).count()
+        likes, dislikes, user_action = toggle_vote(AnnouncementCommentReplyRating, reply, request.user, is_like)
         return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 
@@ -1770,24 +1573,17 @@ class ReviewUpdateView(APIView):
         review.stars = stars
         review.save()
 
-        # Обновляем средний рейтинг гида
-        avg_rating = review.guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0
-        review.guide.rating = int(round(avg_rating))
-        review.guide.save(update_fields=['rating'])
-
-        # Обновляем рейтинг профиля автора
-        author_avg_rating = Guide.objects.filter(author=review.guide.author).aggregate(avg=Avg('rating'))['avg'] or 0
-        profile = review.guide.author.profile
-        profile.rating = int(round(author_avg_rating))
-        profile.save(update_fields=['rating'])
+        # Рейтинги гида и автора уже обновлены сигналом
+        guide = Guide.objects.only('rating', 'author_id').get(pk=review.guide_id)
+        profile = Profile.objects.only('rating').get(user_id=guide.author_id)
 
         return Response({
             "id": review.id,
             "text": review.text,
             "stars": review.stars,
             "created_at": review.created_at,
-            "guide_average_rating": review.guide.rating,
-            "profile_average_rating": profile.rating
+            "guide_average_rating": guide.rating,
+            "profile_average_rating": round(profile.rating)
         })
 
 
@@ -1825,21 +1621,14 @@ class ReviewDeleteView(APIView):
         guide = review.guide
         review.delete()
 
-        # Обновляем средний рейтинг гида
-        avg_rating = guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0
-        guide.rating = int(round(avg_rating))
-        guide.save(update_fields=['rating'])
-
-        # Обновляем рейтинг профиля автора
-        author_avg_rating = Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0
-        profile = guide.author.profile
-        profile.rating = int(round(author_avg_rating))
-        profile.save(update_fields=['rating'])
+        # Рейтинги гида и автора уже обновлены сигналом
+        guide.refresh_from_db(fields=['rating'])
+        profile = Profile.objects.only('rating').get(user_id=guide.author_id)
 
         return Response({
             "message": "Отзыв удалён",
             "guide_average_rating": guide.rating,
-            "profile_average_rating": profile.rating
+            "profile_average_rating": round(profile.rating)
         })
 
 
@@ -2155,144 +1944,142 @@ class AnnouncementCommentDeleteView(APIView):
 )
 @api_view(['GET'])
 def popular_items(request):
-    """Получить популярные руководства и объявления для карусели"""
+    """Получить популярные руководства и объявления для карусели (из кэша главной страницы)"""
     try:
-        # Получаем популярные руководства (топ 5 по рейтингу)
-        popular_guides = Guide.objects.order_by('-rating', '-created_at')[:5]
-        guides_data = []
-        for guide in popular_guides:
-            request_obj = request
-            image_url = None
-            if guide.image:
-                if request_obj:
-                    image_url = request_obj.build_absolute_uri(guide.image.url)
-                else:
-                    image_url = guide.image.url
-            
-            guides_data.append({
-                'id': guide.id,
-                'title': guide.title,
-                'image': image_url or None,
-                'author': guide.author.username,
-                'rating': guide.rating,
-                'url': f'/guides/{guide.id}/',
-                'type': 'guide'
-            })
-        
-        # Получаем популярные объявления (последние 5)
-        popular_announcements = Announcement.objects.order_by('-created_at')[:5]
-        announcements_data = []
-        for announcement in popular_announcements:
-            request_obj = request
-            image_url = None
-            if announcement.image:
-                if request_obj:
-                    image_url = request_obj.build_absolute_uri(announcement.image.url)
-                else:
-                    image_url = announcement.image.url
-            
-            announcements_data.append({
-                'id': announcement.id,
-                'title': announcement.title,
-                'image': image_url or None,
-                'author': announcement.author.username,
-                'url': f'/announcements/{announcement.id}/',
-                'type': 'announcement'
-            })
-        
-        # Объединяем и перемешиваем (можно отсортировать по дате создания)
-        all_items = guides_data + announcements_data
-        # Сортируем по дате создания (новые первыми)
-        # Для этого нужно добавить created_at в данные
-        return Response({
-            'guides': guides_data,
-            'announcements': announcements_data,
-            'items': all_items[:6]  # Максимум 6 элементов для карусели
-        })
+        return Response(homepage.popular_items(request))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 @api_view(['GET'])
 def statistics(request):
-    """Получить статистику платформы"""
+    """Получить статистику платформы (из кэша главной страницы)"""
     try:
-        guides_count = Guide.objects.count()
-        announcements_count = Announcement.objects.count()
-        users_count = User.objects.filter(is_active=True).count()
-        ratings_count = Review.objects.count() + ProfileReview.objects.count()
-        
-        return Response({
-            'guides': guides_count,
-            'announcements': announcements_count,
-            'users': users_count,
-            'ratings': ratings_count
-        })
+        return Response(homepage.statistics())
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _int_param(request, name, default):
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+SEARCH_ITEM_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'title': openapi.Schema(type=openapi.TYPE_STRING),
+        'type': openapi.Schema(type=openapi.TYPE_STRING, enum=['профиль', 'объявление', 'руководство']),
+        'url': openapi.Schema(type=openapi.TYPE_STRING),
+    }
+)
+
+
 @swagger_auto_schema(
     method='get',
-    operation_description="Получить все элементы для поиска (профили, объявления, руководства)",
+    operation_description="Постраничный список всех элементов для поиска (профили, объявления, руководства)",
+    manual_parameters=[
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Курсор из поля next предыдущей страницы",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('limit', openapi.IN_QUERY,
+                          description=f"Размер страницы (по умолчанию {ALL_ITEMS_PAGE_SIZE}, максимум {ALL_ITEMS_MAX_PAGE_SIZE})",
+                          type=openapi.TYPE_INTEGER),
+    ],
     responses={
         200: openapi.Response(
-            description="Список всех элементов",
+            description="Страница элементов",
             schema=openapi.Schema(
-                type=openapi.TYPE_ARRAY,
-                items=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        'title': openapi.Schema(type=openapi.TYPE_STRING),
-                        'type': openapi.Schema(type=openapi.TYPE_STRING, enum=['профиль', 'объявление', 'руководство']),
-                        'url': openapi.Schema(type=openapi.TYPE_STRING),
-                    }
-                )
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=SEARCH_ITEM_SCHEMA),
+                    'next': openapi.Schema(type=openapi.TYPE_STRING, x_nullable=True),
+                }
             )
         ),
+        400: "Некорректный курсор",
         500: "Внутренняя ошибка сервера"
     },
     tags=['Поиск']
 )
 @api_view(['GET'])
 def search_all_items(request):
-    """Получить все элементы для поиска из всех моделей"""
+    """Получить страницу элементов для поиска из всех моделей"""
     try:
-        results = []
-
-        # Профили
-        profiles = Profile.objects.select_related('user').all()
-        for profile in profiles:
-            results.append({
-                'title': f"{profile.user.first_name} {profile.user.last_name}".strip() or profile.user.username,
-                'type': 'профиль',
-                'url': f'/users/{profile.user.username}/',
-            })
-
-        # Объявления
-        announcements = Announcement.objects.select_related('author').all()
-        for announcement in announcements:
-            results.append({
-                'title': announcement.title,
-                'type': 'объявление',
-                'url': f'/announcements/{announcement.id}/',
-            })
+        limit = _int_param(request, 'limit', ALL_ITEMS_PAGE_SIZE)
+        try:
+            items, next_cursor = all_items_page(request.GET.get('cursor') or None, limit)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': items, 'next': next_cursor})
 
-        # Руководства
-        guides = Guide.objects.select_related('author').all()
-        for guide in guides:
-            results.append({
-                'title': guide.title,
-                'type': 'руководство',
-                'url': f'/guides/{guide.id}/',
-            })
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return Response(results)
 
+@swagger_auto_schema(
+    method='get',
+    operation_description="Подсказки для строки поиска (префиксы и опечатки, pg_trgm)",
+    manual_parameters=[
+        openapi.Parameter('q', openapi.IN_QUERY, description="Введённый текст (от 2 символов)",
+                          type=openapi.TYPE_STRING, required=True),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Подсказки",
+            schema=openapi.Schema(type=openapi.TYPE_ARRAY, items=SEARCH_ITEM_SCHEMA)
+        ),
+        500: "Внутренняя ошибка сервера"
+    },
+    tags=['Поиск']
+)
+@api_view(['GET'])
+def search_autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        return Response(autocomplete(query))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@swagger_auto_schema(
+    method='get',
+    operation_description="Счётчики тегов (облако тегов) для руководств или объявлений",
+    manual_parameters=[
+        openapi.Parameter('type', openapi.IN_QUERY, description="guides или announcements",
+                          type=openapi.TYPE_STRING, enum=['guides', 'announcements'], required=True),
+        openapi.Parameter('limit', openapi.IN_QUERY,
+                          description=f"Количество тегов (по умолчанию {FACETS_LIMIT}, максимум {FACETS_MAX_LIMIT})",
+                          type=openapi.TYPE_INTEGER),
+    ],
+    responses={
+        200: openapi.Response(
+            description="Теги по убыванию популярности",
+            schema=openapi.Schema(
+                type=openapi.TYPE_ARRAY,
+                items=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'tag': openapi.Schema(type=openapi.TYPE_STRING),
+                        'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    }
+                )
+            )
+        ),
+        400: "Неизвестный тип"
+    },
+    tags=['Теги']
+)
+@api_view(['GET'])
+def tag_facets_view(request):
+    target_type = TARGET_TYPES.get(request.GET.get('type', '').strip().lower())
+    if target_type is None:
+        return Response({'error': 'Параметр type должен быть guides или announcements'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response(tag_facets(target_type, _int_param(request, 'limit', FACETS_LIMIT)))
+
+
 @swagger_auto_schema(
     method='get',
     operation_description="Поиск по всем моделям (профили, объявления, руководства)",
@@ -2331,109 +2118,7 @@ def search_items(request):
         return Response([])
 
     try:
-        results = []
-        query_lower = query.lower()
-
-        # === ПОИСК В ПРОФИЛЯХ ===
-        profiles = Profile.objects.filter(
-            Q(user__first_name__icontains=query) |
-            Q(user__last_name__icontains=query) |
-            Q(user__username__icontains=query) |
-            Q(bio__icontains=query)
-        ).select_related('user')[:30]
-
-        for profile in profiles:
-            full_name = f"{profile.user.first_name} {profile.user.last_name}".strip().lower()
-            username = profile.user.username.lower()
-            bio = (profile.bio or '').lower()
-
-            relevance = 0
-            # +3 за совпадение в никнейме
-            if query_lower in username:
-                relevance += 3
-                if username.startswith(query_lower):
-                    relevance += 2
-            # +2 за совпадение в ФИО
-            if query_lower in full_name:
-                relevance += 2
-                if full_name.startswith(query_lower):
-                    relevance += 1
-            # +1 за совпадение в описании
-            if query_lower in bio:
-                relevance += 1
-
-            results.append({
-                'title': full_name.title() or profile.user.username,
-                'type': 'профиль',
-                'url': f'/users/{profile.user.username}/',
-                'relevance': relevance
-            })
-
-        # === ПОИСК В ОБЪЯВЛЕНИЯХ ===
-        announcements = Announcement.objects.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query)
-        )[:30]
-
-        for ann in announcements:
-            title = ann.title.lower()
-            desc = (ann.description or '').lower()
-
-            relevance = 0
-            if query_lower in title:
-                # +3 за совпадение в названии
-                relevance += 3
-                if title.startswith(query_lower):
-                    # +2 за то, что начинается с запроса
-                    relevance += 2
-            if query_lower in desc:
-                # +1 за то, что есть в описании
-                relevance += 1
-
-            results.append({
-                'title': ann.title,
-                'type': 'объявление',
-                'url': f'/announcements/{ann.id}/',
-                'relevance': relevance
-            })
-
-        # === ПОИСК В РУКОВОДСТВАХ ===
-        guides = Guide.objects.filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query)
-        )[:30]
-
-        for guide in guides:
-            title = guide.title.lower()
-            content = (guide.content or '').lower()
-
-            relevance = 0
-            if query_lower in title:
-                # +3 за совпадение в названии
-                relevance += 3
-                if title.startswith(query_lower):
-                    # +2 за то, что начинается с запроса
-                    relevance += 2
-            if query_lower in content:
-                # +1 за то, что есть в описании
-                relevance += 1
-
-            results.append({
-                'title': guide.title,
-                'type': 'руководство',
-                'url': f'/guides/{guide.id}/',
-                'relevance': relevance
-            })
-
-        results.sort(key=lambda x: x['relevance'], reverse=True)
-
-        final_results = [
-            {'title': r['title'], 'type': r['type'], 'url': r['url']}
-            for r in results[:20]
-        ]
-
-        return Response(final_results)
-
+        return Response(search_all(query))
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -2444,7 +2129,17 @@ def search_items(request):
     manual_parameters=[
         openapi.Parameter('search', openapi.IN_QUERY, description="Поиск по названию", type=openapi.TYPE_STRING),
         openapi.Parameter('tags', openapi.IN_QUERY, description="Теги через запятую", type=openapi.TYPE_STRING),
+        openapi.Parameter('tags_mode', openapi.IN_QUERY, description="any — любой из тегов (по умолчанию), all — все теги",
+                          type=openapi.TYPE_STRING, enum=['any', 'all']),
         openapi.Parameter('date_filter', openapi.IN_QUERY, description="Количество дней для фильтрации", type=openapi.TYPE_STRING),
+        openapi.Parameter('facets', openapi.IN_QUERY, description="1 — вернуть в поле facets теги найденных объектов с их числом",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Курсор следующей страницы (из поля next)",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Размер страницы (по умолчанию 20, максимум 100)",
+                          type=openapi.TYPE_INTEGER),
+        openapi.Parameter('with_count', openapi.IN_QUERY, description="1 — добавить оценку общего числа (estimated_count)",
+                          type=openapi.TYPE_STRING),
     ],
     tags=['Объявления']
 )
@@ -2454,23 +2149,8 @@ def filter_announcements(request):
         queryset = Announcement.objects.all()
 
         search_query = request.GET.get('search', '').strip()
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
 
-        tags_query = request.GET.get('tags', '').strip()
-        if tags_query:
-            tags_list = [tag.strip().lower() for tag in tags_query.split(',') if tag.strip()]
-            if tags_list:
-                filtered_ids = []
-                for announcement in queryset.iterator():
-                    ann_tags = announcement.tags if isinstance(announcement.tags, list) else []
-                    normalized = [str(t).lower().strip() for t in ann_tags if t]
-                    if any(tag in normalized for tag in tags_list):
-                        filtered_ids.append(announcement.id)
-                queryset = queryset.filter(id__in=filtered_ids) if filtered_ids else queryset.none()
+        queryset = filter_by_tags_query(queryset, request)
 
         date_filter = (request.GET.get('date_filter') or '').strip()
         if date_filter.isdigit():
@@ -2479,36 +2159,25 @@ def filter_announcements(request):
             start_date = today - timedelta(days=days)
             queryset = queryset.filter(created_at__date__gte=start_date)
 
+        filtered = queryset
         if search_query:
-            announcements = list(queryset)
-            query_lower = search_query.lower()
-
-            for ann in announcements:
-                relevance = 0
-                title_lower = ann.title.lower()
-                desc_lower = (ann.description or '').lower()
-
-                # +5 за совпадение в начале названия
-                if title_lower.startswith(query_lower):
-                    relevance += 5
-                # +3 за совпадение в названии (не в начале)
-                elif query_lower in title_lower:
-                    relevance += 3
-                # +1 за совпадение в описании
-                if query_lower in desc_lower:
-                    relevance += 1
-
-                ann.relevance = relevance
-
-            announcements.sort(key=lambda x: x.relevance, reverse=True)
-            announcements = announcements[:20]
-
-            serializer = AnnouncementSerializer(announcements, many=True, context={'request': request})
-            return Response({'count': len(announcements), 'results': serializer.data})
+            queryset = AnnouncementListSerializer.setup_queryset(queryset, request)
+            announcements = list(search_announcements(search_query, queryset))
+
+            serializer = AnnouncementListSerializer(announcements, many=True, context={'request': request})
+            data = {'count': len(announcements), 'results': serializer.data}
         else:
-            queryset = queryset.order_by('-created_at')
-            serializer = AnnouncementSerializer(queryset, many=True, context={'request': request})
-            return Response({'count': queryset.count(), 'results': serializer.data})
+            paginator = KeysetPagination(ordering=ANNOUNCEMENT_ORDERING)
+            page = paginator.paginate_queryset(AnnouncementListSerializer.setup_queryset(queryset, request), request)
+            serializer = AnnouncementListSerializer(page, many=True, context={'request': request})
+            data = paginator.get_page_data(serializer.data)
+
+        if facets_requested(request):
+            matched = search_announcements(search_query, filtered, limit=None) if search_query else filtered
+            data['facets'] = queryset_tag_facets(matched)
+        return Response(data)
+    except NotFound:
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -2519,7 +2188,17 @@ def filter_announcements(request):
     manual_parameters=[
         openapi.Parameter('search', openapi.IN_QUERY, description="Поиск по названию", type=openapi.TYPE_STRING),
         openapi.Parameter('tags', openapi.IN_QUERY, description="Теги через запятую", type=openapi.TYPE_STRING),
+        openapi.Parameter('tags_mode', openapi.IN_QUERY, description="any — любой из тегов (по умолчанию), all — все теги",
+                          type=openapi.TYPE_STRING, enum=['any', 'all']),
         openapi.Parameter('date_filter', openapi.IN_QUERY, description="today/week/month", type=openapi.TYPE_STRING),
+        openapi.Parameter('facets', openapi.IN_QUERY, description="1 — вернуть в поле facets теги найденных объектов с их числом",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Курсор следующей страницы (из поля next)",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Размер страницы (по умолчанию 20, максимум 100)",
+                          type=openapi.TYPE_INTEGER),
+        openapi.Parameter('with_count', openapi.IN_QUERY, description="1 — добавить оценку общего числа (estimated_count)",
+                          type=openapi.TYPE_STRING),
     ],
     tags=['Руководства']
 )
@@ -2529,23 +2208,8 @@ def filter_guides(request):
         queryset = Guide.objects.all()
 
         search_query = request.GET.get('search', '').strip()
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(content__icontains=search_query)
-            )
 
-        tags_query = request.GET.get('tags', '').strip()
-        if tags_query:
-            tags_list = [tag.strip().lower() for tag in tags_query.split(',') if tag.strip()]
-            if tags_list:
-                filtered_ids = []
-                for guide in queryset.iterator():
-                    g_tags = guide.tags if isinstance(guide.tags, list) else []
-                    normalized = [str(t).lower().strip() for t in g_tags if t]
-                    if any(tag in normalized for tag in tags_list):
-                        filtered_ids.append(guide.id)
-                queryset = queryset.filter(id__in=filtered_ids) if filtered_ids else queryset.none()
+        queryset = filter_by_tags_query(queryset, request)
 
         date_filter = (request.GET.get('date_filter') or '').strip()
         if date_filter.isdigit():
@@ -2554,36 +2218,25 @@ def filter_guides(request):
             start_date = today - timedelta(days=days)
             queryset = queryset.filter(created_at__date__gte=start_date)
 
+        filtered = queryset
         if search_query:
-            guides = list(queryset)
-            query_lower = search_query.lower()
-
-            for guide in guides:
-                relevance = 0
-                title_lower = guide.title.lower()
-                content_lower = (guide.content or '').lower()
-
-                # +5 за совпадение в начале названия
-                if title_lower.startswith(query_lower):
-                    relevance += 5
-                # +3 за совпадение в названии
-                elif query_lower in title_lower:
-                    relevance += 3
-                # +1 за совпадение в содержании
-                if query_lower in content_lower:
-                    relevance += 1
-
-                guide.relevance = relevance
-
-            guides.sort(key=lambda x: x.relevance, reverse=True)
-            guides = guides[:20]
-
-            serializer = GuideSerializer(guides, many=True, context={'request': request})
-            return Response({'count': len(guides), 'results': serializer.data})
+            queryset = GuideListSerializer.setup_queryset(queryset, request)
+            guides = list(search_guides(search_query, queryset))
+
+            serializer = GuideListSerializer(guides, many=True, context={'request': request})
+            data = {'count': len(guides), 'results': serializer.data}
         else:
-            queryset = queryset.order_by('-rating', '-created_at')
-            serializer = GuideSerializer(queryset, many=True, context={'request': request})
-            return Response({'count': queryset.count(), 'results': serializer.data})
+            paginator = KeysetPagination(ordering=GUIDE_ORDERING)
+            page = paginator.paginate_queryset(GuideListSerializer.setup_queryset(queryset, request), request)
+            serializer = GuideListSerializer(page, many=True, context={'request': request})
+            data = paginator.get_page_data(serializer.data)
+
+        if facets_requested(request):
+            matched = search_guides(search_query, filtered, limit=None) if search_query else filtered
+            data['facets'] = queryset_tag_facets(matched)
+        return Response(data)
+    except NotFound:
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -2596,45 +2249,7 @@ class ChatContactsView(APIView):
         Возвращает список собеседников с последним сообщением и количеством непрочитанных.
         """
         user = request.user
-        messages = (
-            ChatMessage.objects
-            .filter(Q(sender=user) | Q(receiver=user))
-            .select_related("sender", "receiver", "sender__profile", "receiver__profile")
-            .order_by("-created_at")
-        )
-
-        contacts_map = {}
-        for msg in messages:
-            other = msg.receiver if msg.sender_id == user.id else msg.sender
-            data = contacts_map.setdefault(
-                other.id,
-                {
-                    "user_id": other.id,
-                    "username": other.username,
-                    "avatar": other.profile.avatar.url if hasattr(other, 'profile') and other.profile.avatar else None,
-                    "last_message": "",
-                    "last_message_at": None,
-                    "unread_count": 0,
-                },
-            )
-
-            if not data["last_message_at"] or msg.created_at > data["last_message_at"]:
-                if msg.message.strip():
-                    data["last_message"] = msg.message[:200]
-                elif msg.image:
-                    data["last_message"] = "Картинка"
-                else:
-                    data["last_message"] = "Без сообщений"
-                data["last_message_at"] = msg.created_at
-
-            if msg.receiver_id == user.id and not msg.is_read:
-                data["unread_count"] += 1
-
-        contacts = sorted(
-            contacts_map.values(),
-            key=lambda item: item["last_message_at"] or timezone.now(),
-            reverse=True,
-        )
+        contacts = [chat.contact_entry(conversation, user) for conversation in chat.conversations_for(user)]
         serializer = ChatContactSerializer(contacts, many=True)
         return Response(serializer.data)
 
@@ -2644,25 +2259,50 @@ class ChatMessagesView(APIView):
 
     def get(self, request, user_id):
         """
-        Возвращает историю сообщений с конкретным пользователем и помечает входящие как прочитанные.
+        Возвращает страницу истории сообщений с конкретным пользователем
+        (курсоры before/after, параметр limit) и помечает её входящие как прочитанные.
         """
         other_user = get_object_or_404(User, id=user_id)
         if other_user == request.user:
-            return Response([])
+            return Response({'results': [], 'before_cursor': None, 'after_cursor': None, 'has_more': False})
+
+        try:
+            page = chat.read_history(
+                request.user,
+                other_user,
+                before=request.GET.get('before') or None,
+                after=request.GET.get('after') or None,
+                limit=_int_param(request, 'limit', chat.HISTORY_PAGE_SIZE),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        ChatMessage.objects.filter(
-            sender=other_user,
-            receiver=request.user,
-            is_read=False
-        ).update(is_read=True)
+        serializer = ChatMessageSerializer(page.pop('messages'), many=True, context={"request": request})
+        return Response({'results': serializer.data, **page})
 
-        messages = ChatMessage.objects.filter(
-            (Q(sender=request.user, receiver=other_user) |
-             Q(sender=other_user, receiver=request.user))
-        ).order_by("created_at")
 
-        serializer = ChatMessageSerializer(messages, many=True, context={"request": request})
-        return Response(serializer.data)
+@require_GET
+async def chat_stream(request):
+    """
+    Поток событий чата (text/event-stream): новые сообщения и отметки о прочтении.
+    Пока событий нет, соединение не обращается к базе.
+    """
+    if not getattr(settings, 'CHAT_STREAM_ENABLED', False) or not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Поток событий чата отключён'}, status=404)
+
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        user_id = await sync_to_async(realtime.user_id_from_token)(authorization.removeprefix('Bearer ').strip())
+    else:
+        user = await request.auser()
+        user_id = await sync_to_async(realtime.active_user_id)(user.id) if user.is_authenticated else None
+    if user_id is None:
+        return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+
+    response = StreamingHttpResponse(realtime.event_stream(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class ChatSendMessageView(APIView):
@@ -2697,6 +2337,7 @@ class ChatSendMessageView(APIView):
             message=text,
             image=image,
         )
+        metrics.CHAT_MESSAGES.inc(kind='image' if image else 'text')
 
         serializer = ChatMessageSerializer(message, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -5,12 +5,20 @@ from django.views.generic import ListView
 from rest_framework import status, permissions, viewsets
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Count, Prefetch, Q, F
+from django.db.models import Prefetch
 from .models import Announcement, FavoriteAnnouncement, AnnouncementComment, AnnouncementCommentRating, AnnouncementCommentReply, AnnouncementCommentReplyRating
-from .serializers import AnnouncementSerializer
+from .conditional import ConditionalViewSetMixin, announcement_page_validators, announcement_validators, \
+    conditional_view
+from .search import search_announcements
+from .tags import filter_by_tags_query, split_tags
+from .votes import POPULAR_ORDERING
+from .facets import facets_requested, queryset_tag_facets
+from .pagination import ANNOUNCEMENT_ORDERING, KeysetPagination
+from .serializers import AnnouncementListSerializer, AnnouncementSerializer
 from .utils import filter_text
 
 class AnnouncementListView(ListView):
@@ -21,20 +29,8 @@ class AnnouncementListView(ListView):
         queryset = super().get_queryset()
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(Q(title__icontains=search_query) | Q(description__icontains=search_query))
-            query_lower = search_query.lower()
-            announcements = list(queryset)
-            for ann in announcements:
-                relevance = 0
-                title_lower = ann.title.lower()
-                desc_lower = (ann.description or '').lower()
-                if title_lower.startswith(query_lower): relevance += 5
-                elif query_lower in title_lower: relevance += 3
-                if query_lower in desc_lower: relevance += 1
-                ann.relevance = relevance
-            announcements.sort(key=lambda x: x.relevance, reverse=True)
-            return announcements[:20]
-        return queryset.order_by('-created_at')
+            return search_announcements(search_query, queryset.select_related('author'))
+        return queryset.select_related('author').order_by('-created_at')
 
 @login_required
 def create_announcement_view(request):
@@ -49,21 +45,16 @@ def create_announcement_view(request):
             return redirect("announcements_list")
     return render(request, "users/create_announcement.html")
 
+@conditional_view(announcement_page_validators)
 def announcement_detail(request, announcement_id):
     announcement = get_object_or_404(Announcement, id=announcement_id)
     sort_by = request.GET.get('sort', 'new')
-    comments = announcement.comments.select_related('author', 'author__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    )
+    comments = announcement.comments.select_related('author', 'author__profile')
     if sort_by == 'Popular':
-        comments = comments.annotate(net_rating=F('likes_count') - F('dislikes_count')).order_by('-net_rating', '-created_at')
+        comments = comments.order_by(*POPULAR_ORDERING)
     else:
         comments = comments.order_by('-created_at')
-    replies_qs = AnnouncementCommentReply.objects.select_related('author', 'author__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    ).order_by('created_at')
+    replies_qs = AnnouncementCommentReply.objects.select_related('author', 'author__profile').order_by('created_at')
     comments = comments.prefetch_related(Prefetch('replies', queryset=replies_qs))
     is_favorited, user_liked, user_disliked = False, set(), set()
     user_liked_replies, user_disliked_replies = set(), set()
@@ -99,7 +90,7 @@ def update_announcement(request, announcement_id):
         update_fields = ['title', 'description', 'tags']
         announcement.title = request.POST.get('title')
         announcement.description = request.POST.get('description')
-        announcement.tags = request.POST.get('tags', '')
+        announcement.tags = split_tags(request.POST.get('tags', ''))
         if 'image' in request.FILES:
             announcement.image = request.FILES['image']
             update_fields.append('image')
@@ -107,11 +98,17 @@ def update_announcement(request, announcement_id):
         return redirect('announcement_detail', announcement_id=announcement_id)
     return redirect('edit_announcement', announcement_id=announcement_id)
 
-class AnnouncementViewSet(viewsets.ModelViewSet):
-    queryset = Announcement.objects.all().order_by("-created_at")
+class AnnouncementViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
+    queryset = Announcement.objects.order_by("-created_at")
     serializer_class = AnnouncementSerializer
     parser_classes = [MultiPartParser, FormParser]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    keyset_ordering = ANNOUNCEMENT_ORDERING
+    object_validators = announcement_validators
+    def get_serializer_class(self): return AnnouncementListSerializer if self.action == 'list' else AnnouncementSerializer
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return AnnouncementListSerializer.setup_queryset(queryset, self.request) if self.action == 'list' else queryset.select_related('author')
     def perform_create(self, serializer): serializer.save(author=self.request.user)
 
 @swagger_auto_schema(method='get', operation_description="Фильтрация объявлений", tags=['Объявления'])
@@ -120,24 +117,16 @@ def filter_announcements(request):
     try:
         queryset = Announcement.objects.all()
         search_query = request.GET.get('search', '').strip()
-        if search_query: queryset = queryset.filter(Q(title__icontains=search_query) | Q(description__icontains=search_query))
-        tags_query = request.GET.get('tags', '').strip()
-        if tags_query:
-            tags_list = [tag.strip().lower() for tag in tags_query.split(',') if tag.strip()]
-            if tags_list:
-                filtered_ids = [a.id for a in queryset.iterator() if any(t in [str(x).lower().strip() for x in (a.tags or []) if x] for t in tags_list)]
-                queryset = queryset.filter(id__in=filtered_ids) if filtered_ids else queryset.none()
+        queryset = filter_by_tags_query(queryset, request)
         date_filter = request.GET.get('date_filter', '').strip()
         if date_filter.isdigit(): queryset = queryset.filter(created_at__date__gte=timezone.localdate() - __import__('datetime').timedelta(days=int(date_filter)))
         if search_query:
-            announcements = list(queryset); query_lower = search_query.lower()
-            for a in announcements:
-                rel = 0; t = a.title.lower(); d = (a.description or '').lower()
-                if t.startswith(query_lower): rel += 5
-                elif query_lower in t: rel += 3
-                if query_lower in d: rel += 1
-                a.relevance = rel
-            announcements.sort(key=lambda x: x.relevance, reverse=True); announcements = announcements[:20]
-            return Response({'count': len(announcements), 'results': AnnouncementSerializer(announcements, many=True, context={'request': request}).data})
-        return Response({'count': queryset.count(), 'results': AnnouncementSerializer(queryset.order_by('-created_at'), many=True, context={'request': request}).data})
+            announcements = list(search_announcements(search_query, AnnouncementListSerializer.setup_queryset(queryset, request)))
+            data = {'count': len(announcements), 'results': AnnouncementListSerializer(announcements, many=True, context={'request': request}).data}
+        else:
+            paginator = KeysetPagination(ordering=ANNOUNCEMENT_ORDERING)
+            data = paginator.get_page_data(AnnouncementListSerializer(paginator.paginate_queryset(AnnouncementListSerializer.setup_queryset(queryset, request), request), many=True, context={'request': request}).data)
+        if facets_requested(request): data['facets'] = queryset_tag_facets(search_announcements(search_query, queryset, limit=None) if search_query else queryset)
+        return Response(data)
+    except NotFound: raise
     except Exception as e: return Response({'error': str(e)}, status=500)
\ No newline at end of file
@@ -1,6 +1,5 @@
 import re
 import os
-import markdown
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
@@ -8,44 +7,28 @@ from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.generic import ListView
 from rest_framework import status, permissions, viewsets
 from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Avg, Count, Prefetch, Q, F
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 from rest_framework.views import APIView
 
-from .models import Guide, GuideRating, Review, GuideReviewRating, ReviewReply, ReviewReplyRating
+from .models import Guide, GuideRating, Profile, Review, GuideReviewRating, ReviewReply, ReviewReplyRating
 from .daos import GuideDAO
-from .serializers import GuideSerializer
+from .conditional import ConditionalViewSetMixin, conditional_view, guide_page_validators, guide_validators
+from .serializers import GuideListSerializer, GuideSerializer
 from .forms import GuideForm
+from .rendering import convert_youtube_links_to_embed, refresh_guide_html
+from .search import search_guides
+from .tags import filter_by_tags_query
+from .votes import POPULAR_ORDERING
+from .facets import facets_requested, queryset_tag_facets
+from .pagination import GUIDE_ORDERING, KeysetPagination
 from .utils import filter_text
 
-def convert_youtube_links_to_embed(content):
-    pattern_standard = r'https?://(?:www.)?youtube.com/watch?v=([a-zA-Z0-9_-]+)([^\s"\'<>])'
-    pattern_shorts = r'https?://(?:www.)?youtube.com/shorts/([a-zA-Z0-9_-]+)([^\s"\'<>])'
-    def replace_standard(match):
-        video_id = match.group(1)
-        params = match.group(2) or ''
-        if params.startswith('&'): params = '?' + params[1:]
-        elif params and not params.startswith('?'): params = '?' + params
-        return f'https://www.youtube.com/embed/{video_id}{params}'
-    content = re.sub(pattern_standard, replace_standard, content)
-    content = re.sub(pattern_shorts, lambda m: f'https://www.youtube.com/embed/{m.group(1)}', content)
-    return content
-
-def convert_youtube_embeds_to_html(content):
-    pattern_shorts = r'https://www.youtube.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>])#shorts'
-    pattern_normal = r'https://www.youtube.com/embed/([a-zA-Z0-9_-]+)([^\s"\'<>])'
-    def replace_with_iframe(match, is_shorts):
-        video_id = match.group(1)
-        params = match.group(2) or ''
-        return f'''<div class="youtube-embed-wrapper"><iframe width="560" height="315" src="https://www.youtube.com/embed/{video_id}{'' if is_shorts else params}" frameborder="0" allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share" referrerpolicy="strict-origin-when-cross-origin" allowfullscreen loading="lazy"></iframe></div><br>'''
-    content = re.sub(pattern_shorts, lambda m: replace_with_iframe(m, True), content)
-    content = re.sub(pattern_normal, lambda m: replace_with_iframe(m, False), content)
-    return content
-
 class GuideListView(ListView):
     model = Guide
     template_name = 'users/guides.html'
@@ -54,19 +37,7 @@ class GuideListView(ListView):
         queryset = super().get_queryset()
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(Q(title__icontains=search_query) | Q(content__icontains=search_query))
-            query_lower = search_query.lower()
-            guides = list(queryset)
-            for guide in guides:
-                relevance = 0
-                title_lower = guide.title.lower()
-                content_lower = (guide.content or '').lower()
-                if title_lower.startswith(query_lower): relevance += 5
-                elif query_lower in title_lower: relevance += 3
-                if query_lower in content_lower: relevance += 1
-                guide.relevance = relevance
-            guides.sort(key=lambda x: x.relevance, reverse=True)
-            return guides[:20]
+            return search_guides(search_query, queryset.select_related('author'))
         return queryset.order_by('-rating')[:6]
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -120,22 +91,15 @@ def create_guide(request):
     return render(request, 'users/create_guides.html', {'form': GuideForm(instance=guide), 'guide': guide})
 
 @xframe_options_exempt
+@conditional_view(guide_page_validators)
 def guide_detail(request, pk):
     guide = get_object_or_404(Guide, pk=pk)
-    content = convert_youtube_embeds_to_html(convert_youtube_links_to_embed(guide.content or ""))
-    html = markdown.markdown(content, extensions=['extra', 'codehilite'], output_format='html5')
-    html = re.sub(r'src="(?!https?://|/)([^"]+)"', r'src="/media/guides/\1"', html, flags=re.IGNORECASE)
-    guide_content_html = mark_safe(html)
+    guide_content_html = mark_safe(refresh_guide_html(guide))
     sort_by = request.GET.get('sort', 'new')
-    reviews = guide.reviews.select_related("author", "author__profile").annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    ).prefetch_related(Prefetch('replies', queryset=ReviewReply.objects.select_related('author', 'author__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)),
-        dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    ).order_by('created_at')))
+    reviews = guide.reviews.select_related("author", "author__profile").prefetch_related(
+        Prefetch('replies', queryset=ReviewReply.objects.select_related('author', 'author__profile').order_by('created_at')))
     if sort_by == 'Popular':
-        reviews = reviews.annotate(net_rating=F('likes_count') - F('dislikes_count')).order_by('-net_rating', '-created_at')
+        reviews = reviews.order_by(*POPULAR_ORDERING)
     else:
         reviews = reviews.order_by('-created_at')
     user_liked, user_disliked, user_liked_replies, user_disliked_replies = set(), set(), set(), set()
@@ -160,20 +124,22 @@ class GuideRateAPIView(APIView):
         rating_value = int(request.data.get('rating', 0))
         if not 1 <= rating_value <= 5: return Response({'error': 'Рейтинг должен быть от 1 до 5'}, status=400)
         GuideRating.objects.update_or_create(guide=guide, reviewer=request.user, defaults={'rating': rating_value})
-        guide.rating = int(round(guide.ratings.aggregate(avg=Avg('rating'))['avg'] or 0))
-        guide.save(update_fields=['rating'])
-        profile = guide.author.profile
-        profile.rating = int(round(Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0))
-        profile.save(update_fields=['rating'])
-        return Response({"guide_average_rating": guide.rating, "profile_average_rating": profile.rating})
+        guide.refresh_from_db(fields=['rating']); profile = Profile.objects.only('rating').get(user_id=guide.author_id)
+        return Response({"guide_average_rating": guide.rating, "profile_average_rating": round(profile.rating)})
 
-class GuideViewSet(viewsets.ModelViewSet):
-    queryset = Guide.objects.all().order_by('-rating', '-created_at')
+class GuideViewSet(ConditionalViewSetMixin, viewsets.ModelViewSet):
+    queryset = Guide.objects.order_by('-rating', '-created_at')
     serializer_class = GuideSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    keyset_ordering = GUIDE_ORDERING
+    object_validators = guide_validators
+    def get_serializer_class(self): return GuideListSerializer if self.action in ('list', 'get_guides_from_dao') else GuideSerializer
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return GuideListSerializer.setup_queryset(queryset, self.request) if self.action == 'list' else queryset.select_related('author')
     @action(detail=False, methods=['get'], url_path='dao-guides')
     def get_guides_from_dao(self, request):
-        return Response(GuideSerializer(GuideDAO.get_all(), many=True).data)
+        return self.get_paginated_response(self.get_serializer(self.paginate_queryset(GuideListSerializer.setup_queryset(GuideDAO.get_all(), request)), many=True).data)
     @action(detail=False, methods=['get'], url_path='dto-guides')
     def get_dto_guides(self, request):
         dtos = GuideDAO.get_guides_dto()
@@ -187,24 +153,16 @@ def filter_guides(request):
     try:
         queryset = Guide.objects.all()
         search_query = request.GET.get('search', '').strip()
-        if search_query: queryset = queryset.filter(Q(title__icontains=search_query) | Q(content__icontains=search_query))
-        tags_query = request.GET.get('tags', '').strip()
-        if tags_query:
-            tags_list = [tag.strip().lower() for tag in tags_query.split(',') if tag.strip()]
-            if tags_list:
-                filtered_ids = [g.id for g in queryset.iterator() if any(t in [str(x).lower().strip() for x in (g.tags or []) if x] for t in tags_list)]
-                queryset = queryset.filter(id__in=filtered_ids) if filtered_ids else queryset.none()
+        queryset = filter_by_tags_query(queryset, request)
         date_filter = request.GET.get('date_filter', '').strip()
         if date_filter.isdigit(): queryset = queryset.filter(created_at__date__gte=timezone.localdate() - __import__('datetime').timedelta(days=int(date_filter)))
         if search_query:
-            guides = list(queryset); query_lower = search_query.lower()
-            for g in guides:
-                rel = 0; t = g.title.lower(); c = (g.content or '').lower()
-                if t.startswith(query_lower): rel += 5
-                elif query_lower in t: rel += 3
-                if query_lower in c: rel += 1
-                g.relevance = rel
-            guides.sort(key=lambda x: x.relevance, reverse=True); guides = guides[:20]
-            return Response({'count': len(guides), 'results': GuideSerializer(guides, many=True, context={'request': request}).data})
-        return Response({'count': queryset.count(), 'results': GuideSerializer(queryset.order_by('-rating', '-created_at'), many=True, context={'request': request}).data})
+            guides = list(search_guides(search_query, GuideListSerializer.setup_queryset(queryset, request)))
+            data = {'count': len(guides), 'results': GuideListSerializer(guides, many=True, context={'request': request}).data}
+        else:
+            paginator = KeysetPagination(ordering=GUIDE_ORDERING)
+            data = paginator.get_page_data(GuideListSerializer(paginator.paginate_queryset(GuideListSerializer.setup_queryset(queryset, request), request), many=True, context={'request': request}).data)
+        if facets_requested(request): data['facets'] = queryset_tag_facets(search_guides(search_query, queryset, limit=None) if search_query else queryset)
+        return Response(data)
+    except NotFound: raise
     except Exception as e: return Response({'error': str(e)}, status=500)
\ No newline at end of file
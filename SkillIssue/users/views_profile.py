@@ -5,7 +5,6 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.db.models import Count, F, Q
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils import timezone
 from django.http import JsonResponse
@@ -16,12 +15,14 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.core.mail import send_mail
+from . import outbox
+from . import verification as verification_codes
 from .models import Profile, UserActivity, Guide, Announcement, ProfileReview, ProfileReviewRating, \
     EmailVerificationCode, GuideRating, AnnouncementComment, GuideComment, Review, ChatMessage, FavoriteAnnouncement, \
     FavoriteGuide
 from .serializers import RegisterSerializer, UserProfileSerializer, ReviewSerializer
 from .utils import filter_text
+from .votes import POPULAR_ORDERING
 
 # --- Страницы ---
 def main_page(request): return render(request, "users/main.html")
@@ -44,10 +45,8 @@ def profile_page(request, username):
     announcements = Announcement.objects.filter(author=user_obj).order_by('-created_at')
     activities = UserActivity.objects.filter(user=user_obj).order_by('-created_at')[:20]
     sort_by = request.GET.get('sort', 'new')
-    reviews = ProfileReview.objects.filter(profile=profile).select_related('reviewer', 'reviewer__profile').annotate(
-        likes_count=Count('ratings', filter=Q(ratings__is_like=True)), dislikes_count=Count('ratings', filter=Q(ratings__is_like=False))
-    )
-    if sort_by == 'Popular': reviews = reviews.annotate(net_rating=F('likes_count') - F('dislikes_count')).order_by('-net_rating', '-created_at')
+    reviews = ProfileReview.objects.filter(profile=profile).select_related('reviewer', 'reviewer__profile')
+    if sort_by == 'Popular': reviews = reviews.order_by(*POPULAR_ORDERING)
     else: reviews = reviews.order_by('-created_at')
     user_liked, user_disliked = set(), set()
     if request.user.is_authenticated:
@@ -100,11 +99,6 @@ def profile_edit(request):
 
 def logout_view(request): logout(request); return redirect("main_page")
 
-def profile_guides_api(username):
-    user_obj = get_object_or_404(User, username=username)
-    guides = Guide.objects.filter(author=user_obj).order_by('-created_at')
-    return JsonResponse({"guides": [{"id": g.id, "title": g.title, "image": g.image.url if g.image else None, "created_at": g.created_at} for g in guides]})
-
 # --- API Auth ---
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -118,7 +112,7 @@ class RegisterView(APIView):
             code = ''.join(random.choices(string.digits, k=6))
             expires_at = timezone.now() + timedelta(minutes=15)
             EmailVerificationCode.objects.create(user=user, code=code, email=email, expires_at=expires_at)
-            send_mail('Подтверждение регистрации', f'Код: {code}', None, [email], fail_silently=False)
+            outbox.send_verification_code(email, code)
             return Response({"message": "Код отправлен", "id": user.id, "email": email}, status=201)
         return Response(serializer.errors, status=400)
 
@@ -141,12 +135,13 @@ class VerifyEmailView(APIView):
     def post(self, request):
         email, code = request.data.get('email'), request.data.get('code')
         if not email or not code: return Response({"error": "Укажите email и код"}, status=400)
-        try: user = User.objects.get(email=email)
-        except User.DoesNotExist: return Response({"error": "Пользователь не найден"}, status=404)
-        verification = EmailVerificationCode.objects.filter(user=user, email=email, code=code, is_used=False).order_by('-created_at').first()
-        if not verification: return Response({"error": "Неверный код"}, status=400)
+        verification = verification_codes.find_code(email, code)
+        if not verification:
+            if not User.objects.filter(email=email).exists(): return Response({"error": "Пользователь не найден"}, status=404)
+            return Response({"error": "Неверный код"}, status=400)
         if verification.is_expired(): return Response({"error": "Код истек"}, status=400)
-        verification.is_used = True; verification.save(); user.is_active = True; user.save()
+        user = verification.user
+        verification_codes.mark_used(verification); user.is_active = True; user.save()
         return Response({"message": "Email подтвержден", "username": user.username}, status=200)
 
 class ResendVerificationCodeView(APIView):
@@ -160,7 +155,7 @@ class ResendVerificationCodeView(APIView):
         code = ''.join(random.choices(string.digits, k=6))
         expires_at = timezone.now() + timedelta(minutes=15)
         EmailVerificationCode.objects.create(user=user, code=code, email=email, expires_at=expires_at)
-        send_mail('Подтверждение регистрации', f'Код: {code}', None, [email], fail_silently=False)
+        outbox.send_verification_code(email, code)
         return Response({"message": "Код отправлен повторно"}, status=200)
 
 class CurrentUserView(APIView):
@@ -169,7 +164,7 @@ class CurrentUserView(APIView):
 
 class UserProfileDetailView(generics.RetrieveAPIView):
     serializer_class = UserProfileSerializer
-    def get_object(self): return get_object_or_404(Profile, user__username=self.kwargs.get("username"))
+    def get_object(self): return get_object_or_404(UserProfileSerializer.setup_queryset(Profile.objects.all()), user__username=self.kwargs.get("username"))
 
 class PasswordResetRequestView(APIView):
     permission_classes = [AllowAny]
@@ -181,7 +176,7 @@ class PasswordResetRequestView(APIView):
         code = ''.join(random.choices(string.digits, k=6))
         expires_at = timezone.now() + timedelta(minutes=15)
         EmailVerificationCode.objects.create(user=user, code=code, email=email, expires_at=expires_at)
-        print(f"Код восстановления пароля для {email}: {code}")
+        outbox.send_password_reset_code(email, code)
         return Response({"message": "Код восстановления отправлен"}, status=200)
 
 class PasswordResetConfirmView(APIView):
@@ -190,11 +185,11 @@ class PasswordResetConfirmView(APIView):
         email, code, new_password = request.data.get('email'), request.data.get('code'), request.data.get('new_password')
         if not all([email, code, new_password]): return Response({"error": "Заполните все поля"}, status=400)
         if len(new_password) < 8: return Response({"error": "Пароль минимум 8 символов"}, status=400)
-        try: user = User.objects.get(email=email)
-        except User.DoesNotExist: return Response({"error": "Пользователь не найден"}, status=404)
-        verification = EmailVerificationCode.objects.filter(user=user, email=email, code=code, is_used=False).order_by('-created_at').first()
+        verification = verification_codes.find_code(email, code)
+        if not verification and not User.objects.filter(email=email).exists(): return Response({"error": "Пользователь не найден"}, status=404)
         if not verification or verification.is_expired(): return Response({"error": "Неверный или истекший код"}, status=400)
-        verification.is_used = True; verification.save(); user.password = make_password(new_password); user.save()
+        user = verification.user
+        verification_codes.mark_used(verification); user.password = make_password(new_password); user.save()
         return Response({"message": "Пароль изменен"}, status=200)
 
 class ChangePasswordView(APIView):
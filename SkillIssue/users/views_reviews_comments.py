@@ -5,11 +5,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Avg, Count, Q
 from .models import (Review, GuideReviewRating, ReviewReply, ReviewReplyRating, ProfileReview,
                      ProfileReviewRating, AnnouncementComment, AnnouncementCommentRating,
                      AnnouncementCommentReply, AnnouncementCommentReplyRating, Guide, Profile, Announcement)
 from .serializers import ReviewSerializer, ProfileCommentSerializer
+from .votes import toggle_vote
 from .utils import filter_text
 
 class GuideReviewRatingView(APIView):
@@ -19,10 +19,8 @@ class GuideReviewRatingView(APIView):
         if review.author == request.user: return Response({"error": "Нельзя оценивать свой отзыв"}, status=403)
         is_like = request.data.get('is_like')
         if is_like is None: return Response({"error": "Не указан тип оценки"}, status=400)
-        rating = GuideReviewRating.objects.filter(review=review, user=request.user).first()
-        if rating and rating.is_like == is_like: rating.delete(); user_action = None
-        else: GuideReviewRating.objects.update_or_create(review=review, user=request.user, defaults={'is_like': is_like}); user_action = is_like
-        return Response({'likes': review.ratings.filter(is_like=True).count(), 'dislikes': review.ratings.filter(is_like=False).count(), 'user_action': user_action})
+        likes, dislikes, user_action = toggle_vote(GuideReviewRating, review, request.user, is_like)
+        return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 class ReviewReplyCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -42,10 +40,8 @@ class ReviewReplyRatingView(APIView):
         if reply.author == request.user: return Response({"error": "Нельзя оценивать свой ответ"}, status=403)
         is_like = request.data.get('is_like')
         if is_like is None: return Response({"error": "Не указан тип оценки"}, status=400)
-        rating = ReviewReplyRating.objects.filter(reply=reply, user=request.user).first()
-        if rating and rating.is_like == is_like: rating.delete(); user_action = None
-        else: ReviewReplyRating.objects.update_or_create(reply=reply, user=request.user, defaults={'is_like': is_like}); user_action = is_like
-        return Response({'likes': reply.ratings.filter(is_like=True).count(), 'dislikes': reply.ratings.filter(is_like=False).count(), 'user_action': user_action})
+        likes, dislikes, user_action = toggle_vote(ReviewReplyRating, reply, request.user, is_like)
+        return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 class ReviewCreateView(generics.CreateAPIView):
     serializer_class = ReviewSerializer; permission_classes = [permissions.IsAuthenticated]
@@ -54,8 +50,6 @@ class ReviewCreateView(generics.CreateAPIView):
         guide = get_object_or_404(Guide, id=guide_id)
         if Review.objects.filter(guide=guide, author=self.request.user).exists(): raise serializers.ValidationError("Отзыв уже оставлен")
         serializer.save(author=self.request.user, guide=guide, stars=stars, text=filter_text(self.request.data.get('text', '')))
-        guide.rating = int(round(guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0)); guide.save(update_fields=['rating'])
-        profile = guide.author.profile; profile.rating = int(round(Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0)); profile.save(update_fields=['rating'])
     def create(self, request, *args, **kwargs):
         try: response = super().create(request, *args, **kwargs); response.data["guide_average_rating"] = get_object_or_404(Guide, id=request.data.get("guide_id")).rating; return response
         except serializers.ValidationError as e: return Response({"error": e.detail[0]}, status=400)
@@ -69,9 +63,8 @@ class ReviewUpdateView(APIView):
         text = filter_text(request.data.get("text", "").strip()); stars = int(request.data.get("stars"))
         if not text: return Response({"error": "Текст пуст"}, status=400)
         review.text, review.stars = text, stars; review.save()
-        guide = review.guide; guide.rating = int(round(guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0)); guide.save(update_fields=['rating'])
-        profile = guide.author.profile; profile.rating = int(round(Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0)); profile.save(update_fields=['rating'])
-        return Response({"id": review.id, "text": review.text, "stars": review.stars, "created_at": review.created_at, "guide_average_rating": guide.rating, "profile_average_rating": profile.rating})
+        guide = Guide.objects.only('rating', 'author_id').get(pk=review.guide_id); profile = Profile.objects.only('rating').get(user_id=guide.author_id)
+        return Response({"id": review.id, "text": review.text, "stars": review.stars, "created_at": review.created_at, "guide_average_rating": guide.rating, "profile_average_rating": round(profile.rating)})
 
 class ReviewDeleteView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -80,9 +73,8 @@ class ReviewDeleteView(APIView):
         is_moderator = hasattr(request.user, 'profile') and request.user.profile.role in ['MODERATOR', 'ADMIN']
         if review.author != request.user and not is_moderator: return Response({"error": "Нет доступа"}, status=403)
         guide = review.guide; review.delete()
-        guide.rating = int(round(guide.reviews.aggregate(avg=Avg('stars'))['avg'] or 0)); guide.save(update_fields=['rating'])
-        profile = guide.author.profile; profile.rating = int(round(Guide.objects.filter(author=guide.author).aggregate(avg=Avg('rating'))['avg'] or 0)); profile.save(update_fields=['rating'])
-        return Response({"message": "Отзыв удалён", "guide_average_rating": guide.rating, "profile_average_rating": profile.rating})
+        guide.refresh_from_db(fields=['rating']); profile = Profile.objects.only('rating').get(user_id=guide.author_id)
+        return Response({"message": "Отзыв удалён", "guide_average_rating": guide.rating, "profile_average_rating": round(profile.rating)})
 
 class ProfileReviewRatingView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -91,10 +83,8 @@ class ProfileReviewRatingView(APIView):
         if review.reviewer == request.user: return Response({"error": "Нельзя оценивать свой отзыв"}, status=403)
         is_like = request.data.get('is_like')
         if is_like is None: return Response({"error": "Не указан тип оценки"}, status=400)
-        rating = ProfileReviewRating.objects.filter(review=review, user=request.user).first()
-        if rating and rating.is_like == is_like: rating.delete(); user_action = None
-        else: ProfileReviewRating.objects.update_or_create(review=review, user=request.user, defaults={'is_like': is_like}); user_action = is_like
-        return Response({'likes': review.ratings.filter(is_like=True).count(), 'dislikes': review.ratings.filter(is_like=False).count(), 'user_action': user_action})
+        likes, dislikes, user_action = toggle_vote(ProfileReviewRating, review, request.user, is_like)
+        return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 class ProfileCommentCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -131,10 +121,8 @@ class AnnouncementCommentRatingView(APIView):
         if comment.author == request.user: return Response({"error": "Нельзя оценивать свой комментарий"}, status=403)
         is_like = request.data.get('is_like')
         if is_like is None: return Response({"error": "Не указан тип оценки"}, status=400)
-        rating = AnnouncementCommentRating.objects.filter(comment=comment, user=request.user).first()
-        if rating and rating.is_like == is_like: rating.delete(); user_action = None
-        else: AnnouncementCommentRating.objects.update_or_create(comment=comment, user=request.user, defaults={'is_like': is_like}); user_action = is_like
-        return Response({'likes': comment.ratings.filter(is_like=True).count(), 'dislikes': comment.ratings.filter(is_like=False).count(), 'user_action': user_action})
+        likes, dislikes, user_action = toggle_vote(AnnouncementCommentRating, comment, request.user, is_like)
+        return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 class AnnouncementCommentReplyCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -153,10 +141,8 @@ class AnnouncementCommentReplyRatingView(APIView):
         if reply.author == request.user: return Response({"error": "Нельзя оценивать свой ответ"}, status=403)
         is_like = request.data.get('is_like')
         if is_like is None: return Response({"error": "Не указан тип оценки"}, status=400)
-        rating = AnnouncementCommentReplyRating.objects.filter(reply=reply, user=request.user).first()
-        if rating and rating.is_like == is_like: rating.delete(); user_action = None
-        else: AnnouncementCommentReplyRating.objects.update_or_create(reply=reply, user=request.user, defaults={'is_like': is_like}); user_action = is_like
-        return Response({'likes': reply.ratings.filter(is_like=True).count(), 'dislikes': reply.ratings.filter(is_like=False).count(), 'user_action': user_action})
+        likes, dislikes, user_action = toggle_vote(AnnouncementCommentReplyRating, reply, request.user, is_like)
+        return Response({'likes': likes, 'dislikes': dislikes, 'user_action': user_action})
 
 class AnnouncementCommentCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -0,0 +1,78 @@
+"""
+Лайки и дизлайки отзывов, комментариев и ответов.
+
+Счётчики ``likes_count`` / ``dislikes_count`` хранятся в самих объектах
+и меняются сигналами оценок (см. signals.py) в той же транзакции,
+что и запись оценки. Страницы читают их как обычные поля, а сортировка
+«Популярные» идёт по функциональному индексу (лайки − дизлайки, дата).
+"""
+from django.db import transaction
+from django.db.models import BooleanField, Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import (AnnouncementCommentRating, AnnouncementCommentReplyRating, GuideReviewRating,
+                     ProfileReviewRating, ReviewReplyRating)
+
+# Модель оценки -> имя внешнего ключа на оцениваемый объект
+RATING_TARGETS = {
+    GuideReviewRating: 'review',
+    ReviewReplyRating: 'reply',
+    AnnouncementCommentRating: 'comment',
+    AnnouncementCommentReplyRating: 'reply',
+    ProfileReviewRating: 'review',
+}
+
+# Порядок «Популярные»; совпадает с выражением индексов *_popular_idx
+POPULAR_ORDERING = ((F('likes_count') - F('dislikes_count')).desc(), F('created_at').desc())
+
+
+def target_model(rating_model):
+    return rating_model._meta.get_field(RATING_TARGETS[rating_model]).related_model
+
+
+def change_counters(rating_model, target_id, is_like, delta):
+    field = 'likes_count' if is_like else 'dislikes_count'
+    target_model(rating_model).objects.filter(pk=target_id).update(**{field: F(field) + delta})
+
+
+def toggle_vote(rating_model, target, user, is_like):
+    """
+    Ставит, меняет или снимает (повторный голос тем же знаком) оценку пользователя.
+    Возвращает (лайки, дизлайки, итоговое действие: True/False/None).
+    """
+    is_like = BooleanField().to_python(is_like)
+    field = RATING_TARGETS[rating_model]
+    with transaction.atomic():
+        rating = rating_model.objects.select_for_update().filter(**{field: target, 'user': user}).first()
+        if rating and rating.is_like == is_like:
+            rating.delete()
+            user_action = None
+        elif rating:
+            rating.is_like = is_like
+            rating.save(update_fields=['is_like'])
+            user_action = is_like
+        else:
+            rating_model.objects.create(**{field: target, 'user': user, 'is_like': is_like})
+            user_action = is_like
+        likes, dislikes = type(target).objects.filter(pk=target.pk).values_list(
+            'likes_count', 'dislikes_count'
+        ).get()
+    return likes, dislikes, user_action
+
+
+def _vote_count_subquery(rating_model, is_like):
+    field = RATING_TARGETS[rating_model]
+    votes = (
+        rating_model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        .annotate(total=Count('id', filter=Q(is_like=is_like))).values('total')
+    )
+    return Coalesce(Subquery(votes, output_field=IntegerField()), Value(0))
+
+
+def rebuild_vote_counters():
+    """Пересчитывает лайки и дизлайки по таблицам оценок (после массовой загрузки)"""
+    for rating_model in RATING_TARGETS:
+        target_model(rating_model).objects.update(
+            likes_count=_vote_count_subquery(rating_model, True),
+            dislikes_count=_vote_count_subquery(rating_model, False),
+        )